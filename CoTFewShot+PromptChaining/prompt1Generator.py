@@ -1,20 +1,22 @@
 import sqlite3
 import os
-import csv
-from tkinter import Tk, filedialog
-from collections import defaultdict
-import unicodedata
-import re
-import random
+from string import Template
+import sys
 
-
-def safe_sql_identifier(name):
-    """Formatta correttamente gli identificatori SQL con caratteri speciali"""
-    return f'"{name}"' if not name.replace('_', '').isalnum() else name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlprompt.column_profile import table_strategies
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.connections import pooled
+from sqlprompt.instrumentation import current_tracer
+from sqlprompt.rendering import database_sections
+from sqlprompt.sample_cache import cached_sample, default_seed, seeded_rng
+from sqlprompt.sampling import sample_column, sample_table
 
 
 def select_db_file():
     """Seleziona il file SQLite con dialog"""
+    from tkinter import Tk, filedialog  # Importato qui: la modalità batch non richiede un display
+
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
@@ -26,51 +28,17 @@ def select_db_file():
 
 def select_folder():
     """Seleziona la cartella con i file CSV"""
+    from tkinter import Tk, filedialog  # Importato qui: la modalità batch non richiede un display
+
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
     return filedialog.askdirectory(title="Seleziona cartella con file CSV")
 
 
-def normalize_text(text):
-    """Normalizza il testo per il matching"""
-    if not text:
-        return ""
-    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
-    return ' '.join(text.strip().lower().split()).replace('_', ' ').replace('-', ' ')
-
-
 def load_csv_descriptions(folder_path):
-    """Carica le descrizioni dai file CSV"""
-    descriptions = defaultdict(str)
-
-    if not folder_path or not os.path.isdir(folder_path):
-        return descriptions
-
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.csv'):
-            try:
-                with open(os.path.join(folder_path, filename), 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-
-                    for row in reader:
-                        original_column_name = row.get('original_column_name', '')
-                        column_description = row.get('column_description', '').strip()
-                        value_description = row.get('value_description', '').strip()
-
-                        if original_column_name:
-                            normalized_key = normalize_text(original_column_name)
-                            full_desc = column_description
-                            if value_description:
-                                full_desc += f" ({value_description})" if full_desc else value_description
-                            if full_desc:
-                                descriptions[normalized_key] = full_desc
-
-            except Exception as e:
-                print(f"⚠️ Errore lettura file {filename}: {str(e)}")
-                continue
-
-    return descriptions
+    """Carica le descrizioni dei file CSV dall'indice compilato, indicizzate per (tabella, colonna)"""
+    return load_catalog(folder_path)
 
 
 def format_value(value):
@@ -89,21 +57,139 @@ def is_valid_example(value):
     return value is not None and value != 0 and value != '' and value != b''
 
 
-def get_random_examples(cursor, table, column, limit=2):
-    """Ottiene esempi casuali validi per una colonna"""
-    query = f"SELECT {safe_sql_identifier(column)} FROM {safe_sql_identifier(table)} WHERE {safe_sql_identifier(column)} IS NOT NULL AND {safe_sql_identifier(column)} != '' AND {safe_sql_identifier(column)} != 0"
-
-    if column.lower().endswith('id'):  # Evita di mostrare solo ID
-        query += f" AND {safe_sql_identifier(column)} NOT LIKE '%ID%'"
-
-    query += f" ORDER BY RANDOM() LIMIT {limit}"
-
+def get_random_examples(cursor, table, column, limit=2, seed=None):
+    """Ottiene esempi casuali validi per una colonna (campionamento per rowid, senza ORDER BY RANDOM())"""
+    seed = seed if seed is not None else default_seed()
+    with current_tracer().span('column', table=table, column=column):
+        try:
+            results = cached_sample(
+                cursor, table, column, 'random', seed, {'limit': limit},
+                lambda: sample_column(cursor, table, column, limit, rng=seeded_rng(seed, table, column))
+            )
+            return [format_value(value) for value in results if is_valid_example(value)]
+        except Exception as e:
+            current_tracer().record_error('get_random_examples.error', e)
+            return []
+
+
+def get_table_examples(cursor, table, columns, limit=2, seed=None, profile=None):
+    """Ottiene gli esempi di tutte le colonne di una tabella con un unico campionamento"""
+    seed = seed if seed is not None else default_seed()
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return [format_value(row[0]) for row in results if is_valid_example(row[0])]
-    except:
-        return []
+        samples = cached_sample(
+            cursor, table, '*', 'table_random', seed, {'limit': limit, 'columns': list(columns)},
+            lambda: sample_table(cursor, table, columns, limit, rng=seeded_rng(seed, table),
+                                 strategies=table_strategies(profile, table, columns, limit))
+        )
+    except sqlite3.Error as e:
+        # Campionamento per tabella fallito: ripiega su una query per colonna
+        current_tracer().record_error('get_table_examples.fallback', e, table=table)
+        return {col: get_random_examples(cursor, table, col, limit, seed) for col in columns}
+    return {col: [format_value(value) for value in values] for col, values in samples.items()}
+
+
+# Parte statica del prompt (intestazione ed esempio svolto), seguita dalle sezioni del database
+PROMPT_TEMPLATE = Template("""You are a SQL expert and your task is to answer the {QUESTIONS} I'm giving you with the correct SQL queries thinking step by step. I'm also giving you the {CURRENT DB SCHEMA}, some {ADDITIONAL INFORMATIONS} about the schema attributes with examples of istances and informations about them, an {EXAMPLE} of a query (belonging to another database) done in the right way with the reasoning steps.
+
+{EXAMPLE}
+
+[EXAMPLE QUESTION]
+Among professors with the highest popularity, how many of their
+students have research capability of 5?
+
+[STEPS]
+**Step 1: Identify the required tables and columns**
+--
+From the question, we need to find the number of students with
+research capability of 5 among professors with the highest
+popularity. This implies we need to:
+1. Find the highest popularity of professors.
+2. Filter professors with the highest popularity.
+3. Join the 'ra' table to get the students advised by these
+professors.
+4. Filter students with research capability of 5.
+5. Count the number of students.
+Required tables:
+* 'prof' (contains professor information)
+* 'ra' (maps students to professors)
+* 'student' (contains student information)
+Required columns:
+* 'prof.popularity' (to find the highest popularity)
+* 'ra.capability' (to filter students with research capability of
+5)
+* 'ra.student_id' (to count the number of students)
+
+**Step 2: Find the highest popularity of professors**
+--
+'''sql
+SELECT MAX(popularity) AS max_popularity
+FROM prof;
+'''
+9
+Published at ICLR 2025 Workshop on Reasoning and Planning for LLMs
+
+**Step 3: Filter professors with the highest popularity**
+--
+'''sql
+SELECT *
+FROM prof
+WHERE popularity = (SELECT MAX(popularity) FROM prof);
+'''
+
+**Step 4: Join the 'ra' table to get the students advised by these
+professors**
+--
+'''sql
+SELECT ra.student_id
+FROM prof JOIN ra ON prof.prof_id = ra.prof_id
+WHERE prof.popularity = (SELECT MAX(popularity) FROM prof);
+'''
+
+**Step 5: Filter students with research capability of 5**
+--
+'''sql
+SELECT ra.student_id
+FROM prof JOIN ra ON prof.prof_id = ra.prof_id
+WHERE prof.popularity = (SELECT MAX(popularity) FROM prof) AND ra.
+capability = 5;
+'''
+
+**Step 6: Count the number of students**
+--
+'''sql
+SELECT COUNT(ra.student_id) AS num_students
+FROM prof JOIN ra ON prof.prof_id = ra.prof_id
+WHERE prof.popularity = (SELECT MAX(popularity) FROM prof) AND ra.
+capability = 5;
+'''
+This is the final SQL statement that answers the question.
+
+$schema$additional_information""")
+
+
+def render_prompt_body(cursor, descriptions, db_path, keep=None):
+    """Restituisce la parte del prompt che dipende solo dal database (esempio, schema, informazioni aggiuntive).
+
+    Schema e informazioni aggiuntive vengono renderizzati una volta per database e poi riusati;
+    `keep` ({tabella: colonne}, da schema_linking) li limita alle parti rilevanti per le domande.
+    """
+    sections = database_sections(cursor, descriptions, db_path, 'prompt1Generator', get_table_examples)
+    schema, additional_information = sections.pruned(keep)
+    return PROMPT_TEMPLATE.substitute(schema=schema, additional_information=additional_information)
+
+
+def print_prompt_body(cursor, descriptions, db_path):
+    """Stampa la parte del prompt che dipende solo dal database"""
+    print(render_prompt_body(cursor, descriptions, db_path), end="")
+
+
+def render_questions(questions):
+    """Restituisce la sezione {QUESTIONS} con le domande già inserite"""
+    lines = ["\n{QUESTIONS}\n"]
+    for i, question in enumerate(questions, 1):
+        lines.append(f"[QUESTION NUMBER {i}]")
+        lines.append(question)
+    return "\n".join(lines) + "\n"
 
 
 def analyze_database(db_path, descriptions):
@@ -113,142 +199,13 @@ def analyze_database(db_path, descriptions):
         return
 
     try:
-        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        cursor = conn.cursor()
-
-        # Stampiamo l'intestazione richiesta prima di tutto
-        print(
-            "You are a SQL expert and your task is to answer the {QUESTIONS} I'm giving you with the correct SQL queries thinking step by step. I'm also giving you the {CURRENT DB SCHEMA}, some {ADDITIONAL INFORMATIONS} about the schema attributes with examples of istances and informations about them, an {EXAMPLE} of a query (belonging to another database) done in the right way with the reasoning steps.\n")
-
-        print("{EXAMPLE}\n")
-        print("[EXAMPLE QUESTION]")
-        print("Among professors with the highest popularity, how many of their")
-        print("students have research capability of 5?\n")
-
-        print("[STEPS]")
-        print("**Step 1: Identify the required tables and columns**")
-        print("--")
-        print("From the question, we need to find the number of students with")
-        print("research capability of 5 among professors with the highest")
-        print("popularity. This implies we need to:")
-        print("1. Find the highest popularity of professors.")
-        print("2. Filter professors with the highest popularity.")
-        print("3. Join the 'ra' table to get the students advised by these")
-        print("professors.")
-        print("4. Filter students with research capability of 5.")
-        print("5. Count the number of students.")
-        print("Required tables:")
-        print("* 'prof' (contains professor information)")
-        print("* 'ra' (maps students to professors)")
-        print("* 'student' (contains student information)")
-        print("Required columns:")
-        print("* 'prof.popularity' (to find the highest popularity)")
-        print("* 'ra.capability' (to filter students with research capability of")
-        print("5)")
-        print("* 'ra.student_id' (to count the number of students)\n")
-
-        print("**Step 2: Find the highest popularity of professors**")
-        print("--")
-        print("'''sql")
-        print("SELECT MAX(popularity) AS max_popularity")
-        print("FROM prof;")
-        print("'''")
-        print("9")
-        print("Published at ICLR 2025 Workshop on Reasoning and Planning for LLMs\n")
-
-        print("**Step 3: Filter professors with the highest popularity**")
-        print("--")
-        print("'''sql")
-        print("SELECT *")
-        print("FROM prof")
-        print("WHERE popularity = (SELECT MAX(popularity) FROM prof);")
-        print("'''\n")
-
-        print("**Step 4: Join the 'ra' table to get the students advised by these")
-        print("professors**")
-        print("--")
-        print("'''sql")
-        print("SELECT ra.student_id")
-        print("FROM prof JOIN ra ON prof.prof_id = ra.prof_id")
-        print("WHERE prof.popularity = (SELECT MAX(popularity) FROM prof);")
-        print("'''\n")
-
-        print("**Step 5: Filter students with research capability of 5**")
-        print("--")
-        print("'''sql")
-        print("SELECT ra.student_id")
-        print("FROM prof JOIN ra ON prof.prof_id = ra.prof_id")
-        print("WHERE prof.popularity = (SELECT MAX(popularity) FROM prof) AND ra.")
-        print("capability = 5;")
-        print("'''\n")
-
-        print("**Step 6: Count the number of students**")
-        print("--")
-        print("'''sql")
-        print("SELECT COUNT(ra.student_id) AS num_students")
-        print("FROM prof JOIN ra ON prof.prof_id = ra.prof_id")
-        print("WHERE prof.popularity = (SELECT MAX(popularity) FROM prof) AND ra.")
-        print("capability = 5;")
-        print("'''")
-        print("This is the final SQL statement that answers the question.\n")
-
-        # 1. STAMPA LO SCHEMA COMPLETO (CREATE TABLE) SENZA COMMENTI
-        print("{CURRENT DB SCHEMA}")
-        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        tables_schema = cursor.fetchall()
-
-        for table in tables_schema:
-            name, sql = table
-            print(f"-- Tabella: {name}")
-            print(f"{sql};")
-            print("\n" + "-" * 50 + "\n")
-
-        # =============================================
-        # 2. ANALISI DETTAGLIATA DELLE TABELLE (CON COMMENTI)
-        # =============================================
-
-        print("{ADDITIONAL INFORMATION}")
-
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        tables = [row[0] for row in cursor.fetchall()]
-
-        print(f"\n📊 Tabelle trovate: {len(tables)}\n")
-
-        for table in tables:
-            print(f" {table.upper()}")
-            try:
-                cursor.execute(f"PRAGMA table_info({safe_sql_identifier(table)});")
-                columns_info = cursor.fetchall()
-                column_names = [col[1] for col in columns_info]
-
-                for col_name in column_names:
-                    examples = get_random_examples(cursor, table, col_name)
-
-                    if not examples:
-                        continue
-
-                    output = f"  {table}.{col_name}: {', '.join(examples)}"
-
-                    normalized_col = normalize_text(col_name)
-                    desc = descriptions.get(normalized_col, "")
-
-                    if desc:
-                        clean_desc = ' '.join(line.strip() for line in desc.splitlines() if line.strip())
-                        output += f" (⚠️ {clean_desc})"
-
-                    print(output)
-
-                print("-" * 50 + "\n")
-
-            except Exception as e:
-                print(f"  ⚠️ Errore durante l'analisi tabella {table}: {str(e)}")
-                print("-" * 50 + "\n")
+        with pooled(db_path) as conn, current_tracer().span('analyze_database', db=os.path.basename(db_path)):
+            print_prompt_body(conn.cursor(), descriptions, db_path)
 
     except Exception as e:
         print(f"\n❌ Errore grave: {str(e)}")
     finally:
         if 'conn' in locals():
-            conn.close()
             # --- NUOVA SEZIONE: INSERIMENTO DOMANDE ---
             print("\n{QUESTIONS}\n")
             q1 = input("[QUESTION NUMBER 1]\n")
@@ -1,20 +1,21 @@
 import sqlite3
 import os
-import csv
-from tkinter import Tk, filedialog
-from collections import defaultdict
-import unicodedata
-import re
-import random
+import sys
 
-
-def safe_sql_identifier(name):
-    """Formatta correttamente gli identificatori SQL con caratteri speciali"""
-    return f'"{name}"' if not name.replace('_', '').isalnum() else name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlprompt.column_profile import table_strategies
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.connections import pooled
+from sqlprompt.instrumentation import current_tracer
+from sqlprompt.rendering import database_sections
+from sqlprompt.sample_cache import cached_sample, default_seed, seeded_rng
+from sqlprompt.sampling import sample_column, sample_table
 
 
 def select_db_file():
     """Seleziona il file SQLite con dialog"""
+    from tkinter import Tk, filedialog  # Importato qui: la modalità batch non richiede un display
+
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
@@ -26,51 +27,17 @@ def select_db_file():
 
 def select_folder():
     """Seleziona la cartella con i file CSV"""
+    from tkinter import Tk, filedialog  # Importato qui: la modalità batch non richiede un display
+
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
     return filedialog.askdirectory(title="Seleziona cartella con file CSV")
 
 
-def normalize_text(text):
-    """Normalizza il testo per il matching"""
-    if not text:
-        return ""
-    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
-    return ' '.join(text.strip().lower().split()).replace('_', ' ').replace('-', ' ')
-
-
 def load_csv_descriptions(folder_path):
-    """Carica le descrizioni dai file CSV"""
-    descriptions = defaultdict(str)
-
-    if not folder_path or not os.path.isdir(folder_path):
-        return descriptions
-
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.csv'):
-            try:
-                with open(os.path.join(folder_path, filename), 'r', encoding='utf-8-sig') as f:
-                    reader = csv.DictReader(f)
-
-                    for row in reader:
-                        original_column_name = row.get('original_column_name', '')
-                        column_description = row.get('column_description', '').strip()
-                        value_description = row.get('value_description', '').strip()
-
-                        if original_column_name:
-                            normalized_key = normalize_text(original_column_name)
-                            full_desc = column_description
-                            if value_description:
-                                full_desc += f" ({value_description})" if full_desc else value_description
-                            if full_desc:
-                                descriptions[normalized_key] = full_desc
-
-            except Exception as e:
-                print(f"⚠️ Errore lettura file {filename}: {str(e)}")
-                continue
-
-    return descriptions
+    """Carica le descrizioni dei file CSV dall'indice compilato, indicizzate per (tabella, colonna)"""
+    return load_catalog(folder_path)
 
 
 def format_value(value):
@@ -89,119 +56,96 @@ def is_valid_example(value):
     return value is not None and value != 0 and value != '' and value != b''
 
 
-def get_distinct_random_examples(cursor, table, column, limit=2):
-    """Ottiene esempi casuali validi e distinti per una colonna"""
-    query = f"SELECT DISTINCT {safe_sql_identifier(column)} FROM {safe_sql_identifier(table)} WHERE {safe_sql_identifier(column)} IS NOT NULL AND {safe_sql_identifier(column)} != '' AND {safe_sql_identifier(column)} != 0"
-
-    if column.lower().endswith('id'):  # Evita di mostrare solo ID
-        query += f" AND {safe_sql_identifier(column)} NOT LIKE '%ID%'"
-
-    query += f" ORDER BY RANDOM() LIMIT {limit}"
-
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        examples = []
-        seen = set()
-
-        for row in results:
-            if is_valid_example(row[0]):
-                formatted = format_value(row[0])
-                if formatted not in seen:
-                    seen.add(formatted)
-                    examples.append(formatted)
-                    if len(examples) == limit:
-                        break
-
-        # Se non abbiamo abbastanza esempi distinti, proviamo con una query più ampia
-        if len(examples) < limit:
-            query = f"SELECT {safe_sql_identifier(column)} FROM {safe_sql_identifier(table)} WHERE {safe_sql_identifier(column)} IS NOT NULL AND {safe_sql_identifier(column)} != '' AND {safe_sql_identifier(column)} != 0 ORDER BY RANDOM() LIMIT 100"
-            cursor.execute(query)
-            results = cursor.fetchall()
-
-            for row in results:
-                if is_valid_example(row[0]):
-                    formatted = format_value(row[0])
-                    if formatted not in seen:
-                        seen.add(formatted)
-                        examples.append(formatted)
-                        if len(examples) == limit:
-                            break
-
-        return examples
-    except Exception as e:
-        print(f"⚠️ Errore durante il fetch per {table}.{column}: {str(e)}")
-        return []
-
+def _distinct_formatted(values, limit):
+    """Formatta i valori scartando i duplicati dopo la formattazione"""
+    examples = []
+    seen = set()
+    for value in values:
+        if is_valid_example(value):
+            formatted = format_value(value)
+            if formatted not in seen:
+                seen.add(formatted)
+                examples.append(formatted)
+                if len(examples) == limit:
+                    break
+    return examples
 
-def analyze_database(db_path, descriptions):
-    testo_introduttivo = (
-        "I'm giving you the {CURRENT DB SCHEMA} with some {ADDITIONAL INFORMATIONS} "
-        "which are about examples of instances and information about them. "
-        "Then I give you two {EXAMPLES} of right queries belonging to the same database. "
-        "Your task is to answer to the {QUESTION} with the correct SQL queries thinking step by step.\n"
-    )
-    print(testo_introduttivo)
-    """Analizza il database con le descrizioni"""
-    if not db_path:
-        print("❌ Nessun file selezionato")
-        return
 
+def get_distinct_random_examples(cursor, table, column, limit=2, seed=None):
+    """Ottiene esempi casuali validi e distinti per una colonna"""
+    seed = seed if seed is not None else default_seed()
+    with current_tracer().span('column', table=table, column=column):
+        try:
+            values = cached_sample(
+                cursor, table, column, 'distinct_random', seed, {'limit': limit},
+                lambda: sample_column(cursor, table, column, limit, distinct=True, rng=seeded_rng(seed, table, column))
+            )
+            return _distinct_formatted(values, limit)
+        except Exception as e:
+            current_tracer().record_error('get_distinct_random_examples.error', e)
+            print(f"⚠️ Errore durante il fetch per {table}.{column}: {str(e)}")
+            return []
+
+
+def get_table_examples(cursor, table, columns, limit=2, seed=None, profile=None):
+    """Ottiene esempi distinti per tutte le colonne di una tabella con un unico campionamento"""
+    seed = seed if seed is not None else default_seed()
     try:
-        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
-        cursor = conn.cursor()
-
-        # 1. STAMPA LO SCHEMA COMPLETO (CREATE TABLE) SENZA COMMENTI
-        print("{CURRENT DB SCHEMA}")
-        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        tables_schema = cursor.fetchall()
+        samples = cached_sample(
+            cursor, table, '*', 'table_distinct_random', seed, {'limit': limit, 'columns': list(columns)},
+            lambda: sample_table(cursor, table, columns, limit, distinct=True, rng=seeded_rng(seed, table),
+                                 strategies=table_strategies(profile, table, columns, limit))
+        )
+    except sqlite3.Error as e:
+        # Campionamento per tabella fallito: ripiega su una query per colonna
+        current_tracer().record_error('get_table_examples.fallback', e, table=table)
+        return {col: get_distinct_random_examples(cursor, table, col, limit, seed) for col in columns}
+    return {col: _distinct_formatted(values, limit) for col, values in samples.items()}
 
-        for table in tables_schema:
-            name, sql = table
-            print(f"-- Tabella: {name}")
-            print(f"{sql};")
-            print("\n" + "-" * 50 + "\n")
 
-        # =============================================
-        # 2. ANALISI DETTAGLIATA DELLE TABELLE (CON COMMENTI)
-        # =============================================
+TESTO_INTRODUTTIVO = (
+    "I'm giving you the {CURRENT DB SCHEMA} with some {ADDITIONAL INFORMATIONS} "
+    "which are about examples of instances and information about them. "
+    "Then I give you two {EXAMPLES} of right queries belonging to the same database. "
+    "Your task is to answer to the {QUESTION} with the correct SQL queries thinking step by step.\n"
+)
 
-        print("{ADDITIONAL INFORMATION}")
 
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
-        tables = [row[0] for row in cursor.fetchall()]
+def render_sections(cursor, descriptions, db_path, keep=None):
+    """Restituisce schema e informazioni aggiuntive, renderizzati una volta per database e poi riusati.
 
-        print(f"\n📊 Tabelle trovate: {len(tables)}\n")
+    `keep` ({tabella: colonne}, da schema_linking) limita le sezioni alle parti rilevanti per la domanda.
+    """
+    sections = database_sections(cursor, descriptions, db_path, 'prompt2Generator', get_table_examples)
+    return "".join(sections.pruned(keep))
 
-        for table in tables:
-            print(f" {table.upper()}")
-            try:
-                cursor.execute(f"PRAGMA table_info({safe_sql_identifier(table)});")
-                columns_info = cursor.fetchall()
-                column_names = [col[1] for col in columns_info]
 
-                for col_name in column_names:
-                    examples = get_distinct_random_examples(cursor, table, col_name)
+def print_prompt_body(cursor, descriptions, db_path):
+    """Stampa schema e informazioni aggiuntive, la parte del prompt che dipende solo dal database"""
+    print(render_sections(cursor, descriptions, db_path), end="")
 
-                    if not examples:
-                        continue
 
-                    output = f"  {table}.{col_name}: {', '.join(examples)}"
+def render_prompt_body(cursor, descriptions, db_path, keep=None):
+    """Restituisce il testo introduttivo e la parte del prompt che dipende solo dal database"""
+    return TESTO_INTRODUTTIVO + "\n" + render_sections(cursor, descriptions, db_path, keep)
 
-                    normalized_col = normalize_text(col_name)
-                    desc = descriptions.get(normalized_col, "")
 
-                    if desc:
-                        clean_desc = ' '.join(line.strip() for line in desc.splitlines() if line.strip())
-                        output += f" (⚠️ {clean_desc})"
+def render_question(question, examples=""):
+    """Restituisce le sezioni {EXAMPLES} e {QUESTION} già compilate"""
+    examples_block = f"{examples.rstrip()}\n\n" if examples else ""
+    return "{EXAMPLES}\n\n" + examples_block + "{QUESTION}\n\n" + question + "\n"
 
-                    print(output)
 
-                print("-" * 50 + "\n")
+def analyze_database(db_path, descriptions):
+    """Analizza il database con le descrizioni"""
+    print(TESTO_INTRODUTTIVO)
+    if not db_path:
+        print("❌ Nessun file selezionato")
+        return
 
-            except Exception as e:
-                print(f"  ⚠️ Errore durante l'analisi tabella {table}: {str(e)}")
-                print("-" * 50 + "\n")
+    try:
+        with pooled(db_path) as conn, current_tracer().span('analyze_database', db=os.path.basename(db_path)):
+            print_prompt_body(conn.cursor(), descriptions, db_path)
 
         # =======================
         # OUTPUT TESTO DOPO ANALISI
@@ -213,8 +157,6 @@ def analyze_database(db_path, descriptions):
     except Exception as e:
         print(f"\n❌ Errore grave: {str(e)}")
     finally:
-        if 'conn' in locals():
-            conn.close()
         input("\nPremi INVIO per uscire...")
 
 
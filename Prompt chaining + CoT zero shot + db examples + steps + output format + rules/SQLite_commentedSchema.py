@@ -1,42 +1,23 @@
 import os
-import csv
-from tkinter import Tk, filedialog
-from collections import defaultdict
-import unicodedata
-import re
+import sys
 
-def normalize(text):
-    if not text:
-        return ""
-    text = unicodedata.normalize('NFKD', text.strip().lower()).encode('ascii', 'ignore').decode('ascii')
-    return re.sub(r'[\s\-_]+', ' ', text)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlprompt.ddl import COLUMN_LINE, CREATE_TABLE
+from sqlprompt.description_catalog import load_catalog
 
 def load_csv_descriptions(folder_path):
-    """Carica descrizioni normalizzate da tutti i file CSV nella cartella"""
-    descriptions = defaultdict(str)
-    
-    for filename in os.listdir(folder_path):
-        if filename.lower().endswith('.csv'):
-            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    column = normalize(row.get('original_column_name', ''))
-                    desc = row.get('column_description', '').strip().replace('\n', ' ')  # Remove newlines
-                    val_desc = row.get('value_description', '').strip().replace('\n', ' ')  # Remove newlines
-                    full_desc = desc
-                    if val_desc:
-                        full_desc += f" ({val_desc})"
-                    if column and full_desc:
-                        descriptions[column] = full_desc
-    return descriptions
+    """Carica le descrizioni dall'indice compilato dei CSV, indicizzate per (tabella, colonna)"""
+    return load_catalog(folder_path)
 
 def select_schema_file():
+    from tkinter import Tk, filedialog  # Importato qui: la generazione batch non richiede un display
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
     return filedialog.askopenfilename(title="Seleziona file schema .txt", filetypes=[("File di testo", "*.txt")])
 
 def select_csv_folder():
+    from tkinter import Tk, filedialog
     root = Tk()
     root.withdraw()
     root.attributes('-topmost', True)
@@ -44,11 +25,16 @@ def select_csv_folder():
 
 def append_comments_to_schema(schema_text, descriptions):
     output = []
+    table = None
     for line in schema_text.splitlines():
-        match = re.match(r'^\s*("?[\w\s\[\]\-]+"?)\s+[\w()]+.*?(,?)\s*$', line)
-        if match and not line.strip().lower().startswith(("create table", "foreign key", "primary key")):
-            col_name = normalize(match.group(1).strip('"'))
-            comment = descriptions.get(col_name)
+        table_match = CREATE_TABLE.match(line.lstrip())
+        if table_match:
+            table = next(name for name in table_match.groups() if name)  # Le colonne seguenti appartengono a questa tabella
+        match = COLUMN_LINE.match(line)
+        already_commented = ' -- ' in line  # Schema già elaborato: non aggiunge un secondo commento
+        if match and not already_commented and not line.strip().lower().startswith(("create table", "foreign key", "primary key")):
+            col_name = match.group(1).strip('"')
+            comment = descriptions.describe(table, col_name).replace('\n', ' ')  # Remove newlines
             if comment:
                 comment = comment.replace("'", "’")  # Evita conflitti con apici SQL
                 line = f"{line} -- '{comment}'"
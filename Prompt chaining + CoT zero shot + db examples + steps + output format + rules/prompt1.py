@@ -1,5 +1,12 @@
+import os
+import sys
+
 def read_schema_file(file_path):
-    """Legge il contenuto del file schema .txt"""
+    """Legge il contenuto del file schema .txt (o lo schema commentato di un pacchetto .dbpack)"""
+    if file_path.endswith('.dbpack'):
+        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        from sqlprompt.context_pack import read_pack
+        return read_pack(file_path, 'commented_schema')
     with open(file_path, 'r', encoding='utf-8') as file:
         return file.read()
 
@@ -1,8 +1,21 @@
 import sqlite3
 import json
+import os
+import sys
 from typing import Dict, List, Union
 from pathlib import Path
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from sqlprompt.budget import BudgetExceeded, column_budget, database_budget, record_fallback, remaining, time_limit
+from sqlprompt.column_profile import column_stats, load_profile
+from sqlprompt.connections import pooled
+from sqlprompt.format_profile import format_summary, profile_formats
+from sqlprompt.instrumentation import current_tracer
+from sqlprompt.sample_cache import cached_sample
+from sqlprompt.sampling import iter_sorted_distinct, window_sorted_distinct
+
+MAX_VALUES_PER_COLUMN = 20
+
 def get_db_path() -> str:
     """Chiede all'utente il percorso del database SQLite"""
     while True:
@@ -41,13 +54,34 @@ def get_question() -> str:
     """Chiede all'utente la domanda originale"""
     return input("\nInserisci la domanda originale: ").strip()
 
-def extract_clean_instances(db_path: str, columns_input: str) -> Dict[str, List[Union[str, int, float]]]:
-    """Estrae i valori unici puliti per le colonne specificate"""
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row  # Permette accesso alle colonne per nome
-    cursor = conn.cursor()
-    
-    # Parsing delle colonne
+def _collect_clean(raw_values, limit: int) -> List[Union[str, int, float]]:
+    """Pulisce i valori (strip, niente stringhe vuote) fermandosi a `limit`"""
+    values = []
+    for val in raw_values:
+        # Conversione e pulizia del valore
+        if isinstance(val, str):
+            val = val.strip()
+            if not val:  # Salta stringhe vuote dopo lo strip
+                continue
+        
+        values.append(val)
+        if len(values) >= limit:
+            break
+    return values
+
+def _clean_values(cursor, table: str, column: str, limit: int, page_size: int) -> List[Union[str, int, float]]:
+    """Legge in ordine i valori distinti puliti di una colonna, fermandosi a `limit`"""
+    try:
+        # Valori distinti in ordine, letti a pagine e interrotti appena bastano
+        with time_limit(cursor.connection, remaining(column_budget())):
+            return _collect_clean(iter_sorted_distinct(cursor, table, column, page_size=page_size), limit)
+    except BudgetExceeded:
+        # Limite di tempo superato: valori distinti delle prime righe della tabella
+        record_fallback('clean_instances.budget_fallback', table=table, column=column)
+        return _collect_clean(window_sorted_distinct(cursor, table, column, limit * 2), limit)
+
+def parse_table_columns(columns_input: str) -> Dict[str, List[str]]:
+    """Colonne per tabella dalle righe 'table.column' dell'analisi dello schema"""
     columns = [line.strip() for line in columns_input.split('\n') if line.strip()]
     table_columns = {}
     
@@ -60,44 +94,78 @@ def extract_clean_instances(db_path: str, columns_input: str) -> Dict[str, List[
                 table_columns[table] = []
             if column not in table_columns[table]:
                 table_columns[table].append(column)
+    return table_columns
+
+def extract_clean_instances(db_path: str, columns_input: str,
+                            limit: int = MAX_VALUES_PER_COLUMN) -> Dict[str, List[Union[str, int, float]]]:
+    """Estrae i valori unici puliti per le colonne specificate (al massimo `limit` per colonna)"""
+    table_columns = parse_table_columns(columns_input)
+    
+    # Profilo delle colonne, se già costruito da un'analisi precedente
+    try:
+        profile = load_profile(db_path, build=False)
+    except sqlite3.Error:
+        profile = None
     
     # Estrazione dati
     sample_data = {}
     
-    for table, columns in table_columns.items():
-        for column in columns:
-            try:
-                # Query per valori distinti, escludendo NULL e stringhe vuote
-                query = f'SELECT DISTINCT "{column}" FROM "{table}" WHERE "{column}" IS NOT NULL AND "{column}" != "" ORDER BY "{column}"'
-                cursor.execute(query)
-                
-                # Raccolta e pulizia dei valori
-                values = []
-                for row in cursor.fetchall():
-                    val = row[0]
-                    
-                    # Conversione e pulizia del valore
-                    if isinstance(val, str):
-                        val = val.strip()
-                        if not val:  # Salta stringhe vuote dopo lo strip
-                            continue
-                    
-                    values.append(val)
+    # Connessione in sola lettura dal pool, riusata dalle domande successive sullo stesso database;
+    # limite di tempo complessivo: oltre, le colonne restanti usano il ripiego economico
+    with pooled(db_path) as conn, database_budget():
+        cursor = conn.cursor()
+        cursor.row_factory = sqlite3.Row  # Permette accesso alle colonne per nome
+        for table, columns in table_columns.items():
+            for column in columns:
+                page_size = limit + 8
+                stats = column_stats(profile, table, column)
+                if stats is not None:
+                    non_empty = profile['tables'][table]['row_count'] - stats['null_count'] - stats['empty_count']
+                    if non_empty <= 0:
+                        continue  # Colonna interamente NULL o vuota: nessuna query
+                    # Colonne a bassa cardinalità: una sola pagina piccola basta
+                    page_size = min(page_size, stats['distinct_estimate'] + 2)
+                try:
+                    with current_tracer().span('column', table=table, column=column):
+                        values = cached_sample(
+                            db_path, table, column, 'clean_instances', None, {'limit': limit},
+                            lambda: _clean_values(cursor, table, column, limit, page_size), deterministic=True
+                        )
                 
-                # Aggiungi al risultato solo se ci sono valori validi
-                if values:
-                    key = f"{table}.{column}"
-                    sample_data[key] = values[:20]  # Limita a 50 valori per colonna
+                    # Aggiungi al risultato solo se ci sono valori validi
+                    if values:
+                        key = f"{table}.{column}"
+                        sample_data[key] = values
                     
-            except sqlite3.Error as e:
-                print(f"⚠️ Errore estraendo {table}.{column}: {e}")
-                continue
+                except sqlite3.Error as e:
+                    current_tracer().record_error('extract_clean_instances.error', e, table=table, column=column)
+                    print(f"⚠️ Errore estraendo {table}.{column}: {e}")
+                    continue
     
-    conn.close()
     return sample_data
 
-def generate_final_prompt(schema_analysis: str, sample_data: Dict, question: str) -> str:
-    """Genera il prompt completo per il modello"""
+def extract_value_formats(db_path: str, columns_input: str) -> Dict[str, str]:
+    """Riepilogo dei formati di tutti i valori delle colonne specificate, con una scansione per tabella"""
+    formats = {}
+    with pooled(db_path) as conn, database_budget():
+        for table, columns in parse_table_columns(columns_input).items():
+            try:
+                with current_tracer().span('format_profile', table=table):
+                    profiles = cached_sample(db_path, table, None, 'format_profile', None, {'columns': columns},
+                                             lambda: profile_formats(conn, table, columns), deterministic=True)
+            except sqlite3.Error as e:
+                current_tracer().record_error('extract_value_formats.error', e, table=table)
+                print(f"⚠️ Errore analizzando i formati di {table}: {e}")
+                continue
+            for column in columns:
+                summary = format_summary(profiles.get(column))
+                if summary:
+                    formats[f"{table}.{column}"] = summary
+    return formats
+
+def generate_final_prompt(schema_analysis: str, sample_data: Dict, question: str,
+                          value_formats: Dict[str, str] = None) -> str:
+    """Genera il prompt completo per il modello (con `value_formats`, anche i formati dell'intera colonna)"""
     # Creiamo una versione custom del JSON
     json_lines = ['{']
     
@@ -157,12 +225,19 @@ def generate_final_prompt(schema_analysis: str, sample_data: Dict, question: str
 
 *Sample Data:*
 {sample_data}
-
+{format_section(value_formats)}
 ---
 
 *Question:*  
 {question}'''
 
+def format_section(value_formats: Dict[str, str] = None) -> str:
+    """Sezione con i formati osservati su tutti i valori delle colonne ("" se assenti)"""
+    if not value_formats:
+        return ""
+    lines = [f'    "{key}": {summary}' for key, summary in value_formats.items()]
+    return "\n---\n\n*Value Formats (all values of each column):*\n" + "\n".join(lines) + "\n"
+
 def main():
     print("=== SQL Query Generator ===")
     print("Inserisci i dati richiesti:\n")
@@ -176,9 +251,10 @@ def main():
     # Estrazione dati
     print("\n⏳ Estraggo i dati dal database...")
     sample_data = extract_clean_instances(db_path, schema_analysis)
+    value_formats = extract_value_formats(db_path, schema_analysis)
     
     # Generazione prompt finale
-    final_prompt = generate_final_prompt(schema_analysis, sample_data, question)
+    final_prompt = generate_final_prompt(schema_analysis, sample_data, question, value_formats)
     
     # Salva su file
     try:
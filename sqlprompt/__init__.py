@@ -0,0 +1 @@
+"""Componenti condivisi dagli script di generazione dei prompt Text-to-SQL"""
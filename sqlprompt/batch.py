@@ -0,0 +1,274 @@
+"""Generazione non interattiva dei prompt per un intero file di domande in formato BIRD.
+
+Esempio:
+    python -m sqlprompt.batch dev.json --db-root dev_databases --output prompts.jsonl
+"""
+import argparse
+import json
+import os
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlprompt.checkpoint import Checkpoint, parse_shard, select_shard, write_records
+from sqlprompt.ddl import format_create_table, prune_create_table
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.connections import pooled
+from sqlprompt.rendering import list_tables
+from sqlprompt.prompt_layout import DEFAULT_PREFIX_SEED, prefix_before, prefix_info
+from sqlprompt.scripts import bird_paths, load_script
+
+PROMPT2_PREFIX_END = '*Schema Analysis:*'
+
+
+def load_questions(path):
+    """Legge un file di domande BIRD (lista JSON oppure JSONL)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in f if line.strip()]
+        return json.load(f)
+
+
+def question_text(item):
+    """Domanda completa di riferimenti (evidence), come va inserita nei prompt"""
+    question = (item.get('question') or '').strip()
+    evidence = (item.get('evidence') or '').strip()
+    return f"{question} {evidence}" if evidence else question
+
+
+def question_id(index, item):
+    """Identificativo della domanda: question_id di BIRD o la posizione nel file"""
+    return item.get('question_id', index)
+
+
+def database_schema(cursor, keep=None):
+    """Schema del database (CREATE TABLE) come testo, una tabella dopo l'altra.
+
+    Con `keep` ({tabella: colonne}) restano solo le tabelle e le colonne indicate.
+    Ogni CREATE TABLE ha una definizione per riga, potata o no: i commenti delle
+    colonne si aggiungono riga per riga e i due schemi restano confrontabili.
+    """
+    tables = [(name, sql) for name, sql in list_tables(cursor) if sql]
+    if keep is None:
+        tables = [(name, format_create_table(sql)) for name, sql in tables]
+    else:
+        tables = [(name, prune_create_table(sql, keep[name], keep)) for name, sql in tables if name in keep]
+    return "\n\n".join(f"{sql};" for _, sql in tables)
+
+
+def example_questions(items, position, count=2):
+    """Domande di esempio per il prompt1 few-shot: le successive dello stesso database"""
+    others = [question_text(item) for i, (_, item) in enumerate(items) if i != position]
+    if not others:
+        return []
+    return [others[(position + offset) % len(others)] for offset in range(min(count, len(others)))]
+
+
+def merge_selections(selections):
+    """Unione delle selezioni di più domande; None (schema completo) se una non ha corrispondenze"""
+    merged = OrderedDict()
+    for keep in selections:
+        if keep is None:
+            return None
+        for table, columns in keep.items():
+            merged.setdefault(table, [])
+            merged[table] += [column for column in columns if column not in merged[table]]
+    return merged or None
+
+
+def build_database_prompts(db_id, db_path, description_folder, items, prune_top_k=None, prefix_stable=False,
+                           examples_index=None, pending=None):
+    """Genera i prompt di tutte le domande di un database aprendolo una sola volta.
+
+    Con `prune_top_k` lo schema e le informazioni aggiuntive di ogni prompt sono
+    limitati alle `prune_top_k` tabelle più rilevanti per la domanda (più quelle
+    necessarie ai join) e il record riporta i token risparmiati.
+    Con `prefix_stable` il record riporta, per ogni prompt, hash e token del
+    prefisso che dipende solo dal database (vedi sqlprompt.prompt_layout).
+    Con `examples_index` (cartella di sqlprompt.example_retrieval) gli {EXAMPLES}
+    del prompt2 few-shot sono le domande di train più simili dello stesso database.
+    Con `pending` (posizioni) si generano solo quelle domande; le altre servono
+    comunque come domande di esempio del prompt1 few-shot.
+    """
+    prompt1 = load_script('prompt1')
+    prompt2 = load_script('prompt2')
+    prompt1_generator = load_script('prompt1Generator')
+    prompt2_generator = load_script('prompt2Generator')
+    commented_schema_script = load_script('SQLite_commentedSchema')
+
+    descriptions = load_catalog(description_folder)
+    with pooled(db_path) as conn:
+        cursor = conn.cursor()
+        # Parti che dipendono solo dal database: calcolate una volta per tutte le domande
+        commented_schema = commented_schema_script.append_comments_to_schema(database_schema(cursor), descriptions)
+        fewshot_body1 = prompt1_generator.render_prompt_body(cursor, descriptions, db_path)
+        fewshot_body2 = prompt2_generator.render_prompt_body(cursor, descriptions, db_path)
+        # Lo schema precede la domanda: il prefisso del prompt1 è il prompt senza domanda
+        prefix1 = prompt1.generate_output(commented_schema, '')
+        schema_index = None
+        if prune_top_k:
+            from sqlprompt.schema_linking import load_index, pruning_report
+            schema_index = load_index(cursor, descriptions, db_path)
+        retrieval = None
+        if examples_index:
+            from sqlprompt.example_retrieval import load_example_index
+            retrieval = load_example_index(examples_index)
+
+        results = []
+        for position, (index, item) in enumerate(items):
+            if pending is not None and index not in pending:
+                continue
+            text = question_text(item)
+            examples = item.get('example_questions') or example_questions(items, position)
+            sql_examples = item.get('examples', '')
+            if not sql_examples and retrieval is not None:
+                sql_examples = retrieval.render_examples(db_id, text)
+            record = {
+                'question_id': question_id(index, item),
+                'db_id': db_id,
+                'question': text,
+                'prompt1': prompt1.generate_output(commented_schema, text),
+                'prompt2': None,
+            }
+            record['fewshot_prompt1'] = fewshot_body1 + prompt1_generator.render_questions(examples)
+            record['fewshot_prompt2'] = fewshot_body2 + prompt2_generator.render_question(text, sql_examples)
+
+            if schema_index is not None:
+                keep = schema_index.select(text, top_tables=prune_top_k)
+                if keep is not None:
+                    full = record['prompt1'] + record['fewshot_prompt1'] + record['fewshot_prompt2']
+                    pruned_schema = commented_schema_script.append_comments_to_schema(
+                        database_schema(cursor, keep), descriptions)
+                    record['prompt1'] = prompt1.generate_output(pruned_schema, text)
+                    keep1 = merge_selections([keep] + [schema_index.select(q, top_tables=prune_top_k)
+                                                       for q in examples])
+                    record['fewshot_prompt1'] = (prompt1_generator.render_prompt_body(cursor, descriptions, db_path, keep1)
+                                                 + prompt1_generator.render_questions(examples))
+                    record['fewshot_prompt2'] = (prompt2_generator.render_prompt_body(cursor, descriptions, db_path, keep)
+                                                 + prompt2_generator.render_question(text, sql_examples))
+                    record['pruning'] = pruning_report(
+                        keep, full, record['prompt1'] + record['fewshot_prompt1'] + record['fewshot_prompt2'])
+                else:
+                    record['pruning'] = None
+
+            # Il prompt2 zero-shot richiede la risposta del modello al prompt1
+            if item.get('schema_analysis'):
+                sample_data = prompt2.extract_clean_instances(db_path, item['schema_analysis'])
+                record['prompt2'] = prompt2.generate_final_prompt(item['schema_analysis'], sample_data, text)
+
+            if prefix_stable:
+                record['prefix'] = {
+                    'prompt1': prefix_info(record['prompt1'], prefix1),
+                    'fewshot_prompt1': prefix_info(record['fewshot_prompt1'], fewshot_body1),
+                    'fewshot_prompt2': prefix_info(record['fewshot_prompt2'], fewshot_body2),
+                }
+                if record['prompt2']:
+                    # Dopo l'analisi dello schema tutto dipende dalla domanda
+                    record['prefix']['prompt2'] = prefix_info(
+                        record['prompt2'], prefix_before(record['prompt2'], PROMPT2_PREFIX_END))
+            results.append((index, record))
+    return results
+
+
+def group_by_database(questions):
+    """Raggruppa le domande per db_id mantenendo l'ordine di prima apparizione"""
+    groups = OrderedDict()
+    for index, item in enumerate(questions):
+        groups.setdefault(item['db_id'], []).append((index, item))
+    return groups
+
+
+def run_batch(questions_path, databases_root, output_path, workers=None, seed=None, prune_top_k=None,
+              prefix_stable=False, examples_index=None, shard=None, checkpoint_dir=None):
+    """Genera i prompt per tutte le domande distribuendo i database su un pool di processi.
+
+    Con `shard` ((i, N)) solo i database dello shard i; con `checkpoint_dir` i
+    record completati vengono aggiunti al log dello shard e un nuovo avvio salta
+    le domande già presenti (vedi sqlprompt.checkpoint).
+    """
+    if prefix_stable and seed is None and not os.environ.get('SQLPROMPT_SEED'):
+        seed = DEFAULT_PREFIX_SEED  # Esempi congelati: lo stesso prefisso in ogni run
+    if seed is not None:
+        os.environ['SQLPROMPT_SEED'] = str(seed)  # Ereditato dai processi del pool
+
+    questions = load_questions(questions_path)
+    selected = set(select_shard(questions, shard))
+    groups = OrderedDict((db_id, items) for db_id, items in group_by_database(questions).items()
+                         if selected.intersection(index for index, _ in items))
+    checkpoint = Checkpoint(checkpoint_dir, shard) if checkpoint_dir else None
+    records = {index: record for index, record in checkpoint.records.items()
+               if index in selected} if checkpoint else {}
+    pending = selected - checkpoint.done() if checkpoint else selected
+    print(f"📊 Domande: {len(selected)} su {len(questions)}, database: {len(groups)}"
+          + (f", già completate: {len(selected) - len(pending)}" if checkpoint else ""))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(build_database_prompts, db_id, *bird_paths(databases_root, db_id), items, prune_top_k,
+                            prefix_stable, examples_index, pending): db_id
+                for db_id, items in groups.items() if pending.intersection(index for index, _ in items)
+            }
+            for future in as_completed(futures):
+                db_id = futures[future]
+                try:
+                    results = future.result()
+                    print(f"✅ {db_id}: {len(results)} prompt generati")
+                except Exception as e:
+                    print(f"❌ Errore sul database {db_id}: {str(e)}")
+                    results = [(index, {'question_id': question_id(index, item), 'db_id': db_id,
+                                        'question': question_text(item), 'error': str(e)})
+                               for index, item in groups[db_id] if index in pending]
+                for index, record in results:
+                    records[index] = record
+                    if checkpoint:
+                        checkpoint.append(index, record)
+                if checkpoint:
+                    checkpoint.sync()
+    finally:
+        if checkpoint:
+            checkpoint.close()
+
+    write_records(records, output_path)
+    print(f"✅ Prompt salvati in: {output_path}")
+    if prune_top_k:
+        reports = [record['pruning'] for record in records.values() if record.get('pruning')]
+        saved = sum(report['tokens_saved'] for report in reports)
+        before = sum(report['tokens_before'] for report in reports)
+        print(f"✂️ Schema potato per {len(reports)} domande: {saved} token risparmiati su {before} "
+              f"({100 * saved / max(before, 1):.1f}%)")
+    if prefix_stable:
+        prefixes = {(record['db_id'], info['prefix_hash']): info['prefix_tokens']
+                    for record in records.values() for info in record.get('prefix', {}).values()}
+        shared = sum(info['prefix_tokens'] for record in records.values()
+                     for info in record.get('prefix', {}).values())
+        print(f"📊 Prefissi distinti: {len(prefixes)}, token di prefisso riusabili: "
+              f"{shared - sum(prefixes.values())} su {shared}")
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera in batch i prompt per un file di domande BIRD")
+    parser.add_argument('questions', help="File delle domande (dev.json o .jsonl con question, db_id, evidence)")
+    parser.add_argument('--db-root', required=True, help="Cartella dei database (<db_id>/<db_id>.sqlite)")
+    parser.add_argument('--output', required=True, help="File JSONL di output")
+    parser.add_argument('--workers', type=int, default=None, help="Numero di processi (default: CPU)")
+    parser.add_argument('--seed', default=None, help="Seed del campionamento degli esempi")
+    parser.add_argument('--prune-top-k', type=int, default=None,
+                        help="Tiene nei prompt solo le K tabelle più rilevanti per la domanda (più i join)")
+    parser.add_argument('--prefix-stable', action='store_true',
+                        help="Esempi con seed fisso e hash/token del prefisso comune per database in ogni record")
+    parser.add_argument('--examples-index', default=None,
+                        help="Indice di sqlprompt.example_retrieval per scegliere gli {EXAMPLES} del prompt2")
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: genera solo i database dello shard i di N (0 <= i < N)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Cartella dei log dei record completati: un nuovo avvio riprende da dove si era fermato")
+    args = parser.parse_args()
+    if args.prefix_stable and args.prune_top_k:
+        parser.error("--prefix-stable non è compatibile con --prune-top-k (lo schema cambierebbe per domanda)")
+    run_batch(args.questions, args.db_root, args.output, args.workers, args.seed, args.prune_top_k,
+              args.prefix_stable, args.examples_index, args.shard, args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""Benchmark dei percorsi critici su database SQLite sintetici, con risultati JSON confrontabili nel tempo.
+
+Esempio:
+    python -m sqlprompt.benchmark --rows 1000 100000 --output bench.json
+    python -m sqlprompt.benchmark --rows 1000 100000 --output bench_new.json --compare bench.json
+"""
+import argparse
+import builtins
+import contextlib
+import csv
+import io
+import json
+import multiprocessing
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlprompt.column_profile import BACKGROUND_ENV, profile_paths
+from sqlprompt.connections import readonly_uri
+from sqlprompt.instrumentation import connect
+from sqlprompt.sampling import quote_identifier
+from sqlprompt.scripts import REPO_ROOT, load_script
+
+PROGRESS_STEPS = 100  # Istruzioni della VM di SQLite tra due chiamate del progress handler
+DEFAULT_SPEC = {
+    'tables': 3,
+    'columns': 8,
+    'cardinality': 1000,
+    'null_ratio': 0.1,
+    'text_length': 16,
+}
+BENCHMARKS = (
+    'prompt1Generator.analyze_database',
+    'prompt2Generator.analyze_database',
+    'get_distinct_random_examples',
+    'extract_clean_instances',
+    'load_csv_descriptions',
+    'append_comments_to_schema',
+)
+COLUMN_TYPES = ('INTEGER', 'TEXT', 'REAL')
+
+
+def dataset_name(spec):
+    """Nome stabile del dataset, usato anche come nome del file"""
+    return (f"r{spec['rows']}_t{spec['tables']}_c{spec['columns']}_k{spec['cardinality']}"
+            f"_n{int(spec['null_ratio'] * 100)}_l{spec['text_length']}")
+
+
+def _column_expression(position, spec):
+    """Valore pseudo-casuale ma deterministico della colonna, calcolato dal contatore x"""
+    kind = COLUMN_TYPES[position % len(COLUMN_TYPES)]
+    multiplier = 2654435761 + 2 * position
+    value = f"((x * {multiplier}) % {spec['cardinality']})"
+    if kind == 'TEXT':
+        width = max(spec['text_length'] - 1, 1)
+        value = f"'v' || printf('%0{width}d', {value})"
+    elif kind == 'REAL':
+        value = f"({value} / 7.0)"
+    null_permille = int(spec['null_ratio'] * 1000)
+    return kind, f"CASE WHEN (x * {40503 + position}) % 1000 < {null_permille} THEN NULL ELSE {value} END"
+
+
+def generate_database(path, spec):
+    """Crea un database sintetico: `tables` tabelle da `rows` righe, ognuna collegata alla precedente"""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("PRAGMA journal_mode=OFF;")
+        conn.execute("PRAGMA synchronous=OFF;")
+        for t in range(spec['tables']):
+            table = f"entity_{t}"
+            definitions = ["id INTEGER PRIMARY KEY"]
+            expressions = ["x"]
+            for c in range(spec['columns']):
+                kind, expression = _column_expression(c, spec)
+                definitions.append(f"col_{c} {kind}")
+                expressions.append(expression)
+            if t:
+                definitions.append("parent_id INTEGER")
+                expressions.append(f"1 + (x * 7919) % {spec['rows']}")
+                definitions.append(f"FOREIGN KEY (parent_id) REFERENCES entity_{t - 1}(id)")
+            conn.execute(f"CREATE TABLE {table}\n(\n    " + ",\n    ".join(definitions) + "\n);")
+            conn.execute(
+                f"INSERT INTO {table} WITH RECURSIVE seq(x) AS "
+                f"(SELECT 1 UNION ALL SELECT x + 1 FROM seq WHERE x < {spec['rows']}) "
+                f"SELECT {', '.join(expressions)} FROM seq;")
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_descriptions(folder, spec):
+    """Scrive i CSV database_description corrispondenti alle tabelle sintetiche"""
+    os.makedirs(folder, exist_ok=True)
+    for t in range(spec['tables']):
+        columns = ['id'] + [f"col_{c}" for c in range(spec['columns'])] + (['parent_id'] if t else [])
+        with open(os.path.join(folder, f"entity_{t}.csv"), 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['original_column_name', 'column_name', 'column_description', 'data_format',
+                             'value_description'])
+            for column in columns:
+                writer.writerow([column, column.replace('_', ' '), f"synthetic column {column} of entity {t}",
+                                 'text', f"one of {spec['cardinality']} values" if column.startswith('col') else ''])
+
+
+def prepare_dataset(work_dir, spec):
+    """Database e descrizioni del dataset, generati solo se mancano; restituisce i percorsi e i secondi spesi"""
+    name = dataset_name(spec)
+    folder = os.path.join(work_dir, name)
+    db_path = os.path.join(folder, f"{name}.sqlite")
+    description_folder = os.path.join(folder, 'database_description')
+    started = time.perf_counter()
+    if not os.path.exists(db_path):
+        os.makedirs(folder, exist_ok=True)
+        generate_database(db_path, spec)
+        write_descriptions(description_folder, spec)
+    return db_path, description_folder, time.perf_counter() - started
+
+
+class VMStepCounter:
+    """Conta le istruzioni della VM di SQLite eseguite dalle connessioni aperte durante il blocco"""
+
+    def __init__(self, granularity=PROGRESS_STEPS):
+        self.granularity = granularity
+        self.steps = 0
+
+    def _handler(self):
+        self.steps += self.granularity
+        return 0
+
+    @contextlib.contextmanager
+    def installed(self):
+        original_connect = sqlite3.connect
+
+        def connect(*args, **kwargs):
+            conn = original_connect(*args, **kwargs)
+            if hasattr(conn, 'add_progress_check'):
+                # Handler condiviso con i limiti di tempo, con la granularità fine del conteggio dei passi
+                conn.progress_steps = self.granularity
+                conn.add_progress_check(self._handler)
+            else:
+                conn.set_progress_handler(self._handler, self.granularity)
+            return conn
+
+        sqlite3.connect = connect
+        try:
+            yield self
+        finally:
+            sqlite3.connect = original_connect
+
+
+def _database_columns(db_path):
+    conn = sqlite3.connect(readonly_uri(db_path, immutable=False), uri=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, sql FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
+        tables = cursor.fetchall()
+        columns = []
+        for name, _ in tables:
+            cursor.execute(f"PRAGMA table_info({quote_identifier(name)});")
+            columns += [(name, col[1]) for col in cursor.fetchall()]
+    finally:
+        conn.close()
+    return tables, columns
+
+
+def _benchmark_callable(name, db_path, description_folder):
+    """Funzione senza argomenti che esegue una volta il benchmark `name`"""
+    tables, columns = _database_columns(db_path)
+    if name.endswith('.analyze_database'):
+        generator = load_script(name.split('.')[0])
+
+        def run():
+            descriptions = generator.load_csv_descriptions(description_folder)
+            generator.analyze_database(db_path, descriptions)
+        return run
+
+    if name == 'get_distinct_random_examples':
+        generator = load_script('prompt2Generator')
+
+        def run():
+            conn = connect(readonly_uri(db_path, immutable=False), uri=True)
+            try:
+                cursor = conn.cursor()
+                for table, column in columns:
+                    generator.get_distinct_random_examples(cursor, table, column)
+            finally:
+                conn.close()
+        return run
+
+    if name == 'extract_clean_instances':
+        prompt2 = load_script('prompt2')
+        columns_input = "\n".join(f"{table}.{column}" for table, column in columns)
+        return lambda: prompt2.extract_clean_instances(db_path, columns_input)
+
+    commented_schema = load_script('SQLite_commentedSchema')
+    if name == 'load_csv_descriptions':
+        from sqlprompt import description_catalog
+
+        def run():
+            description_catalog._loaded.clear()  # Misura la lettura dall'indice, non la memoria del processo
+            commented_schema.load_csv_descriptions(description_folder)
+        return run
+
+    if name == 'append_comments_to_schema':
+        schema = "\n\n".join(f"{sql};" for _, sql in tables)
+        descriptions = commented_schema.load_csv_descriptions(description_folder)
+        return lambda: commented_schema.append_comments_to_schema(schema, descriptions)
+
+    raise ValueError(f"Benchmark sconosciuto: {name}")
+
+
+def _peak_rss_kb():
+    """RSS di picco del processo in KB; None dove il modulo resource non esiste (Windows)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        peak_rss_kb //= 1024  # Su macOS ru_maxrss è in byte
+    return peak_rss_kb
+
+
+def run_case(name, db_path, description_folder, repeat):
+    """Esegue `repeat` volte un benchmark nello stesso processo; restituisce tempi, RSS di picco e passi della VM.
+
+    La prima esecuzione trova le cache vuote, le successive la memoria delle
+    sezioni, le cache e le connessioni del pool già pronte (tempi a caldo).
+    """
+    # Il profilo costruito in background correrebbe in parallelo alle misure
+    os.environ[BACKGROUND_ENV] = '0'
+    run = _benchmark_callable(name, db_path, description_folder)
+    counter = VMStepCounter()
+    timings = []
+    first_steps = None
+    original_input = builtins.input
+    builtins.input = lambda *args: ""  # analyze_database chiede le domande da tastiera
+    try:
+        with counter.installed(), contextlib.redirect_stdout(io.StringIO()):
+            for _ in range(repeat):
+                started = time.perf_counter()
+                run()
+                timings.append(time.perf_counter() - started)
+                if first_steps is None:
+                    first_steps = counter.steps
+    finally:
+        builtins.input = original_input
+
+    return {
+        'runs_ms': [round(seconds * 1000, 3) for seconds in timings],
+        'peak_rss_kb': _peak_rss_kb(),
+        'vm_steps': first_steps,
+    }
+
+
+def _fresh_state(cache_root, label, db_path):
+    """Cache vuota e nessun profilo salvato per il prossimo processo"""
+    os.environ['SQLPROMPT_CACHE_DIR'] = os.path.join(cache_root, label)
+    for path in profile_paths(db_path):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _run_in_process(context, name, db_path, description_folder, repeat):
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        return pool.submit(run_case, name, db_path, description_folder, repeat).result()
+
+
+def measure(context, name, db_path, description_folder, repeat, cache_root=None, label=''):
+    """Tempi a freddo e a caldo di un benchmark.
+
+    A freddo: `repeat` processi nuovi, ognuno con cache vuota e senza profilo
+    (senza `cache_root` resta la cache normale). A caldo: un solo processo che
+    esegue il benchmark `repeat` volte dopo una prima esecuzione non contata,
+    quindi con memoria delle sezioni e cache già piene.
+    """
+    cold = []
+    for repetition in range(repeat):
+        if cache_root is not None:
+            _fresh_state(cache_root, f"{label}-cold{repetition}", db_path)
+        cold.append(_run_in_process(context, name, db_path, description_folder, 1))
+    if cache_root is not None:
+        _fresh_state(cache_root, f"{label}-warm", db_path)
+    warm = _run_in_process(context, name, db_path, description_folder, repeat + 1)
+
+    cold_ms = [case['runs_ms'][0] for case in cold]
+    warm_ms = warm['runs_ms'][1:]
+    return {
+        'cold_runs_ms': cold_ms,
+        'median_ms': round(statistics.median(cold_ms), 3),
+        'min_ms': min(cold_ms),
+        'warm_runs_ms': warm_ms,
+        'warm_median_ms': round(statistics.median(warm_ms), 3),
+        'peak_rss_kb': max((case['peak_rss_kb'] for case in cold + [warm] if case['peak_rss_kb'] is not None),
+                           default=None),
+        'vm_steps': cold[0]['vm_steps'],
+    }
+
+
+def _git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(specs, work_dir, benchmarks=BENCHMARKS, repeat=3, isolate_cache=True):
+    """Esegue tutti i benchmark su tutti i dataset, ognuno in un processo nuovo"""
+    results = []
+    env_backup = os.environ.get('SQLPROMPT_CACHE_DIR')
+    cache_root = tempfile.mkdtemp(prefix='sqlprompt-bench-cache-') if isolate_cache else None
+    context = multiprocessing.get_context('spawn')
+    try:
+        for spec in specs:
+            db_path, description_folder, generation_seconds = prepare_dataset(work_dir, spec)
+            print(f"📊 Dataset {dataset_name(spec)} pronto ({generation_seconds:.2f} s)")
+            for name in benchmarks:
+                try:
+                    # Ogni esecuzione a freddo parte con cache di campioni, indici e profilo vuoti
+                    result = measure(context, name, db_path, description_folder, repeat, cache_root,
+                                     f"{dataset_name(spec)}-{name}")
+                except Exception as e:
+                    print(f"❌ {name}: {str(e)}")
+                    result = {'error': str(e)}
+                results.append({'dataset': dataset_name(spec), 'spec': spec, 'benchmark': name, **result})
+                if 'error' not in result:
+                    print(f"  {name}: {result['median_ms']} ms a freddo, {result['warm_median_ms']} ms a caldo, "
+                          f"{result['peak_rss_kb'] or 'n/d'} KB, {result['vm_steps']} passi VM")
+    finally:
+        if env_backup is None:
+            os.environ.pop('SQLPROMPT_CACHE_DIR', None)
+        else:
+            os.environ['SQLPROMPT_CACHE_DIR'] = env_backup
+    return results
+
+
+def compare(results, previous_path):
+    """Confronta i tempi mediani con un file di risultati precedente"""
+    with open(previous_path, 'r', encoding='utf-8') as f:
+        previous = {(r['dataset'], r['benchmark']): r for r in json.load(f)['results']}
+    print(f"\n📊 Confronto con {previous_path}")
+    for result in results:
+        old = previous.get((result['dataset'], result['benchmark']))
+        if old is None or 'median_ms' not in old or 'median_ms' not in result:
+            continue
+        ratio = result['median_ms'] / old['median_ms'] if old['median_ms'] else float('inf')
+        marker = "⚠️" if ratio > 1.1 else "✅"
+        print(f"  {marker} {result['dataset']} {result['benchmark']}: {old['median_ms']} → "
+              f"{result['median_ms']} ms (x{ratio:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark della generazione dei prompt su database sintetici")
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 100000], help="Righe per tabella (1e3–1e7)")
+    parser.add_argument('--tables', type=int, default=DEFAULT_SPEC['tables'])
+    parser.add_argument('--columns', type=int, default=DEFAULT_SPEC['columns'], help="Colonne per tabella")
+    parser.add_argument('--cardinality', type=int, default=DEFAULT_SPEC['cardinality'], help="Valori distinti")
+    parser.add_argument('--null-ratio', type=float, default=DEFAULT_SPEC['null_ratio'])
+    parser.add_argument('--text-length', type=int, default=DEFAULT_SPEC['text_length'])
+    parser.add_argument('--benchmark', action='append', choices=BENCHMARKS, help="Solo i benchmark indicati")
+    parser.add_argument('--repeat', type=int, default=3, help="Esecuzioni a freddo (processi nuovi) e a caldo per caso")
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'sqlprompt-bench'),
+                        help="Cartella dei database sintetici (riusati tra le esecuzioni)")
+    parser.add_argument('--keep-cache', action='store_true', help="Usa la cache normale invece di una vuota")
+    parser.add_argument('--output', required=True, help="File JSON dei risultati")
+    parser.add_argument('--compare', default=None, help="File JSON di un'esecuzione precedente")
+    args = parser.parse_args()
+
+    specs = [dict(DEFAULT_SPEC, rows=rows, tables=args.tables, columns=args.columns, cardinality=args.cardinality,
+                  null_ratio=args.null_ratio, text_length=args.text_length) for rows in args.rows]
+    results = run_benchmarks(specs, args.work_dir, args.benchmark or BENCHMARKS, args.repeat,
+                             isolate_cache=not args.keep_cache)
+    report = {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'revision': _git_revision(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'results': results,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Risultati salvati in: {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Limiti di tempo per colonna e per database, applicati alle query SQLite con il progress handler.
+
+Una query che supera il proprio limite viene interrotta da SQLite e chi campiona
+ripiega su una strategia più economica, limitata nel numero di righe lette
+(finestra di rowid o inizio della tabella): la generazione del prompt termina
+così in un tempo prevedibile anche su tabelle enormi o senza indici.
+
+SQLPROMPT_COLUMN_BUDGET e SQLPROMPT_DB_BUDGET (secondi, 0 = nessun limite)
+cambiano i limiti predefiniti.
+"""
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+from sqlprompt.instrumentation import CHECK_STEPS, current_tracer
+
+COLUMN_BUDGET_ENV = 'SQLPROMPT_COLUMN_BUDGET'
+DATABASE_BUDGET_ENV = 'SQLPROMPT_DB_BUDGET'
+DEFAULT_COLUMN_BUDGET = 2.0
+DEFAULT_DATABASE_BUDGET = 60.0
+
+_local = threading.local()
+_invalid_warned = set()
+
+
+class BudgetExceeded(Exception):
+    """Query interrotta perché ha superato il limite di tempo"""
+
+
+def _seconds_from_env(name, default):
+    value = os.environ.get(name, '').strip()
+    if not value:
+        return default
+    try:
+        seconds = float(value)
+    except ValueError:
+        if (name, value) not in _invalid_warned:
+            _invalid_warned.add((name, value))
+            print(f"⚠️ {name} non valido ({value!r}): uso {default} s")
+        return default
+    return seconds if seconds > 0 else None
+
+
+def column_budget():
+    """Secondi concessi alle query di una colonna (None = nessun limite)"""
+    return _seconds_from_env(COLUMN_BUDGET_ENV, DEFAULT_COLUMN_BUDGET)
+
+
+@contextlib.contextmanager
+def database_budget(seconds=None):
+    """Limite complessivo per le query eseguite nel blocco dal thread corrente.
+
+    Senza `seconds` usa SQLPROMPT_DB_BUDGET; un blocco annidato non può
+    allungare il limite di quello esterno.
+    """
+    if seconds is None:
+        seconds = _seconds_from_env(DATABASE_BUDGET_ENV, DEFAULT_DATABASE_BUDGET)
+    with deadline_scope(time.perf_counter() + seconds if seconds else None):
+        yield
+
+
+def current_deadline():
+    """Scadenza del limite del database nel thread corrente (perf_counter), None se assente"""
+    return getattr(_local, 'deadline', None)
+
+
+@contextlib.contextmanager
+def deadline_scope(deadline):
+    """Applica una scadenza nel thread corrente, ad esempio quella ereditata dal thread che distribuisce il lavoro"""
+    previous = current_deadline()
+    if previous is not None and (deadline is None or previous < deadline):
+        deadline = previous
+    _local.deadline = deadline
+    try:
+        yield
+    finally:
+        _local.deadline = previous
+
+
+def remaining(seconds=None, share=1.0):
+    """Secondi disponibili per una query: il minimo tra `seconds` e la quota `share` del tempo
+    rimasto al database; None se non c'è alcun limite"""
+    deadline = getattr(_local, 'deadline', None)
+    if deadline is None:
+        return seconds
+    left = max(deadline - time.perf_counter(), 0.0) * share
+    return left if seconds is None else min(seconds, left)
+
+
+def record_fallback(name, **args):
+    """Segna un ripiego dovuto al limite di tempo (nel trace e nel contatore del thread)"""
+    _local.fallbacks = fallback_count() + 1
+    current_tracer().count(name, **args)
+
+
+def fallback_count():
+    """Ripieghi avvenuti finora nel thread corrente; chi mette in cache non salva risultati degradati"""
+    return getattr(_local, 'fallbacks', 0)
+
+
+def absorb_fallbacks(count):
+    """Attribuisce al thread corrente i ripieghi avvenuti nei thread di lavoro che ha avviato"""
+    _local.fallbacks = fallback_count() + count
+
+
+@contextlib.contextmanager
+def time_limit(connection, seconds):
+    """Interrompe le query del blocco dopo `seconds` secondi con BudgetExceeded (None = nessun limite)"""
+    if seconds is None:
+        yield
+        return
+    if seconds <= 0:
+        raise BudgetExceeded("tempo esaurito")
+
+    deadline = time.perf_counter() + seconds
+    expired = []
+
+    def check():
+        if time.perf_counter() >= deadline:
+            expired.append(True)
+            return True
+        return False
+
+    shared = hasattr(connection, 'add_progress_check')
+    if shared:
+        connection.add_progress_check(check)
+    else:
+        connection.set_progress_handler(check, CHECK_STEPS)
+    try:
+        yield
+    except sqlite3.OperationalError as e:
+        if expired:
+            raise BudgetExceeded(f"limite di {seconds:.2f} s superato") from e
+        raise
+    finally:
+        if shared:
+            connection.remove_progress_check(check)
+        else:
+            connection.set_progress_handler(None, 0)
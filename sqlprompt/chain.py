@@ -0,0 +1,310 @@
+"""Esecuzione automatica della catena prompt1 → modello → prompt2 → modello su molte domande.
+
+Esempio:
+    python -m sqlprompt.chain dev.json --db-root dev_databases --output chain.jsonl \\
+        --base-url http://localhost:8000/v1 --model my-model --concurrency 8
+    python -m sqlprompt.chain dev.json --db-root dev_databases --output chain.jsonl --mock
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from sqlprompt.batch import database_schema, load_questions, question_id, question_text
+from sqlprompt.checkpoint import Checkpoint, parse_shard, select_shard, write_records
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.connections import pooled
+from sqlprompt.scripts import bird_paths, load_script
+
+TABLE_COLUMN = re.compile(r'^[\s\-*\d.)]*[`\'"]?([\w ]+?)[`\'"]?\.[`\'"]?([\w ]+?)[`\'"]?[\s,;]*$')
+FENCED_BLOCK = re.compile(r'```[\w-]*\n(.*?)```', re.DOTALL)
+SQL_BLOCK = re.compile(r'```sql\s*\n(.*?)```', re.DOTALL | re.IGNORECASE)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class ModelError(Exception):
+    """Errore non recuperabile dell'endpoint del modello"""
+
+
+class ChatClient:
+    """Client minimale per un endpoint /chat/completions compatibile con OpenAI"""
+
+    def __init__(self, base_url, model, api_key=None, timeout=120.0, retries=3, backoff=1.0, temperature=0.0):
+        self.url = base_url.rstrip('/') + '/chat/completions'
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.temperature = temperature
+
+    def _post(self, prompt):
+        body = json.dumps({
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': self.temperature,
+        }).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        if self.api_key:
+            headers['Authorization'] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(self.url, data=body, headers=headers, method='POST')
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            payload = json.loads(response.read().decode('utf-8'))
+        return payload['choices'][0]['message']['content']
+
+    async def complete(self, prompt):
+        """Invia il prompt e restituisce il testo della risposta, ritentando gli errori transitori"""
+        for attempt in range(self.retries + 1):
+            try:
+                return await asyncio.to_thread(self._post, prompt)
+            except urllib.error.HTTPError as e:
+                if e.code not in RETRYABLE_STATUS or attempt == self.retries:
+                    raise ModelError(f"HTTP {e.code}: {e.reason}") from e
+            except (urllib.error.URLError, TimeoutError, ConnectionError) as e:
+                if attempt == self.retries:
+                    raise ModelError(str(e)) from e
+            await asyncio.sleep(self.backoff * (2 ** attempt))
+
+
+def parse_columns(reply):
+    """Estrae il blocco table.column dalla risposta al prompt1 (una colonna per riga)"""
+    candidates = FENCED_BLOCK.findall(reply)[::-1] + [reply]
+    for text in candidates:
+        pairs = []
+        for line in text.splitlines():
+            match = TABLE_COLUMN.match(line)
+            if match:
+                pair = f"{match.group(1).strip()}.{match.group(2).strip()}"
+                if pair not in pairs:
+                    pairs.append(pair)
+        if pairs:
+            return "\n".join(pairs)
+    return ""
+
+
+def parse_sql(reply):
+    """Estrae la query finale dalla risposta al prompt2 (ultimo blocco ```sql)"""
+    blocks = SQL_BLOCK.findall(reply) or FENCED_BLOCK.findall(reply)
+    return (blocks[-1] if blocks else reply).strip()
+
+
+class StageMetrics:
+    """Latenze per fase della catena"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    def record(self, stage, seconds):
+        self.samples[stage].append(seconds)
+
+    def summary(self):
+        result = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            result[stage] = {
+                'count': len(ordered),
+                'mean_ms': round(statistics.fmean(ordered) * 1000, 2),
+                'p50_ms': round(ordered[len(ordered) // 2] * 1000, 2),
+                'p95_ms': round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2),
+            }
+        return result
+
+
+class ChainRunner:
+    """Esegue la catena per molte domande con concorrenza limitata"""
+
+    def __init__(self, client, databases_root, concurrency=8, prune_top_k=None, value_formats=False):
+        self.client = client
+        self.databases_root = databases_root
+        self.prune_top_k = prune_top_k
+        self.value_formats = value_formats
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.metrics = StageMetrics()
+        self._schemas = {}
+        self._prompt1 = load_script('prompt1')
+        self._prompt2 = load_script('prompt2')
+        self._commented_schema = load_script('SQLite_commentedSchema')
+        self._schema_linking = None
+        if prune_top_k:
+            from sqlprompt import schema_linking  # Richiede NumPy solo se si pota lo schema
+            self._schema_linking = schema_linking
+
+    def _build_commented_schema(self, db_path, description_folder):
+        with pooled(db_path) as conn:
+            schema = database_schema(conn.cursor())
+        return self._commented_schema.append_comments_to_schema(schema, load_catalog(description_folder))
+
+    def _pruned_schema(self, db_path, description_folder, question):
+        """(tabelle e colonne scelte, schema commentato potato) per la domanda; (None, None) se nulla corrisponde"""
+        descriptions = load_catalog(description_folder)
+        with pooled(db_path) as conn:
+            cursor = conn.cursor()
+            keep = self._schema_linking.load_index(cursor, descriptions, db_path).select(question, top_tables=self.prune_top_k)
+            if keep is None:
+                return None, None
+            schema = database_schema(cursor, keep)
+        return keep, self._commented_schema.append_comments_to_schema(schema, descriptions)
+
+    async def commented_schema(self, db_id):
+        """Schema commentato del database, costruito una volta per database.
+
+        Un errore (file bloccato, limite di tempo, ...) non resta in memoria: la
+        domanda successiva sullo stesso database riprova a costruire lo schema.
+        """
+        if db_id not in self._schemas:
+            db_path, description_folder = bird_paths(self.databases_root, db_id)
+            self._schemas[db_id] = asyncio.ensure_future(
+                asyncio.to_thread(self._build_commented_schema, db_path, description_folder))
+        future = self._schemas[db_id]
+        try:
+            return await future
+        except Exception:
+            if self._schemas.get(db_id) is future:
+                del self._schemas[db_id]
+            raise
+
+    async def _timed(self, stage, awaitable):
+        start = time.perf_counter()
+        try:
+            return await awaitable
+        finally:
+            self.metrics.record(stage, time.perf_counter() - start)
+
+    async def run_one(self, index, item):
+        """Esegue la catena completa per una domanda"""
+        db_id = item['db_id']
+        db_path, description_folder = bird_paths(self.databases_root, db_id)
+        text = question_text(item)
+        record = {'question_id': question_id(index, item), 'db_id': db_id, 'question': text}
+        async with self.semaphore:
+            started = time.perf_counter()
+            try:
+                schema = await self._timed('schema', self.commented_schema(db_id))
+                prompt1 = self._prompt1.generate_output(schema, text)
+                if self.prune_top_k:
+                    keep, pruned = await self._timed('schema_linking', asyncio.to_thread(
+                        self._pruned_schema, db_path, description_folder, text))
+                    record['pruning'] = None
+                    if keep is not None:
+                        full_prompt1, prompt1 = prompt1, self._prompt1.generate_output(pruned, text)
+                        record['pruning'] = self._schema_linking.pruning_report(keep, full_prompt1, prompt1)
+                reply1 = await self._timed('model_prompt1', self.client.complete(prompt1))
+                schema_analysis = parse_columns(reply1)
+                record['schema_analysis'] = schema_analysis
+
+                sample_data = await self._timed('extract_instances', asyncio.to_thread(
+                    self._prompt2.extract_clean_instances, db_path, schema_analysis))
+                formats = None
+                if self.value_formats:
+                    formats = await self._timed('value_formats', asyncio.to_thread(
+                        self._prompt2.extract_value_formats, db_path, schema_analysis))
+                prompt2 = self._prompt2.generate_final_prompt(schema_analysis, sample_data, text, formats)
+                reply2 = await self._timed('model_prompt2', self.client.complete(prompt2))
+                record['predicted_sql'] = parse_sql(reply2)
+            except Exception as e:
+                record['error'] = str(e)
+            finally:
+                elapsed = time.perf_counter() - started
+                self.metrics.record('total', elapsed)
+                record['latency_ms'] = round(elapsed * 1000, 2)
+        return index, record
+
+    async def run(self, questions, positions=None, on_record=None):
+        """Esegue la catena per tutte le domande (o per quelle in `positions`); restituisce i risultati
+        nell'ordine di input. `on_record(posizione, record)` riceve ogni risultato appena pronto."""
+        if positions is None:
+            positions = range(len(questions))
+        tasks = [self.run_one(index, questions[index]) for index in positions]
+        results = {}
+        for done in asyncio.as_completed(tasks):
+            index, record = await done
+            results[index] = record
+            if on_record is not None:
+                on_record(index, record)
+        return [results[index] for index in sorted(results)]
+
+
+async def run_chain(questions_path, databases_root, output_path, client, concurrency=8, prune_top_k=None,
+                    value_formats=False, shard=None, checkpoint_dir=None):
+    """Esegue la catena su un file di domande e salva i risultati in JSONL.
+
+    Con `shard` e `checkpoint_dir` come in sqlprompt.batch: solo i database dello
+    shard, e ogni risultato aggiunto al log appena pronto, così un nuovo avvio
+    riprende dalle domande mancanti.
+    """
+    questions = load_questions(questions_path)
+    selected = select_shard(questions, shard)
+    runner = ChainRunner(client, databases_root, concurrency, prune_top_k, value_formats)
+    if checkpoint_dir is None:
+        records = await runner.run(questions, selected)
+        write_records(dict(zip(selected, records)), output_path)
+    else:
+        with Checkpoint(checkpoint_dir, shard) as checkpoint:
+            done = checkpoint.done()
+            pending = [index for index in selected if index not in done]
+            print(f"📊 Domande: {len(selected)} su {len(questions)}, già completate: {len(selected) - len(pending)}")
+            await runner.run(questions, pending, checkpoint.append)
+            chosen = set(selected)
+            records = {index: record for index, record in checkpoint.records.items() if index in chosen}
+        write_records(records, output_path)
+        records = [records[index] for index in sorted(records)]
+    errors = sum(1 for record in records if 'error' in record)
+    print(f"✅ Catena completata: {len(records)} domande, {errors} errori. Risultati in: {output_path}")
+    return records, runner.metrics.summary()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Esegue automaticamente la catena prompt1 → prompt2")
+    parser.add_argument('questions', help="File delle domande BIRD (dev.json o .jsonl)")
+    parser.add_argument('--db-root', required=True, help="Cartella dei database (<db_id>/<db_id>.sqlite)")
+    parser.add_argument('--output', required=True, help="File JSONL dei risultati")
+    parser.add_argument('--base-url', default=os.environ.get('OPENAI_BASE_URL', 'http://localhost:8000/v1'))
+    parser.add_argument('--model', default=os.environ.get('OPENAI_MODEL', 'mock'))
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--metrics', default=None, help="File JSON per le latenze per fase")
+    parser.add_argument('--mock', action='store_true', help="Usa l'endpoint simulato locale")
+    parser.add_argument('--prune-top-k', type=int, default=None,
+                        help="Tiene nel prompt1 solo le K tabelle più rilevanti per la domanda (più i join)")
+    parser.add_argument('--value-formats', action='store_true',
+                        help="Aggiunge al prompt2 il riepilogo dei formati di tutti i valori delle colonne")
+    parser.add_argument('--shard', type=parse_shard, default=None,
+                        help="i/N: esegue solo i database dello shard i di N (0 <= i < N)")
+    parser.add_argument('--checkpoint', default=None,
+                        help="Cartella dei log dei risultati completati: un nuovo avvio riprende da dove si era fermato")
+    args = parser.parse_args()
+
+    server = None
+    base_url = args.base_url
+    if args.mock:
+        from sqlprompt.mock_llm import start_mock_server
+        server, base_url = start_mock_server()
+        print(f"🧪 Endpoint simulato su {base_url}")
+
+    client = ChatClient(base_url, args.model, api_key=os.environ.get('OPENAI_API_KEY'),
+                        timeout=args.timeout, retries=args.retries)
+    try:
+        _, metrics = asyncio.run(run_chain(args.questions, args.db_root, args.output, client, args.concurrency,
+                                           args.prune_top_k, args.value_formats, args.shard,
+                                           args.checkpoint))
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    for stage, values in metrics.items():
+        print(f"  {stage}: media {values['mean_ms']} ms, p95 {values['p95_ms']} ms ({values['count']})")
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            json.dump(metrics, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
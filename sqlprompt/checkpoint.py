@@ -0,0 +1,142 @@
+"""Esecuzioni riprendibili e divise in shard per file di domande molto grandi.
+
+Esempio:
+    python -m sqlprompt.batch train.json --db-root train_databases --output prompts.jsonl \\
+        --shard 0/4 --checkpoint checkpoint
+    python -m sqlprompt.checkpoint checkpoint --output prompts.jsonl
+
+Ogni database appartiene a un solo shard (hash di db_id), così ogni processo apre
+solo i propri database. I record completati vengono aggiunti a un log JSONL per
+shard (<cartella>/shard-<i>-of-<N>.jsonl) con la posizione della domanda nel
+file: al riavvio le domande già presenti nel log vengono saltate e il merge
+produce un unico file nell'ordine delle domande.
+"""
+import argparse
+import json
+import os
+import re
+import zlib
+
+SHARD_FILE = re.compile(r'shard-(\d+)-of-(\d+)\.jsonl\Z')
+
+
+def parse_shard(text):
+    """'i/N' → (i, N), con 0 <= i < N (tipo per argparse)"""
+    match = re.fullmatch(r'(\d+)/(\d+)', text.strip())
+    if not match or not 0 <= int(match.group(1)) < int(match.group(2)):
+        raise argparse.ArgumentTypeError(f"Shard non valido: {text} (atteso i/N con 0 <= i < N)")
+    return int(match.group(1)), int(match.group(2))
+
+
+def shard_of(db_id, count):
+    """Shard del database: lo stesso su ogni macchina e in ogni run"""
+    return zlib.crc32(db_id.encode('utf-8')) % count
+
+
+def select_shard(questions, shard):
+    """Posizioni delle domande dello shard (tutte se shard è None)"""
+    if shard is None:
+        return list(range(len(questions)))
+    index, count = shard
+    return [position for position, item in enumerate(questions) if shard_of(item['db_id'], count) == index]
+
+
+class Checkpoint:
+    """Log append-only dei record completati di uno shard"""
+
+    def __init__(self, folder, shard=None):
+        index, count = shard or (0, 1)
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, f"shard-{index}-of-{count}.jsonl")
+        self.records = read_log(self.path, repair=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+
+    def done(self):
+        """Posizioni delle domande completate senza errori"""
+        return {index for index, record in self.records.items() if 'error' not in record}
+
+    def append(self, index, record):
+        self.records[index] = record
+        self._file.write(json.dumps({'index': index, 'record': record}, ensure_ascii=False) + "\n")
+        self._file.flush()
+
+    def sync(self):
+        """Rende persistenti su disco i record scritti finora"""
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self.sync()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def read_log(path, repair=False):
+    """Record di un log {posizione: record}; a parità di posizione vale l'ultimo.
+
+    Con `repair` una riga finale incompleta (interruzione durante la scrittura)
+    viene tolta dal file, così le righe aggiunte dopo restano valide.
+    """
+    records = {}
+    if not os.path.exists(path):
+        return records
+    valid = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                break
+            if not line.endswith(b'\n'):
+                break
+            records[entry['index']] = entry['record']
+            valid += len(line)
+    if repair and valid < os.path.getsize(path):
+        print(f"⚠️ Riga incompleta rimossa da {path}")
+        with open(path, 'r+b') as f:
+            f.truncate(valid)
+    return records
+
+
+def write_records(records, output_path):
+    """Scrive i record {posizione: record} in JSONL nell'ordine delle domande"""
+    with open(output_path, 'w', encoding='utf-8') as f:
+        for index in sorted(records):
+            f.write(json.dumps(records[index], ensure_ascii=False) + "\n")
+
+
+def merge(folder, output_path):
+    """Unisce i log degli shard in un unico file ordinato; restituisce (record, shard mancanti)"""
+    records = {}
+    shards = {}
+    for filename in sorted(os.listdir(folder)):
+        match = SHARD_FILE.match(filename)
+        if match:
+            shards.setdefault(int(match.group(2)), set()).add(int(match.group(1)))
+            records.update(read_log(os.path.join(folder, filename)))
+    if len(shards) > 1:
+        raise ValueError(f"Log con numeri di shard diversi in {folder}: {sorted(shards)}")
+    missing = [index for count, present in shards.items() for index in range(count) if index not in present]
+    write_records(records, output_path)
+    return len(records), missing
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Unisce i log degli shard in un unico file ordinato")
+    parser.add_argument('folder', help="Cartella dei log (--checkpoint di batch o chain)")
+    parser.add_argument('--output', required=True, help="File JSONL di output")
+    args = parser.parse_args()
+    count, missing = merge(args.folder, args.output)
+    if missing:
+        print(f"⚠️ Shard senza log: {', '.join(map(str, missing))}")
+    print(f"✅ {count} record uniti in: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""Profilo per colonna dei database (cardinalità, valori nulli, min/max, tipi) salvato accanto al file.
+
+Il profilo si calcola solo con aggregati nativi di SQLite: conteggi, min e max
+in una scansione per gruppo di colonne, valori distinti stimati con un GROUP BY
+su un campione limitato di righe (finestre di rowid). Per i valori distinti si
+usa di proposito lo stimatore GEE sul campione al posto di un HyperLogLog
+sull'intera colonna: l'HyperLogLog richiederebbe una funzione Python chiamata
+per ogni riga, mentre il campione costa al più DISTINCT_SAMPLE_ROWS righe e
+l'errore resta accettabile per scegliere la strategia di campionamento.
+
+La generazione dei prompt non lo costruisce mai: usa quello salvato
+(`python -m sqlprompt.column_profile <db.sqlite>` lo calcola). Con
+SQLPROMPT_PROFILE_BACKGROUND=1 un profilo mancante viene costruito in un thread
+in background per le richieste successive (utile nei processi lunghi, come il
+servizio HTTP); il thread non trattiene il processo all'uscita.
+Un profilo interrotto dal limite di tempo viene salvato parziale, con le tabelle
+saltate, così il tempo perso non si ripete a ogni esecuzione.
+"""
+import hashlib
+import json
+import math
+import os
+import queue
+import sys
+import threading
+
+from sqlprompt.budget import BudgetExceeded, database_budget, remaining, time_limit
+from sqlprompt.connections import readonly_uri
+from sqlprompt.instrumentation import connect, current_tracer
+from sqlprompt.sample_cache import cache_dir, db_fingerprint
+from sqlprompt.sampling import bounded_expression, example_filter, quote_identifier, rowid_alias, rowid_bounds
+
+PROFILE_VERSION = 3
+COLUMNS_PER_QUERY = 150  # Tiene le query di aggregazione sotto il limite di colonne di SQLite
+MAX_TEXT_IN_PROFILE = 100
+ENUMERATE_MAX_DISTINCT = 16
+DISTINCT_SAMPLE_ROWS = 10000  # Righe lette al massimo per stimare i valori distinti di una tabella
+DISTINCT_SAMPLE_WINDOWS = 8   # Finestre di rowid distribuite sulla tabella in cui sono lette
+BACKGROUND_ENV = 'SQLPROMPT_PROFILE_BACKGROUND'
+
+
+def _distinct_sample(cursor, table, columns, row_count):
+    """Sottoquery con al più DISTINCT_SAMPLE_ROWS righe delle colonne, lette in finestre di rowid distribuite"""
+    tbl = quote_identifier(table)
+    names = ", ".join(quote_identifier(col) for col in columns)
+    alias = rowid_alias(cursor, table)
+    if alias is None or row_count <= DISTINCT_SAMPLE_ROWS:
+        return f"SELECT {names} FROM {tbl} LIMIT {DISTINCT_SAMPLE_ROWS}"
+    low, high = rowid_bounds(cursor, table, alias)
+    step = max((high - low) // DISTINCT_SAMPLE_WINDOWS, 1)
+    size = DISTINCT_SAMPLE_ROWS // DISTINCT_SAMPLE_WINDOWS
+    # UNION (non ALL) con il rowid: finestre sovrapposte su rowid radi non contano due volte una riga
+    return " UNION ".join(
+        f"SELECT * FROM (SELECT {alias}, {names} FROM {tbl} WHERE {alias} >= {low + i * step} "
+        f"ORDER BY {alias} LIMIT {size})" for i in range(DISTINCT_SAMPLE_WINDOWS))
+
+
+def estimate_distinct(cursor, sample, column, total):
+    """Valori distinti non nulli della colonna stimati dal campione (stimatore GEE, scelto al posto di
+    HyperLogLog perché non richiede di leggere l'intera colonna).
+
+    Con n valori nel campione su `total` nella tabella, i valori visti una sola
+    volta (f1) rappresentano anche quelli mai visti: sqrt(total/n)·f1 + Σ f_j (j ≥ 2).
+    Se il campione contiene tutti i valori il conteggio è esatto, se nessun valore
+    si ripete la colonna è considerata univoca.
+    """
+    col = quote_identifier(column)
+    cursor.execute(f"SELECT count(*), sum(c = 1), sum(c) FROM "
+                   f"(SELECT count(*) AS c FROM ({sample}) WHERE {col} IS NOT NULL GROUP BY {col})")
+    distinct, singletons, seen = cursor.fetchone()
+    if not distinct:
+        return 0
+    if seen >= total:
+        return distinct
+    if singletons == seen:
+        return total   # Nessun valore ripetuto nel campione: colonna (quasi) univoca
+    estimate = math.sqrt(total / seen) * singletons + (distinct - singletons)
+    return int(round(min(max(estimate, distinct), total)))
+
+
+def profile_table(conn, table):
+    """Calcola il profilo di tutte le colonne di una tabella con una scansione per gruppo di colonne"""
+    cursor = conn.cursor()
+    tbl = quote_identifier(table)
+    cursor.execute(f"PRAGMA table_info({tbl});")
+    columns = [row[1] for row in cursor.fetchall()]
+
+    row_count = cursor.execute(f"SELECT count(*) FROM {tbl}").fetchone()[0]
+    stats = {}
+    for start in range(0, len(columns), COLUMNS_PER_QUERY):
+        group = columns[start:start + COLUMNS_PER_QUERY]
+        expressions = []
+        for column in group:
+            col = quote_identifier(column)
+            not_blob = f"CASE WHEN typeof({col}) = 'blob' THEN NULL ELSE {col} END"
+            expressions += [
+                f"sum({col} IS NULL)",
+                f"sum(CASE WHEN {col} = '' THEN 1 ELSE 0 END)",
+                f"sum(CASE WHEN {col} = 0 THEN 1 ELSE 0 END)",
+                f"sum(CASE WHEN {example_filter(column)} THEN 1 ELSE 0 END)",
+                # Troncati dentro SQLite: un testo enorme non arriva mai in Python
+                bounded_expression(f"min({not_blob})", MAX_TEXT_IN_PROFILE),
+                bounded_expression(f"max({not_blob})", MAX_TEXT_IN_PROFILE),
+                f"sum(typeof({col}) = 'integer')",
+                f"sum(typeof({col}) = 'real')",
+                f"sum(typeof({col}) = 'text')",
+                f"sum(typeof({col}) = 'blob')",
+            ]
+        row = cursor.execute(f"SELECT {', '.join(expressions)} FROM {tbl}").fetchone()
+        for i, column in enumerate(group):
+            (nulls, empties, zeros, valid, minimum, maximum,
+             integers, reals, texts, blobs) = row[i * 10:(i + 1) * 10]
+            stats[column] = {
+                'null_count': nulls or 0,
+                'empty_count': empties or 0,
+                'zero_count': zeros or 0,
+                'valid_count': valid or 0,
+                'min': minimum,
+                'max': maximum,
+                'types': {'integer': integers or 0, 'real': reals or 0, 'text': texts or 0, 'blob': blobs or 0},
+            }
+
+    sample = _distinct_sample(cursor, table, columns, row_count)
+    for column in columns:
+        stats[column]['distinct_estimate'] = estimate_distinct(cursor, sample, column,
+                                                               row_count - stats[column]['null_count'])
+    return {'row_count': row_count, 'columns': stats}
+
+
+def build_profile(db_path):
+    """Profila tutte le tabelle di un database aprendolo in sola lettura.
+
+    Dentro un limite di tempo del database (budget.database_budget) può usarne al
+    massimo metà: le tabelle non profilate in tempo finiscono in 'skipped' e il
+    profilo parziale resta valido (le loro colonne sono campionate senza profilo).
+    """
+    real_path, fingerprint = db_fingerprint(db_path)
+    conn = connect(readonly_uri(real_path), uri=True)
+    tracer = current_tracer()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';")
+        tables = [row[0] for row in cursor.fetchall()]
+        profile = {
+            'version': PROFILE_VERSION,
+            'db_path': real_path,
+            'fingerprint': fingerprint,
+            'tables': {},
+            'skipped': [],
+        }
+        try:
+            with time_limit(conn, remaining(share=0.5)):
+                for table in tables:
+                    with tracer.span('profile_table', table=table):
+                        profile['tables'][table] = profile_table(conn, table)
+        except BudgetExceeded:
+            profile['skipped'] = [table for table in tables if table not in profile['tables']]
+            tracer.count('profile.budget_partial', tables=", ".join(profile['skipped']))
+            print(f"⚠️ Profilo parziale di {os.path.basename(real_path)}: limite di tempo superato, "
+                  f"tabelle saltate: {', '.join(profile['skipped'])}")
+    finally:
+        conn.close()
+    return profile
+
+
+def profile_paths(db_path):
+    """Percorsi candidati del profilo: accanto al database, poi nella cartella di cache"""
+    real_path = os.path.realpath(db_path)
+    digest = hashlib.sha1(real_path.encode('utf-8')).hexdigest()
+    return [real_path + '.profile.json', os.path.join(cache_dir(), 'profiles', f'{digest}.json')]
+
+
+def _read_profile(path, fingerprint):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            profile = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if profile.get('version') != PROFILE_VERSION or profile.get('fingerprint') != fingerprint:
+        return None
+    return profile
+
+
+def save_profile(db_path, profile):
+    """Scrive il profilo nel primo percorso scrivibile; restituisce il percorso usato"""
+    for path in profile_paths(db_path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            return path
+        except OSError:
+            continue
+    return None
+
+
+_loaded = {}
+
+
+def load_profile(db_path, build=True):
+    """Restituisce il profilo aggiornato del database, costruendolo se manca (se `build`)"""
+    try:
+        real_path, fingerprint = db_fingerprint(db_path)
+    except OSError:
+        return None
+    cached = _loaded.get(real_path)
+    if cached is not None and cached['fingerprint'] == fingerprint:
+        return cached
+
+    from sqlprompt.context_pack import is_pack, pack_profile
+    if is_pack(real_path):
+        profile = pack_profile(real_path)   # Profilo del database originale, calcolato alla compilazione
+        _loaded[real_path] = profile
+        return profile
+
+    for path in profile_paths(real_path):
+        profile = _read_profile(path, fingerprint)
+        if profile is not None:
+            _loaded[real_path] = profile
+            return profile
+
+    if not build:
+        return None
+    profile = build_profile(real_path)
+    save_profile(real_path, profile)
+    _loaded[real_path] = profile
+    return profile
+
+
+_builder = None
+_building = set()
+_builder_lock = threading.Lock()
+_pending = queue.Queue()
+
+
+def _build_in_background(real_path):
+    try:
+        with database_budget():
+            profile = build_profile(real_path)
+        save_profile(real_path, profile)
+        _loaded[real_path] = profile
+    except Exception as e:
+        print(f"⚠️ Profilo di {os.path.basename(real_path)} non calcolato: {str(e)}")
+    finally:
+        with _builder_lock:
+            _building.discard(real_path)
+
+
+def _build_pending():
+    while True:
+        real_path = _pending.get()
+        try:
+            _build_in_background(real_path)
+        finally:
+            _pending.task_done()
+
+
+def background_builds():
+    """Vero se i profili mancanti vanno costruiti in background (SQLPROMPT_PROFILE_BACKGROUND=1)"""
+    return os.environ.get(BACKGROUND_ENV, '0') == '1'
+
+
+def wait_for_background_builds():
+    """Attende i profili in costruzione in background"""
+    _pending.join()
+
+
+def prompt_profile(db_path):
+    """Profilo per la generazione dei prompt, senza mai costruirlo mentre si genera.
+
+    Restituisce il profilo salvato, None se manca. Con background_builds() ne
+    avvia intanto la costruzione in un thread daemon, uno alla volta: un
+    processo che esce prima non attende (il profilo non viene salvato).
+    """
+    global _builder
+    profile = load_profile(db_path, build=False)
+    if profile is not None or not background_builds() or not db_path or not os.path.isfile(db_path):
+        return profile
+    real_path = os.path.realpath(db_path)
+    with _builder_lock:
+        if real_path in _building:
+            return None
+        _building.add(real_path)
+        if _builder is None:
+            _builder = threading.Thread(target=_build_pending, name='sqlprompt-profile', daemon=True)
+            _builder.start()
+    _pending.put(real_path)
+    return None
+
+
+def column_stats(profile, table, column):
+    """Statistiche di una colonna, None se il profilo non la conosce"""
+    if not profile:
+        return None
+    return profile['tables'].get(table, {}).get('columns', {}).get(column)
+
+
+def sampling_strategy(stats, limit=2):
+    """Sceglie come campionare una colonna in base al profilo.
+
+    'skip' se non esistono valori validi, ('enumerate', n) se i valori distinti
+    sono pochi (basta una scansione DISTINCT che si ferma dopo n valori),
+    altrimenti 'rowid'.
+    """
+    if stats is None:
+        return 'rowid'
+    if stats['valid_count'] == 0:
+        return 'skip'
+    if stats['distinct_estimate'] <= max(ENUMERATE_MAX_DISTINCT, limit):
+        # Margine per l'errore della stima sul campione
+        return ('enumerate', int(stats['distinct_estimate'] * 1.1) + 2)
+    return 'rowid'
+
+
+def table_strategies(profile, table, columns, limit=2):
+    """Strategie di campionamento per le colonne di una tabella (vuoto senza profilo)"""
+    if not profile:
+        return {}
+    return {col: sampling_strategy(column_stats(profile, table, col), limit) for col in columns}
+
+
+if __name__ == "__main__":
+    for path in sys.argv[1:]:
+        built = build_profile(path)
+        print(f"✅ Profilo salvato in: {save_profile(path, built)}")
@@ -0,0 +1,158 @@
+"""Connessioni SQLite in sola lettura per l'analisi dei database, riusate tra un prompt e l'altro.
+
+Il pool tiene aperte le connessioni dei database già analizzati: pagine in cache,
+schema già letto e istruzioni già preparate restano disponibili per le domande
+successive sullo stesso database. Le connessioni inattive vengono chiuse quando
+superano il limite di memoria (SQLPROMPT_POOL_MEMORY_MB) o il tempo massimo di
+inattività (SQLPROMPT_POOL_IDLE, secondi); SQLPROMPT_POOL=0 disattiva il riuso.
+"""
+import atexit
+import contextlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import quote
+
+from sqlprompt.instrumentation import connect, current_tracer
+from sqlprompt.sample_cache import db_fingerprint
+
+MMAP_SIZE = 256 * 1024 * 1024  # Pagine lette direttamente dalla mappa di memoria, senza copie nella cache
+CACHE_SIZE_KB = 16 * 1024      # Cache delle pagine per connessione
+CACHED_STATEMENTS = 256        # Istruzioni preparate tenute da ogni connessione
+DEFAULT_POOL_MEMORY_MB = 256
+DEFAULT_POOL_IDLE = 300.0
+
+
+def readonly_uri(db_path, immutable=True):
+    """URI SQLite in sola lettura; `immutable` evita lock e controlli di modifica del file"""
+    uri = f"file:{quote(db_path)}?mode=ro"
+    return uri + "&immutable=1" if immutable else uri
+
+
+def open_readonly(db_path, immutable=True, mmap_size=MMAP_SIZE, cache_size_kb=CACHE_SIZE_KB,
+                  check_same_thread=True):
+    """Apre il database in sola lettura con mmap, cache delle pagine e tabelle temporanee in memoria"""
+    conn = connect(readonly_uri(db_path, immutable), uri=True, check_same_thread=check_same_thread,
+                   cached_statements=CACHED_STATEMENTS)
+    conn.execute(f"PRAGMA mmap_size={int(mmap_size)};")
+    conn.execute(f"PRAGMA cache_size=-{int(cache_size_kb)};")
+    conn.execute("PRAGMA temp_store=MEMORY;")
+    return conn
+
+
+class ConnectionPool:
+    """Connessioni in sola lettura per database, riusate e chiuse per prime quelle inattive da più tempo.
+
+    La chiave comprende dimensione e mtime del file: un database modificato non
+    riusa le connessioni aperte con `immutable=1` sulla versione precedente.
+    """
+
+    def __init__(self, memory_mb=DEFAULT_POOL_MEMORY_MB, idle_seconds=DEFAULT_POOL_IDLE,
+                 cache_size_kb=CACHE_SIZE_KB):
+        self.memory_bytes = memory_mb * 1024 * 1024
+        self.idle_seconds = idle_seconds
+        self.cache_size_kb = cache_size_kb
+        self.opened = 0
+        self.reused = 0
+        self._idle = OrderedDict()   # (chiave, id) -> (connessione, istante di rilascio)
+        self._lock = threading.Lock()
+
+    def _key(self, db_path):
+        real_path, fingerprint = db_fingerprint(db_path)
+        return real_path, fingerprint, current_tracer().enabled
+
+    def _evict(self, now):
+        """Chiude le connessioni inattive oltre il tempo massimo o il limite di memoria"""
+        closing = []
+        with self._lock:
+            limit = max(self.memory_bytes // (self.cache_size_kb * 1024), 0)
+            for entry, (conn, released) in list(self._idle.items()):
+                if len(self._idle) > limit or now - released > self.idle_seconds:
+                    del self._idle[entry]
+                    closing.append(conn)
+        for conn in closing:
+            conn.close()
+
+    def acquire(self, db_path):
+        """Connessione libera del database, aperta se non ce n'è una inattiva"""
+        key = self._key(db_path)
+        with self._lock:
+            for entry in reversed(self._idle):
+                if entry[0] == key:
+                    conn, _ = self._idle.pop(entry)
+                    self.reused += 1
+                    return key, conn
+        conn = open_readonly(key[0], cache_size_kb=self.cache_size_kb, check_same_thread=False)
+        with self._lock:
+            self.opened += 1
+        return key, conn
+
+    def release(self, key, conn):
+        """Rende la connessione al pool, pronta per il prossimo prompt sullo stesso database"""
+        conn.row_factory = None
+        if conn.in_transaction:
+            conn.rollback()
+        now = time.monotonic()
+        with self._lock:
+            self._idle[(key, id(conn))] = (conn, now)
+        self._evict(now)
+
+    @contextlib.contextmanager
+    def connection(self, db_path):
+        """Connessione in prestito per la durata del blocco"""
+        key, conn = self.acquire(db_path)
+        try:
+            yield conn
+        except BaseException:
+            conn.close()
+            raise
+        self.release(key, conn)
+
+    def stats(self):
+        """Connessioni aperte, riusate e inattive finora"""
+        with self._lock:
+            return {'opened': self.opened, 'reused': self.reused, 'idle': len(self._idle)}
+
+    def close(self):
+        """Chiude tutte le connessioni inattive"""
+        with self._lock:
+            idle, self._idle = self._idle, OrderedDict()
+        for conn, _ in idle.values():
+            conn.close()
+
+
+def _pool_from_env():
+    return ConnectionPool(float(os.environ.get('SQLPROMPT_POOL_MEMORY_MB', DEFAULT_POOL_MEMORY_MB)),
+                          float(os.environ.get('SQLPROMPT_POOL_IDLE', DEFAULT_POOL_IDLE)))
+
+
+_default_pool = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool():
+    """Pool del processo, None se disattivato con SQLPROMPT_POOL=0"""
+    global _default_pool
+    if os.environ.get('SQLPROMPT_POOL', '1') == '0':
+        return None
+    with _default_pool_lock:
+        if _default_pool is None:
+            _default_pool = _pool_from_env()
+            atexit.register(_default_pool.close)
+        return _default_pool
+
+
+@contextlib.contextmanager
+def pooled(db_path):
+    """Connessione in sola lettura al database dal pool del processo (o nuova, se il pool è disattivato)"""
+    pool = get_default_pool()
+    if pool is not None:
+        with pool.connection(db_path) as conn:
+            yield conn
+        return
+    conn = open_readonly(db_path, check_same_thread=False)
+    try:
+        yield conn
+    finally:
+        conn.close()
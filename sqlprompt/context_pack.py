@@ -0,0 +1,292 @@
+"""Pacchetto di contesto di un database: un solo file per generare i prompt senza il database originale.
+
+Esempio:
+    python -m sqlprompt.context_pack --db-root dev_databases --output packs
+    python -m sqlprompt.batch dev.json --db-root packs --output prompts.jsonl
+
+Il pacchetto (<db_id>.dbpack) è un database SQLite con le stesse CREATE TABLE
+dell'originale (quindi anche le stesse chiavi esterne), ogni tabella riempita con
+al più POOL_SIZE valori distinti per colonna campionati con seed fisso (le chiavi
+e le colonne NOT NULL non coperte dal campione prendono i valori da righe vere,
+così ogni riga rispetta i vincoli), e la
+tabella PACK_TABLE con descrizioni delle colonne, chiavi esterne, profilo delle
+colonne, formati dei valori (sull'intera tabella) e schema commentato. Versione e
+formato sono nell'intestazione del file (application_id e user_version), così un
+pacchetto si riconosce senza aprirlo.
+
+Gli script lo usano come il database: generatori, prompt2 e batch lo aprono in
+sola lettura con mmap e campionano dai valori del pacchetto; profili e
+descrizioni vengono dal pacchetto invece che dal file originale e dai CSV.
+Con --db-root, una cartella con <db_id>.dbpack sostituisce il layout BIRD.
+"""
+import argparse
+import json
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlprompt.budget import database_budget
+from sqlprompt.column_profile import load_profile, table_strategies
+from sqlprompt.connections import open_readonly
+from sqlprompt.description_catalog import DescriptionCatalog, load_catalog, sources_signature
+from sqlprompt.format_profile import profile_formats
+from sqlprompt.rendering import list_tables
+from sqlprompt.sample_cache import db_fingerprint, default_seed, seeded_rng
+from sqlprompt.sampling import quote_identifier, sample_table
+
+PACK_VERSION = 3
+PACK_APPLICATION_ID = 0x53514C50   # 'SQLP'
+PACK_EXTENSION = '.dbpack'
+PACK_TABLE = 'sqlprompt_pack'
+POOL_SIZE = 32
+
+
+def is_pack(path):
+    """Vero se il file è un pacchetto di contesto (legge solo l'intestazione SQLite)"""
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(72)
+    except OSError:
+        return False
+    return (len(header) == 72 and header.startswith(b'SQLite format 3\0')
+            and int.from_bytes(header[68:72], 'big') == PACK_APPLICATION_ID)
+
+
+def pack_path(databases_root, db_id):
+    """Percorso del pacchetto di un database in una cartella di pacchetti"""
+    return os.path.join(databases_root, f"{db_id}{PACK_EXTENSION}")
+
+
+def foreign_key_list(cursor, table):
+    """Chiavi esterne della tabella: [{'columns', 'table', 'references'}] nell'ordine di dichiarazione"""
+    cursor.execute(f"PRAGMA foreign_key_list({quote_identifier(table)});")
+    keys = {}
+    for key_id, _, target, source, target_column, *_ in cursor.fetchall():
+        key = keys.setdefault(key_id, {'columns': [], 'table': target, 'references': []})
+        key['columns'].append(source)
+        if target_column:
+            key['references'].append(target_column)
+    return [keys[key_id] for key_id in sorted(keys, reverse=True)]  # SQLite numera dall'ultima dichiarata
+
+
+def _value_pools(cursor, table, columns, profile, seed):
+    """Valori distinti campionati per colonna: {colonna: [valori]}"""
+    return sample_table(cursor, table, columns, limit=POOL_SIZE, distinct=True,
+                        rng=seeded_rng(seed, 'context_pack', table),
+                        strategies=table_strategies(profile, table, columns, POOL_SIZE))
+
+
+def _key_groups(cursor, table, info):
+    """Colonne che insieme devono restare univoche: chiave primaria e vincoli UNIQUE della CREATE TABLE"""
+    groups = []
+    primary = [col[1] for col in sorted(info, key=lambda col: col[5]) if col[5]]
+    if primary:
+        groups.append(primary)
+    cursor.execute(f"PRAGMA index_list({quote_identifier(table)});")
+    for _, index, unique, origin, *_ in cursor.fetchall():
+        if unique and origin == 'u':
+            cursor.execute(f"PRAGMA index_info({quote_identifier(index)});")
+            groups.append([row[2] for row in cursor.fetchall()])
+    return groups
+
+
+def _pack_rows(cursor, table, pools):
+    """Righe del pacchetto: la riga i contiene l'i-esimo valore di ogni colonna (ciclico se ne ha meno).
+
+    Le righe devono rispettare i vincoli della CREATE TABLE originale. Una chiave
+    (PRIMARY KEY, UNIQUE) in cui nessuna colonna ha un valore distinto per riga, e
+    una colonna NOT NULL senza valori campionati (ad esempio ID filtrati dagli
+    esempi), prendono i valori da righe vere della tabella, che li rispettano.
+    """
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+    info = cursor.fetchall()
+    count = max((len(values) for values in pools.values()), default=0)
+    borrowed = []
+    for group in _key_groups(cursor, table, info):
+        if not any(len(pools[col]) >= count for col in group):
+            borrowed += [col for col in group if col not in borrowed]
+    borrowed += [col[1] for col in info if col[3] and not pools[col[1]] and col[1] not in borrowed]
+    real = []
+    if borrowed and count:
+        cursor.execute(f"SELECT {', '.join(quote_identifier(col) for col in borrowed)} "
+                       f"FROM {quote_identifier(table)} LIMIT ?", (count,))
+        real = [dict(zip(borrowed, row)) for row in cursor.fetchall()]
+
+    def value(col, position):
+        if col in borrowed:
+            return real[position][col] if position < len(real) else None
+        pool = pools[col]
+        return pool[position % len(pool)] if pool else None
+
+    return [tuple(value(col[1], position) for col in info) for position in range(count)]
+
+
+def _fill_table(pack, table, columns, rows):
+    """Inserisce le righe nel pacchetto; restituisce (righe inserite, valori distinti non nulli)"""
+    tbl = quote_identifier(table)
+    placeholders = ", ".join("?" for _ in columns)
+    names = ", ".join(quote_identifier(col) for col in columns)
+    # OR IGNORE: un vincolo CHECK dello schema originale può ancora scartare una riga, contata qui sotto
+    pack.executemany(f"INSERT OR IGNORE INTO {tbl} ({names}) VALUES ({placeholders})", rows)
+    inserted = pack.execute(f"SELECT count(*) FROM {tbl}").fetchone()[0]
+    if not columns:
+        return inserted, 0
+    distinct = pack.execute(f"SELECT {', '.join(f'count(DISTINCT {quote_identifier(col)})' for col in columns)} "
+                            f"FROM {tbl}").fetchone()
+    return inserted, sum(distinct)
+
+
+def build_pack(db_path, description_folder, output_path, db_id=None):
+    """Compila il pacchetto di contesto del database; restituisce (tabelle, righe, valori distinti salvati)"""
+    from sqlprompt.batch import database_schema
+    from sqlprompt.scripts import load_script
+
+    descriptions = load_catalog(description_folder)
+    seed = default_seed() or 0
+    with database_budget():
+        profile = load_profile(db_path)
+        conn = open_readonly(db_path)
+        try:
+            cursor = conn.cursor()
+            tables = list_tables(cursor)
+            commented_schema = load_script('SQLite_commentedSchema').append_comments_to_schema(
+                database_schema(cursor), descriptions)
+            contents = {}
+            formats = {}
+            for name, sql in tables:
+                cursor.execute(f"PRAGMA table_info({quote_identifier(name)});")
+                columns = [col[1] for col in cursor.fetchall()]
+                pools = _value_pools(cursor, name, columns, profile, seed)
+                contents[name] = (sql, columns, _pack_rows(cursor, name, pools), foreign_key_list(cursor, name))
+                try:
+                    formats[name] = profile_formats(conn, name, columns)
+                except sqlite3.Error as e:
+                    print(f"⚠️ Formati di {name} non calcolati: {str(e)}")
+        finally:
+            conn.close()
+
+    metadata = {
+        'meta': {'version': PACK_VERSION, 'db_id': db_id, 'source': db_fingerprint(db_path)[1],
+                 'descriptions': sources_signature(description_folder), 'pool_size': POOL_SIZE, 'seed': seed},
+        'descriptions': [list(key) + list(entry) for key, entry in sorted(descriptions.entries.items())],
+        'foreign_keys': {name: keys for name, (_, _, _, keys) in contents.items()},
+        'profile': profile,
+        'formats': formats,
+        'commented_schema': commented_schema,
+    }
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    pack = sqlite3.connect(tmp_path)
+    try:
+        pack.execute(f"PRAGMA application_id={PACK_APPLICATION_ID};")
+        pack.execute(f"PRAGMA user_version={PACK_VERSION};")
+        pack.execute("PRAGMA journal_mode=OFF;")
+        rows = values = 0
+        for name, (sql, columns, table_rows, _) in contents.items():
+            pack.execute(sql)   # Stessa DDL dell'originale, nello stesso ordine di sqlite_master
+            inserted, distinct = _fill_table(pack, name, columns, table_rows)
+            if inserted < len(table_rows):
+                print(f"⚠️ {name}: {len(table_rows) - inserted} righe su {len(table_rows)} scartate dai vincoli")
+            rows += inserted
+            values += distinct
+        pack.execute(f"CREATE TABLE {PACK_TABLE} (key TEXT PRIMARY KEY, value TEXT)")
+        pack.executemany(f"INSERT INTO {PACK_TABLE} VALUES (?, ?)",
+                         [(key, json.dumps(value, ensure_ascii=False)) for key, value in metadata.items()])
+        pack.commit()
+        pack.execute("VACUUM;")
+    finally:
+        pack.close()
+    os.replace(tmp_path, output_path)
+    return len(tables), rows, values
+
+
+_metadata = {}
+
+
+def read_pack(path, key):
+    """Valore della tabella dei metadati del pacchetto ('meta', 'descriptions', 'profile', ...)"""
+    real_path, fingerprint = db_fingerprint(path)
+    cached = _metadata.get(real_path)
+    if cached is None or cached[0] != fingerprint:
+        conn = open_readonly(real_path)
+        try:
+            rows = conn.execute(f"SELECT key, value FROM {PACK_TABLE}").fetchall()
+        finally:
+            conn.close()
+        cached = (fingerprint, {name: json.loads(value) for name, value in rows})
+        if cached[1]['meta'].get('version') != PACK_VERSION:
+            raise ValueError(f"Pacchetto di una versione diversa: ricostruirlo ({path})")
+        _metadata[real_path] = cached
+    return cached[1].get(key)
+
+
+def pack_catalog(path):
+    """Descrizioni delle colonne salvate nel pacchetto"""
+    entries = {(table, column): tuple(entry) for table, column, *entry in read_pack(path, 'descriptions')}
+    real_path, fingerprint = db_fingerprint(path)
+    return DescriptionCatalog(entries, {os.path.basename(real_path): fingerprint}, real_path)
+
+
+def pack_profile(path):
+    """Profilo delle colonne del database originale, con l'identità del pacchetto"""
+    profile = read_pack(path, 'profile')
+    if profile is None:
+        return None
+    real_path, fingerprint = db_fingerprint(path)
+    return dict(profile, db_path=real_path, fingerprint=fingerprint)
+
+
+def build_all(databases_root, output_dir, workers=None, force=False):
+    """Compila i pacchetti dei database cambiati; restituisce (compilati, saltati, errori)"""
+    from sqlprompt.schema_builder import find_databases
+
+    os.makedirs(output_dir, exist_ok=True)
+    pending = {}
+    databases = find_databases(databases_root)
+    for db_id, (db_path, description_folder) in databases.items():
+        output_path = pack_path(output_dir, db_id)
+        if not force and is_pack(output_path):
+            try:
+                meta = read_pack(output_path, 'meta')
+            except (sqlite3.Error, ValueError):
+                meta = None
+            if meta and (meta['source'], meta['descriptions']) == (db_fingerprint(db_path)[1],
+                                                                   sources_signature(description_folder)):
+                continue
+        pending[db_id] = (db_path, description_folder, output_path)
+    skipped = len(databases) - len(pending)
+    print(f"📊 Database: {len(databases)}, da compilare: {len(pending)}, invariati: {skipped}")
+
+    built = errors = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(build_pack, db_path, description_folder, output_path, db_id): db_id
+                       for db_id, (db_path, description_folder, output_path) in pending.items()}
+            for future in as_completed(futures):
+                db_id = futures[future]
+                try:
+                    tables, rows, values = future.result()
+                except Exception as e:
+                    errors += 1
+                    print(f"❌ Errore sul database {db_id}: {str(e)}")
+                    continue
+                built += 1
+                size = os.path.getsize(pending[db_id][2])
+                print(f"✅ {db_id}: {tables} tabelle, {rows} righe, {values} valori, {size / 1024:.0f} KB")
+    return built, skipped, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compila i pacchetti di contesto dei database di una cartella")
+    parser.add_argument('--db-root', required=True, help="Cartella dei database (<db_id>/<db_id>.sqlite)")
+    parser.add_argument('--output', required=True, help=f"Cartella in cui scrivere <db_id>{PACK_EXTENSION}")
+    parser.add_argument('--workers', type=int, default=None, help="Numero di processi (default: CPU)")
+    parser.add_argument('--force', action='store_true', help="Ricompila anche i database invariati")
+    args = parser.parse_args()
+    built, skipped, errors = build_all(args.db_root, args.output, args.workers, args.force)
+    print(f"✅ Pacchetti compilati: {built}, invariati: {skipped}, errori: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""Lettura e riscrittura delle istruzioni CREATE TABLE di SQLite"""
+import re
+
+CREATE_TABLE = re.compile(r'CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|([^\s(]+))',
+                          re.IGNORECASE)
+IDENTIFIER = re.compile(r'^\s*(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|(\w+))')
+CONSTRAINT_KEYWORDS = ('foreign', 'primary', 'constraint', 'unique', 'check')
+COLUMN_LIST = re.compile(r'\(([^)]*)\)')
+COLUMN_LINE = re.compile(r'^\s*("?[\w\s\[\]\-]+"?)\s+[\w()]+.*?(,?)\s*$')  # Riga "colonna TIPO ..." di uno schema formattato
+CONSTRAINT_NAME = re.compile(r'^\s*constraint\s+(?:"[^"]*"|`[^`]*`|\[[^\]]*\]|\S+)\s*', re.IGNORECASE)
+QUOTES = {'"': '"', "'": "'", '`': '`', '[': ']'}  # Apertura → chiusura di stringhe e identificatori
+
+
+def _first_group(match):
+    return next(name for name in match.groups() if name)
+
+
+def _characters(text):
+    """(posizione, carattere, tra apici) per ogni carattere: stringhe '…' e identificatori "…", `…` e […]"""
+    closing = None
+    for position, char in enumerate(text):
+        if closing:
+            if char == closing:
+                closing = None
+            yield position, char, True
+        elif char in QUOTES:
+            closing = QUOTES[char]
+            yield position, char, True
+        else:
+            yield position, char, False
+
+
+def strip_comments(sql):
+    """Rimuove i commenti -- di fine riga e /* ... */, lasciando intatto il testo tra apici"""
+    parts, skip_until = [], 0
+    for position, char, quoted in _characters(sql):
+        if position < skip_until:
+            continue
+        if not quoted and sql.startswith('--', position):
+            end = sql.find('\n', position)
+            skip_until = len(sql) if end == -1 else end
+            continue
+        if not quoted and sql.startswith('/*', position):
+            end = sql.find('*/', position + 2)
+            skip_until = len(sql) if end == -1 else end + 2
+            parts.append(' ')
+            continue
+        parts.append(char)
+    return ''.join(parts)
+
+
+def split_definitions(body):
+    """Divide il corpo di una CREATE TABLE sulle virgole di primo livello"""
+    parts, depth, current = [], 0, []
+    for _, char, quoted in _characters(body):
+        if not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        if char == ',' and depth == 0 and not quoted:
+            parts.append(''.join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append(''.join(current).strip())
+    return [part for part in parts if part]
+
+
+def parse_create_table(sql):
+    """Restituisce (tabella, [(colonna, definizione)], [vincoli di tabella]) da una CREATE TABLE"""
+    sql = strip_comments(sql)
+    match = CREATE_TABLE.search(sql)
+    if not match or '(' not in sql[match.end():]:
+        return None, [], []
+    rest = sql[match.end():]
+    body = rest[rest.index('(') + 1:rest.rindex(')')]
+    columns, constraints = [], []
+    for definition in split_definitions(body):
+        name_match = IDENTIFIER.match(definition)
+        if not name_match or definition.split()[0].lower() in CONSTRAINT_KEYWORDS:
+            constraints.append(definition)
+        else:
+            columns.append((_first_group(name_match), definition))
+    return _first_group(match), columns, constraints
+
+
+def table_options(sql):
+    """Opzioni dopo la parentesi di chiusura di una CREATE TABLE (WITHOUT ROWID, STRICT), "" se assenti"""
+    sql = strip_comments(sql)
+    if ')' not in sql:
+        return ""
+    return sql[sql.rindex(')') + 1:].strip().rstrip(';').strip()
+
+
+def _check_clauses(definition):
+    """Clausole CHECK (...) di una definizione, fuori dagli apici e con le parentesi bilanciate"""
+    clauses, end = [], -1
+    characters = list(_characters(definition))
+    for position, char, quoted in characters:
+        if position <= end or quoted or definition[position:position + 5].lower() != 'check':
+            continue
+        if position > 0 and (definition[position - 1].isalnum() or definition[position - 1] == '_'):
+            continue
+        start = definition.find('(', position + 5)
+        if start == -1 or definition[position + 5:start].strip():
+            continue
+        depth, end = 0, len(definition) - 1
+        for inner, inner_char, inner_quoted in characters[start:]:
+            if inner_quoted:
+                continue
+            if inner_char == '(':
+                depth += 1
+            elif inner_char == ')':
+                depth -= 1
+                if depth == 0:
+                    end = inner
+                    break
+        clauses.append("CHECK " + definition[start:end + 1])
+    return clauses
+
+
+def check_constraints(sql):
+    """Vincoli CHECK di una CREATE TABLE, di colonna o di tabella, nell'ordine in cui compaiono"""
+    _, columns, constraints = parse_create_table(sql)
+    return [clause for definition in [text for _, text in columns] + constraints
+            for clause in _check_clauses(definition)]
+
+
+def _constraint_kind(constraint):
+    """Parola chiave di un vincolo di tabella (primary, unique, foreign, check), dopo l'eventuale CONSTRAINT nome"""
+    words = CONSTRAINT_NAME.sub('', constraint, count=1).split()
+    return words[0].lower().split('(')[0] if words else ''
+
+
+def _constraint_columns(constraint):
+    """Colonne locali citate da un vincolo PRIMARY KEY, UNIQUE o FOREIGN KEY (la prima lista tra parentesi);
+    [] per gli altri vincoli, come CHECK, la cui espressione non è una lista di colonne"""
+    if _constraint_kind(constraint) not in ('primary', 'unique', 'foreign'):
+        return []
+    match = COLUMN_LIST.search(constraint)
+    if not match:
+        return []
+    return [name.strip().strip('"`[]') for name in split_definitions(match.group(1))]
+
+
+def _referenced_table(constraint):
+    match = re.search(r'references\s+(?:"([^"]+)"|`([^`]+)`|\[([^\]]+)\]|(\w+))', constraint, re.IGNORECASE)
+    return _first_group(match) if match else None
+
+
+def prune_create_table(sql, keep_columns, keep_tables=None):
+    """Riscrive una CREATE TABLE tenendo solo le colonne indicate, una definizione per riga.
+
+    I vincoli PRIMARY KEY, UNIQUE e FOREIGN KEY restano solo se citano colonne
+    mantenute e, per le chiavi esterne, se la tabella referenziata è tra
+    `keep_tables`; i vincoli CHECK restano sempre, invariati.
+    """
+    table, columns, constraints = parse_create_table(sql)
+    if table is None:
+        return sql
+    keep = {name.lower() for name in keep_columns}
+    kept = [definition for name, definition in columns if name.lower() in keep]
+    for constraint in constraints:
+        referenced = _constraint_columns(constraint)
+        if referenced and not all(name.lower() in keep for name in referenced):
+            continue
+        target = _referenced_table(constraint)
+        if target and keep_tables is not None and target.lower() not in {t.lower() for t in keep_tables}:
+            continue
+        kept.append(constraint)
+    header = sql[:CREATE_TABLE.search(sql).end()]
+    options = table_options(sql)
+    return header + "\n(\n    " + ",\n    ".join(kept) + "\n)" + (f" {options}" if options else "")
+
+
+def format_create_table(sql):
+    """Riscrive una CREATE TABLE con una definizione per riga, senza togliere colonne né vincoli.
+
+    È lo stesso formato di prune_create_table: schemi completi e potati vengono
+    commentati riga per riga allo stesso modo e si possono confrontare.
+    """
+    table, columns, _ = parse_create_table(sql)
+    if table is None:
+        return sql
+    return prune_create_table(sql, [name for name, _ in columns])
@@ -0,0 +1,161 @@
+"""Catalogo compilato delle descrizioni delle colonne (cartelle database_description)"""
+import csv
+import hashlib
+import os
+import pickle
+import re
+import unicodedata
+
+from sqlprompt.sample_cache import cache_dir
+
+CATALOG_VERSION = 1
+
+
+def normalize(text):
+    """Normalizza nomi di tabelle e colonne per il matching"""
+    if not text:
+        return ""
+    text = unicodedata.normalize('NFKD', str(text).strip().lower()).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[\s\-_]+', ' ', text).strip()
+
+
+def _full_description(column_description, value_description):
+    full_desc = column_description
+    if value_description:
+        full_desc += f" ({value_description})" if full_desc else value_description
+    return full_desc
+
+
+class DescriptionCatalog:
+    """Descrizioni indicizzate per (tabella, colonna), con ripiego sul solo nome colonna"""
+
+    def __init__(self, entries=None, sources=None, folder=None):
+        # {(tabella_norm, colonna_norm): (column_description, value_description, data_format)}
+        self.entries = entries or {}
+        self.sources = sources or {}
+        self.folder = folder
+        self.by_column = {}
+        for (_, column), entry in self.entries.items():
+            self.by_column[column] = entry
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def signature(self):
+        """Identità del catalogo: cartella e mtime/dimensione di ogni CSV"""
+        return self.folder, tuple(sorted(self.sources.items()))
+
+    def raw(self, table, column):
+        """Tupla (column_description, value_description, data_format) o None"""
+        column_key = normalize(column)
+        if table is not None:
+            entry = self.entries.get((normalize(table), column_key))
+            if entry is not None:
+                return entry
+        return self.by_column.get(column_key)
+
+    def describe(self, table, column):
+        """Descrizione completa della colonna ("" se assente)"""
+        entry = self.raw(table, column)
+        if entry is None:
+            return ""
+        return _full_description(entry[0], entry[1])
+
+    def table_entries(self, table):
+        """Colonne descritte di una tabella: {colonna_norm: tupla}"""
+        table_key = normalize(table)
+        return {column: entry for (tbl, column), entry in self.entries.items() if tbl == table_key}
+
+
+def _scan_sources(folder_path):
+    sources = {}
+    for entry in os.scandir(folder_path):
+        if entry.is_file() and entry.name.lower().endswith('.csv'):
+            stat = entry.stat()
+            sources[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return sources
+
+
+def sources_signature(folder_path):
+    """Nome, mtime e dimensione dei CSV di una cartella di descrizioni ([] se la cartella manca)"""
+    if not folder_path or not os.path.isdir(folder_path):
+        return []
+    return sorted([name, mtime, size] for name, (mtime, size) in _scan_sources(folder_path).items())
+
+
+def compile_catalog(folder_path, sources=None):
+    """Legge tutti i CSV della cartella e costruisce il catalogo"""
+    entries = {}
+    sources = sources if sources is not None else _scan_sources(folder_path)
+    for filename in sorted(sources):
+        table_key = normalize(os.path.splitext(filename)[0])
+        try:
+            with open(os.path.join(folder_path, filename), 'r', encoding='utf-8-sig') as f:
+                reader = csv.DictReader(f)
+
+                for row in reader:
+                    original_column_name = row.get('original_column_name') or ''
+                    column_description = (row.get('column_description') or '').strip()
+                    value_description = (row.get('value_description') or '').strip()
+                    data_format = (row.get('data_format') or '').strip()
+
+                    column_key = normalize(original_column_name)
+                    if column_key and (column_description or value_description):
+                        entries[(table_key, column_key)] = (column_description, value_description, data_format)
+
+        except Exception as e:
+            print(f"⚠️ Errore lettura file {filename}: {str(e)}")
+            continue
+    return DescriptionCatalog(entries, sources, folder_path)
+
+
+def catalog_index_path(folder_path):
+    """Percorso dell'indice compilato per una cartella di descrizioni"""
+    digest = hashlib.sha1(os.path.realpath(folder_path).encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir(), 'catalogs', f'{digest}.pickle')
+
+
+_loaded = {}
+
+
+def load_catalog(folder_path):
+    """Carica il catalogo dall'indice compilato, ricompilandolo solo se un CSV è cambiato.
+
+    Un pacchetto di contesto (sqlprompt.context_pack) al posto della cartella fornisce le sue descrizioni.
+    """
+    if folder_path and os.path.isfile(folder_path):
+        from sqlprompt.context_pack import is_pack, pack_catalog
+        if is_pack(folder_path):
+            return pack_catalog(folder_path)
+    if not folder_path or not os.path.isdir(folder_path):
+        return DescriptionCatalog()
+
+    real_path = os.path.realpath(folder_path)
+    sources = _scan_sources(real_path)
+    cached = _loaded.get(real_path)
+    if cached is not None and cached.sources == sources:
+        return cached
+
+    index_path = catalog_index_path(real_path)
+    try:
+        with open(index_path, 'rb') as f:
+            version, stored_sources, entries = pickle.load(f)
+        if version == CATALOG_VERSION and stored_sources == sources:
+            catalog = DescriptionCatalog(entries, sources, real_path)
+            _loaded[real_path] = catalog
+            return catalog
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    catalog = compile_catalog(real_path, sources)
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((CATALOG_VERSION, sources, catalog.entries), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, index_path)
+    except OSError as e:
+        print(f"⚠️ Impossibile salvare l'indice delle descrizioni: {e}")
+    _loaded[real_path] = catalog
+    return catalog
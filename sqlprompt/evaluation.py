@@ -0,0 +1,214 @@
+"""Valutazione dell'accuratezza di esecuzione (EX di BIRD) delle query generate dalla catena.
+
+Esempio:
+    python -m sqlprompt.evaluation chain.jsonl --gold dev.json --db-root dev_databases --output ex.jsonl
+
+Query predette e di riferimento vengono eseguite sul database in sola lettura, su
+un pool di processi, con un limite di tempo per query (progress handler di SQLite)
+e un limite di righe. Come nella valutazione ufficiale di BIRD, una predizione è
+corretta se l'insieme delle righe restituite coincide con quello della query di
+riferimento. Gli esiti sono salvati in una cache persistente (sqlprompt.result_cache)
+indicizzata per SQL normalizzato e database: tra un run e il successivo vengono
+rieseguite solo le query cambiate.
+"""
+import argparse
+import json
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlprompt.batch import group_by_database, load_questions, question_id
+from sqlprompt.budget import BudgetExceeded, time_limit
+from sqlprompt.chain import StageMetrics
+from sqlprompt.connections import pooled
+from sqlprompt.result_cache import get_result_cache, result_digest
+from sqlprompt.scripts import bird_paths
+
+DEFAULT_TIMEOUT = 30.0     # Secondi per query, come nella valutazione di BIRD
+DEFAULT_MAX_ROWS = 100000  # Oltre, la query è considerata non valutabile
+CHUNK_SIZE = 64            # Domande per attività del pool
+BIRD_SEPARATOR = '\t----- bird -----\t'
+
+
+def load_predictions(path):
+    """Query predette per question_id: JSONL della catena (predicted_sql) o predict_dev.json di BIRD"""
+    with open(path, 'r', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            records = [json.loads(line) for line in f if line.strip()]
+            return {str(record['question_id']): record.get('predicted_sql') or '' for record in records}
+        data = json.load(f)
+    if isinstance(data, dict):
+        return {str(key): value.split(BIRD_SEPARATOR)[0] for key, value in data.items()}
+    return {str(question_id(index, item)): item.get('predicted_sql') or '' for index, item in enumerate(data)}
+
+
+def execute(conn, sql, timeout=DEFAULT_TIMEOUT, max_rows=DEFAULT_MAX_ROWS):
+    """Esegue una query: esito ('ok', 'timeout', 'too_many_rows' o 'error: ...'), impronta dell'insieme
+    delle righe, numero di righe e millisecondi"""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    digest = rows = None
+    try:
+        with time_limit(conn, timeout or None):
+            cursor.execute(sql)
+            rows = []
+            while True:
+                batch = cursor.fetchmany(1000)
+                if not batch:
+                    status = 'ok'
+                    break
+                rows += batch
+                if len(rows) > max_rows:
+                    rows, status = None, 'too_many_rows'
+                    break
+    except BudgetExceeded:
+        rows, status = None, 'timeout'
+    except Exception as e:
+        rows, status = None, f"error: {e}"
+    finally:
+        cursor.close()
+    if rows is not None:
+        digest = result_digest(rows)
+    return {'status': status, 'digest': digest, 'rows': len(rows) if rows is not None else None,
+            'ms': round((time.perf_counter() - start) * 1000, 2)}
+
+
+def run_query(conn, db_path, sql, timeout, max_rows, cache):
+    """Esito della query dalla cache degli esiti, eseguendola solo se manca"""
+    if cache is None:
+        return dict(execute(conn, sql, timeout, max_rows), cached=False)
+    hits = cache.hits
+    outcome = cache.get_or_execute(db_path, sql, {'timeout': timeout, 'max_rows': max_rows},
+                                   lambda: execute(conn, sql, timeout, max_rows))
+    return dict(outcome, cached=cache.hits != hits)
+
+
+def evaluate_chunk(db_path, pairs, timeout=DEFAULT_TIMEOUT, max_rows=DEFAULT_MAX_ROWS):
+    """Valuta le coppie (indice, predetta, riferimento) di un database con una connessione del pool"""
+    cache = get_result_cache()
+    results = []
+    with pooled(db_path) as conn:
+        for index, predicted, gold in pairs:
+            gold_outcome = run_query(conn, db_path, gold, timeout, max_rows, cache)
+            result = {'gold_status': gold_outcome['status'], 'gold_ms': gold_outcome['ms'],
+                      'gold_cached': gold_outcome['cached'], 'correct': False}
+            if not predicted:
+                result.update(predicted_status='missing', predicted_ms=0.0, predicted_cached=False)
+            else:
+                outcome = run_query(conn, db_path, predicted, timeout, max_rows, cache)
+                result.update(predicted_status=outcome['status'], predicted_ms=outcome['ms'],
+                              predicted_cached=outcome['cached'])
+                if outcome['status'] == 'ok' and gold_outcome['status'] == 'ok':
+                    # Stesso insieme di righe, come nella metrica EX di BIRD
+                    result['correct'] = outcome['digest'] == gold_outcome['digest']
+            results.append((index, result))
+    return results
+
+
+def summarize(records):
+    """Accuratezza complessiva e per difficoltà, esiti delle esecuzioni e latenze"""
+    metrics = StageMetrics()
+    statuses = Counter()
+    cached = 0
+    by_difficulty = OrderedDict()
+    for record in records:
+        for side in ('predicted', 'gold'):
+            status = record.get(f'{side}_status', 'error')
+            statuses[f"{side}_{status.split(':')[0]}"] += 1
+            if record.get(f'{side}_cached'):
+                cached += 1
+            elif record.get(f'{side}_ms'):
+                metrics.record(side, record[f'{side}_ms'] / 1000)  # Solo le query eseguite davvero
+        difficulty = record.get('difficulty')
+        if difficulty:
+            counts = by_difficulty.setdefault(difficulty, [0, 0])
+            counts[0] += record['correct']
+            counts[1] += 1
+
+    correct = sum(1 for record in records if record['correct'])
+    return {
+        'questions': len(records),
+        'correct': correct,
+        'accuracy': round(correct / len(records), 4) if records else None,
+        'by_difficulty': {name: {'accuracy': round(hits / total, 4), 'questions': total}
+                          for name, (hits, total) in by_difficulty.items()},
+        'statuses': dict(sorted(statuses.items())),
+        'cached_executions': cached,
+        'latency': metrics.summary(),
+    }
+
+
+def run_evaluation(predictions_path, gold_path, databases_root, output_path=None, workers=None,
+                   timeout=DEFAULT_TIMEOUT, max_rows=DEFAULT_MAX_ROWS):
+    """Valuta tutte le predizioni distribuendo le query su un pool di processi; restituisce il riepilogo"""
+    predictions = load_predictions(predictions_path)
+    questions = load_questions(gold_path)
+
+    records = {}
+    tasks = []
+    for db_id, items in group_by_database(questions).items():
+        db_path, _ = bird_paths(databases_root, db_id)
+        pairs = []
+        for index, item in items:
+            qid = question_id(index, item)
+            records[index] = {'question_id': qid, 'db_id': db_id, 'difficulty': item.get('difficulty')}
+            pairs.append((index, predictions.get(str(qid), ''), item.get('SQL') or item.get('query') or ''))
+        for start in range(0, len(pairs), CHUNK_SIZE):
+            tasks.append((db_id, db_path, pairs[start:start + CHUNK_SIZE]))
+    print(f"📊 Domande: {len(questions)}, predizioni: {len(predictions)}, attività: {len(tasks)}")
+
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(evaluate_chunk, db_path, pairs, timeout, max_rows): (db_id, pairs)
+                   for db_id, db_path, pairs in tasks}
+        for future in as_completed(futures):
+            db_id, pairs = futures[future]
+            try:
+                for index, result in future.result():
+                    records[index].update(result)
+            except Exception as e:
+                print(f"❌ Errore sul database {db_id}: {str(e)}")
+                for index, _, _ in pairs:
+                    records[index].update(correct=False, predicted_status=f"error: {e}",
+                                          gold_status=f"error: {e}")
+
+    ordered = [records[index] for index in sorted(records)]
+    summary = summarize(ordered)
+    summary['elapsed_s'] = round(time.perf_counter() - started, 2)
+    if output_path:
+        with open(output_path, 'w', encoding='utf-8') as f:
+            for record in ordered:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"✅ Esiti salvati in: {output_path}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accuratezza di esecuzione (EX) delle query generate")
+    parser.add_argument('predictions', help="Risultati della catena (.jsonl) o predict_dev.json di BIRD")
+    parser.add_argument('--gold', required=True, help="File delle domande BIRD con le query di riferimento (SQL)")
+    parser.add_argument('--db-root', required=True, help="Cartella dei database (<db_id>/<db_id>.sqlite)")
+    parser.add_argument('--output', default=None, help="File JSONL con l'esito di ogni domanda")
+    parser.add_argument('--workers', type=int, default=None, help="Numero di processi (default: CPU)")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help="Secondi massimi per query")
+    parser.add_argument('--max-rows', type=int, default=DEFAULT_MAX_ROWS, help="Righe massime per risultato")
+    parser.add_argument('--metrics', default=None, help="File JSON per il riepilogo")
+    args = parser.parse_args()
+
+    summary = run_evaluation(args.predictions, args.gold, args.db_root, args.output, args.workers,
+                             args.timeout, args.max_rows)
+    print(f"✅ EX: {summary['accuracy']} ({summary['correct']}/{summary['questions']}) in {summary['elapsed_s']} s")
+    for name, values in summary['by_difficulty'].items():
+        print(f"  {name}: {values['accuracy']} ({values['questions']})")
+    for status, count in summary['statuses'].items():
+        print(f"  {status}: {count}")
+    print(f"  esecuzioni dalla cache: {summary['cached_executions']}")
+    for side, values in summary['latency'].items():
+        print(f"  {side}: media {values['mean_ms']} ms, p95 {values['p95_ms']} ms ({values['count']})")
+    if args.metrics:
+        with open(args.metrics, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
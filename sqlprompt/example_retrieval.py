@@ -0,0 +1,187 @@
+"""Scelta automatica degli {EXAMPLES} del prompt2 few-shot: domande simili dello stesso database.
+
+Esempio:
+    python -m sqlprompt.example_retrieval train.json --output examples_index
+    python -m sqlprompt.batch dev.json --db-root dev_databases --output prompts.jsonl --examples-index examples_index
+
+Le domande di un train set in formato BIRD (question, evidence, SQL, db_id) sono
+ridotte a parole e coppie di parole, proiettate con un hash su DIMENSIONS
+colonne e pesate con TF-IDF; la matrice sparsa (righe ordinate per database) è
+salvata in file .npy letti in memory-map. Una ricerca confronta la domanda solo
+con le righe del suo database, senza caricare l'intero indice in memoria.
+"""
+import argparse
+import json
+import os
+import time
+import zlib
+from collections import Counter
+
+import numpy as np
+
+from sqlprompt.batch import load_questions, question_text
+from sqlprompt.schema_linking import tokenize
+
+INDEX_VERSION = 2
+DIMENSIONS = 1 << 18
+META_NAME = 'meta.json'
+ARRAYS = ('rows', 'features', 'weights', 'idf')
+
+
+def features(text):
+    """Feature con hash della domanda: {indice: peso tf} per parole e coppie di parole consecutive"""
+    words = tokenize(text)
+    terms = Counter(words)
+    terms.update(f"{first} {second}" for first, second in zip(words, words[1:]))
+    hashed = Counter()
+    for term, count in terms.items():
+        hashed[zlib.crc32(term.encode('utf-8')) % DIMENSIONS] += count
+    return {feature: 1.0 + np.log(count) for feature, count in hashed.items()}
+
+
+def _signature(path):
+    stat = os.stat(path)
+    return f"{stat.st_size}:{int(stat.st_mtime)}"
+
+
+def _save(folder, name, array):
+    tmp_path = os.path.join(folder, f"{name}.{os.getpid()}.tmp.npy")
+    np.save(tmp_path, array)
+    os.replace(tmp_path, os.path.join(folder, f"{name}.npy"))
+
+
+def build_index(train_path, output_dir, force=False):
+    """Indicizza il train set nella cartella; restituisce il numero di esempi (invariato se già aggiornato)"""
+    os.makedirs(output_dir, exist_ok=True)
+    meta_path = os.path.join(output_dir, META_NAME)
+    state = {'version': INDEX_VERSION, 'dimensions': DIMENSIONS, 'source': _signature(train_path)}
+    if not force and os.path.exists(meta_path):
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if all(meta.get(key) == value for key, value in state.items()):
+            return meta['documents']
+
+    items = [item for item in load_questions(train_path)
+             if item.get('db_id') and (item.get('SQL') or item.get('query'))]
+    items.sort(key=lambda item: item['db_id'])   # Stabile: nello stesso database resta l'ordine del file
+    vectors = [features(question_text(item)) for item in items]
+
+    document_frequency = np.zeros(DIMENSIONS, dtype=np.float32)
+    for vector in vectors:
+        document_frequency[list(vector)] += 1
+    idf = (np.log((1 + len(vectors)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+    rows, columns, weights = [], [], []
+    databases = {}
+    start = 0
+    for row, (item, vector) in enumerate(zip(items, vectors)):
+        keys = np.fromiter(sorted(vector), dtype=np.int32, count=len(vector))
+        values = np.array([vector[key] for key in keys.tolist()], dtype=np.float32) * idf[keys]
+        norm = float(np.linalg.norm(values))
+        rows.append(np.full(len(keys), row, dtype=np.int32))
+        columns.append(keys)
+        weights.append(values / norm if norm else values)
+        span = databases.setdefault(item['db_id'], [row, row, start, start])
+        span[1], span[3] = row + 1, start + len(keys)
+        start += len(keys)
+
+    def concat(parts, dtype):
+        return np.concatenate(parts).astype(dtype, copy=False) if parts else np.zeros(0, dtype=dtype)
+
+    _save(output_dir, 'rows', concat(rows, np.int32))
+    _save(output_dir, 'features', concat(columns, np.int32))
+    _save(output_dir, 'weights', concat(weights, np.float32))
+    _save(output_dir, 'idf', idf)
+    examples = [{'db_id': item['db_id'], 'question': item.get('question', ''), 'evidence': item.get('evidence', ''),
+                 'SQL': item.get('SQL') or item.get('query')} for item in items]
+    with open(os.path.join(output_dir, 'examples.json'), 'w', encoding='utf-8') as f:
+        json.dump(examples, f, ensure_ascii=False)
+    # Il manifest per ultimo: un indice interrotto a metà viene ricostruito
+    with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(dict(state, documents=len(items), databases=databases), f)
+    os.replace(f"{meta_path}.tmp", meta_path)
+    return len(items)
+
+
+class ExampleIndex:
+    """Indice TF-IDF del train set letto in memory-map"""
+
+    def __init__(self, folder):
+        with open(os.path.join(folder, META_NAME), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('version') != INDEX_VERSION or meta.get('dimensions') != DIMENSIONS:
+            raise ValueError(f"Indice degli esempi di una versione diversa: ricostruirlo ({folder})")
+        self.databases = meta['databases']   # {db_id: [prima riga, fine, primo valore, fine]}
+        self.arrays = {name: np.load(os.path.join(folder, f"{name}.npy"), mmap_mode='r') for name in ARRAYS}
+        with open(os.path.join(folder, 'examples.json'), 'r', encoding='utf-8') as f:
+            self.examples = json.load(f)
+
+    def search(self, db_id, question, top_k=2):
+        """Esempi più simili alla domanda nello stesso database: [(punteggio, esempio)]"""
+        span = self.databases.get(db_id)
+        vector = features(question)
+        if span is None or not vector:
+            return []
+        first_row, end_row, start, end = span
+        keys = np.fromiter(sorted(vector), dtype=np.int32, count=len(vector))
+        values = np.array([vector[key] for key in keys.tolist()], dtype=np.float32) * self.arrays['idf'][keys]
+
+        # Prodotto scalare sparso: solo le feature della riga presenti anche nella domanda
+        stored = self.arrays['features'][start:end]
+        positions = np.minimum(np.searchsorted(keys, stored), len(keys) - 1)
+        matched = keys[positions] == stored
+        contributions = np.where(matched, self.arrays['weights'][start:end] * values[positions], 0)
+        scores = np.bincount(self.arrays['rows'][start:end] - first_row, weights=contributions,
+                             minlength=end_row - first_row)
+
+        results = []
+        for position in np.argsort(-scores, kind='stable'):
+            if scores[position] <= 0 or len(results) == top_k:
+                break
+            example = self.examples[first_row + position]
+            if question_text(example) == question:
+                continue  # La domanda stessa, se il train set contiene anche quella
+            results.append((float(scores[position]), example))
+        return results
+
+    def render_examples(self, db_id, question, top_k=2):
+        """Sezione {EXAMPLES} con le domande più simili e le loro query ("" se nessuna)"""
+        blocks = [f"[EXAMPLE NUMBER {number}]\n{question_text(example)}\n{example['SQL'].strip()}"
+                  for number, (_, example) in enumerate(self.search(db_id, question, top_k), 1)]
+        return "\n\n".join(blocks)
+
+
+_indexes = {}
+
+
+def load_example_index(folder):
+    """Indice della cartella, aperto una volta per processo"""
+    folder = os.path.realpath(folder)
+    if folder not in _indexes:
+        _indexes[folder] = ExampleIndex(folder)
+    return _indexes[folder]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Indicizza un train set BIRD per scegliere gli {EXAMPLES} del prompt2")
+    parser.add_argument('train', help="File delle domande di train (train.json o .jsonl con question, evidence, SQL)")
+    parser.add_argument('--output', required=True, help="Cartella dell'indice")
+    parser.add_argument('--force', action='store_true', help="Ricostruisce l'indice anche se il train set non è cambiato")
+    parser.add_argument('--db-id', default=None, help="Database della domanda di prova")
+    parser.add_argument('--query', default=None, help="Domanda di prova: stampa gli esempi scelti")
+    parser.add_argument('--top-k', type=int, default=2)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    documents = build_index(args.train, args.output, args.force)
+    print(f"✅ Indice degli esempi: {documents} domande in {args.output} ({time.perf_counter() - start:.2f} s)")
+    if args.query:
+        index = load_example_index(args.output)
+        start = time.perf_counter()
+        examples = index.render_examples(args.db_id, args.query, args.top_k)
+        print(f"📊 Ricerca in {1000 * (time.perf_counter() - start):.3f} ms\n")
+        print(examples or "⚠️ Nessun esempio simile nello stesso database")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""Profilo dei formati dei valori: ogni valore è ridotto a una forma (es. `dddd-dd-dd`, `Aaaa`, `d.dd`).
+
+Una sola scansione della colonna, con memoria limitata, conta forme, lunghezze e
+prefissi di tutti i valori; i testi e i BLOB lunghi arrivano in Python già
+troncati da SQLite (SQLPROMPT_VALUE_CHARS) insieme alla loro lunghezza originale; il riepilogo (`"YYYY-MM-DD" 98%, "dddd" 2%`) descrive
+i formati dell'intera colonna con pochi token, compresi quelli rari che un
+campione di valori non mostrerebbe.
+"""
+import json
+import math
+import re
+
+from sqlprompt.budget import BudgetExceeded, column_budget, record_fallback, remaining, time_limit
+from sqlprompt.sample_cache import database_path
+from sqlprompt.sampling import FALLBACK_WINDOW, quote_identifier, value_chars
+
+MAX_SIGNATURES = 64    # Forme contate esattamente; oltre, conteggio approssimato (Space-Saving)
+MAX_PREFIXES = 32
+PREFIX_LENGTH = 3
+MAX_SIGNATURE_LENGTH = 32
+MAX_RUN = {'d': 10, 'a': 4, 'A': 4}  # Caratteri ripetuti oltre i quali la forma usa '+'
+KNOWN_FORMATS = {
+    'dddd-dd-dd': 'YYYY-MM-DD',
+    'dddd-dd-dd dd:dd:dd': 'YYYY-MM-DD hh:mm:ss',
+    'dddd-dd-ddAdd:dd:dd': 'YYYY-MM-DDThh:mm:ss',
+    'dddd-dd-dd dd:dd:dd.dddddd': 'YYYY-MM-DD hh:mm:ss.ffffff',
+    'dddd-dd-dd dd:dd': 'YYYY-MM-DD hh:mm',
+    'dd:dd:dd': 'hh:mm:ss',
+    'dd:dd': 'hh:mm',
+    'dddd/dd/dd': 'YYYY/MM/DD',
+}
+
+
+ASCII_CLASSES = str.maketrans({**{chr(c): 'd' for c in range(ord('0'), ord('9') + 1)},
+                               **{chr(c): 'A' for c in range(ord('A'), ord('Z') + 1)},
+                               **{chr(c): 'a' for c in range(ord('a'), ord('z') + 1)}})
+LONG_RUNS = re.compile('|'.join(f"(?<={cls * limit}){cls}+" for cls, limit in MAX_RUN.items()))
+
+
+def _char_class(char):
+    if char.isdigit():
+        return 'd'
+    if char.isalpha():
+        return 'A' if char.isupper() else 'a'
+    return char
+
+
+def _shape(text):
+    if text.isascii():
+        shape = text.translate(ASCII_CLASSES)
+    else:
+        shape = "".join(_char_class(char) for char in text)
+    shape = LONG_RUNS.sub('+', shape)
+    return shape if len(shape) <= MAX_SIGNATURE_LENGTH else shape[:MAX_SIGNATURE_LENGTH] + '…'
+
+
+def signature(value, length=None):
+    """Forma del valore: cifre → d, maiuscole → A, minuscole → a, altri caratteri invariati;
+    le sequenze lunghe dello stesso tipo finiscono con '+'.
+
+    `length` è la lunghezza originale di un testo o BLOB troncato: la forma di un
+    testo troncato finisce con '…'.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        if not value:
+            return "''"
+        shape = _shape(value)
+        if length is not None and length > len(value) and not shape.endswith('…'):
+            shape += '…'
+        return shape
+    if isinstance(value, bytes):
+        return f"<blob {len(value) if length is None else length}>"
+    if isinstance(value, float) and not math.isfinite(value):
+        return repr(value)   # 'inf', '-inf': forma propria, senza cifre da ridurre
+    if isinstance(value, float) and not value.is_integer() and 'e' not in repr(value):
+        whole, fraction = repr(value).split('.')
+        # I REAL hanno molte cifre decimali: ne conta solo la presenza
+        return _shape(whole) + ('.' + _shape(fraction) if len(fraction) <= 2 else '.dd+')
+    return _shape(repr(value))
+
+
+class _TopCounter:
+    """Conteggio dei valori più frequenti con al massimo `capacity` chiavi (algoritmo Space-Saving).
+
+    Le chiavi sono raggruppate per conteggio (in ordine di arrivo), così
+    incremento e rimozione della chiave meno frequente costano O(1).
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.counts = {}
+        self._buckets = {}   # conteggio → {chiave: None}
+        self._minimum = 0
+
+    def _set(self, key, count):
+        previous = self.counts.get(key)
+        if previous is not None:
+            bucket = self._buckets[previous]
+            del bucket[key]
+            if not bucket:
+                del self._buckets[previous]
+                if previous == self._minimum:
+                    self._minimum = count
+        self._buckets.setdefault(count, {})[key] = None
+        self.counts[key] = count
+
+    def add(self, key):
+        counts = self.counts
+        if key in counts:
+            self._set(key, counts[key] + 1)
+        elif len(counts) < self.capacity:
+            self._set(key, 1)
+            self._minimum = 1
+        else:
+            bucket = self._buckets[self._minimum]
+            evicted = next(iter(bucket))
+            count = counts.pop(evicted)
+            del bucket[evicted]
+            if not bucket:
+                del self._buckets[count]
+            self._minimum = count + 1 if count not in self._buckets else count
+            self._set(key, count + 1)   # Sovrastima al più del conteggio rimosso
+
+    def most_common(self, top=None):
+        return sorted(self.counts.items(), key=lambda item: (-item[1], item[0]))[:top]
+
+
+class FormatProfile:
+    """Forme, lunghezze e prefissi dei valori non nulli di una colonna"""
+
+    def __init__(self):
+        self.values = 0
+        self.nulls = 0
+        self.texts = 0
+        self.min_length = None
+        self.max_length = 0
+        self.total_length = 0
+        self.signatures = _TopCounter(MAX_SIGNATURES)
+        self.prefixes = _TopCounter(MAX_PREFIXES)
+
+    def add(self, value, length=None):
+        """Aggiunge un valore; `length` è la lunghezza originale se il valore è stato troncato"""
+        if value is None:
+            self.nulls += 1
+            return
+        self.values += 1
+        self.signatures.add(signature(value, length))
+        if isinstance(value, str):
+            length = len(value) if length is None else length
+            self.texts += 1
+            self.min_length = length if self.min_length is None else min(self.min_length, length)
+            self.max_length = max(self.max_length, length)
+            self.total_length += length
+            if length >= PREFIX_LENGTH:
+                self.prefixes.add(value[:PREFIX_LENGTH])
+
+    def to_dict(self, top=8):
+        return {
+            'values': self.values,
+            'nulls': self.nulls,
+            'signatures': self.signatures.most_common(top),
+            'lengths': {'min': self.min_length, 'max': self.max_length,
+                        'mean': round(self.total_length / self.texts, 1) if self.texts else None},
+            'prefixes': self.prefixes.most_common(top),
+        }
+
+
+class _FormatAggregate:
+    """Aggregato SQLite `format_profile(x, length)`: profilo dei formati in JSON"""
+
+    def __init__(self):
+        self.profile = FormatProfile()
+
+    def step(self, value, length):
+        self.profile.add(value, length)
+
+    def finalize(self):
+        return json.dumps(self.profile.to_dict(), ensure_ascii=False)
+
+
+def _format_argument(column, chars):
+    """Argomenti dell'aggregato: il valore, troncato a `chars` se testo o BLOB, e la sua lunghezza"""
+    col = quote_identifier(column)
+    if not chars:
+        return f"{col}, NULL"
+    return (f"CASE WHEN typeof({col}) IN ('text', 'blob') THEN substr({col}, 1, {chars}) ELSE {col} END, "
+            f"CASE WHEN typeof({col}) IN ('text', 'blob') THEN length({col}) END")
+
+
+def _scan(conn, source, columns):
+    conn.create_aggregate("format_profile", 2, _FormatAggregate)
+    chars = value_chars()
+    select_list = ", ".join(f"format_profile({_format_argument(column, chars)})" for column in columns)
+    row = conn.execute(f"SELECT {select_list} FROM {source}").fetchone()
+    return {column: json.loads(value) for column, value in zip(columns, row)}
+
+
+def _packed_formats(conn, table, columns):
+    """Profili salvati in un pacchetto di contesto, calcolati sull'intera tabella originale (None se mancano)"""
+    from sqlprompt.context_pack import is_pack, read_pack
+    path = database_path(conn)
+    if not path or not is_pack(path):
+        return None
+    stored = {name.lower(): profiles for name, profiles in (read_pack(path, 'formats') or {}).items()}
+    profiles = {column.lower(): profile for column, profile in stored.get(table.lower(), {}).items()}
+    if not all(column.lower() in profiles for column in columns):
+        return None
+    return {column: profiles[column.lower()] for column in columns}
+
+
+def profile_formats(conn, table, columns):
+    """Profilo dei formati delle colonne con una sola scansione della tabella.
+
+    Entro il limite di tempo delle colonne; se lo supera il profilo è calcolato
+    sulle prime FALLBACK_WINDOW righe e segnato come parziale. Su un pacchetto di
+    contesto restituisce i profili dell'intera tabella originale salvati nel pacchetto.
+    """
+    packed = _packed_formats(conn, table, columns)
+    if packed is not None:
+        return packed
+    tbl = quote_identifier(table)
+    try:
+        with time_limit(conn, remaining(column_budget() and column_budget() * len(columns))):
+            profiles = _scan(conn, tbl, columns)
+        complete = True
+    except BudgetExceeded:
+        record_fallback('format_profile.budget_fallback', table=table)
+        select_list = ", ".join(quote_identifier(column) for column in columns)
+        profiles = _scan(conn, f"(SELECT {select_list} FROM {tbl} LIMIT {FALLBACK_WINDOW})", columns)
+        complete = False
+    for profile in profiles.values():
+        profile['complete'] = complete
+    return profiles
+
+
+def display_format(sig):
+    """Forma leggibile: i formati di data e ora noti diventano YYYY-MM-DD, hh:mm, ..."""
+    return KNOWN_FORMATS.get(sig, sig)
+
+
+def format_summary(profile, top=4):
+    """Riepilogo ordinato dei formati, in inglese come i prompt: '"YYYY-MM-DD" 98%, "dddd" 2%, length 4-10'
+    ("" se la colonna è vuota)"""
+    if not profile or not profile['values']:
+        return ""
+    parts = []
+    covered = 0
+    for sig, count in profile['signatures'][:top]:
+        share = 100 * count / profile['values']
+        covered += count
+        parts.append(f'"{display_format(sig)}" {share:.0f}%' if share >= 1 else f'"{display_format(sig)}" <1%')
+    if profile['values'] - covered >= profile['values'] / 100:
+        parts.append(f"other {100 * (profile['values'] - covered) / profile['values']:.0f}%")
+    lengths = profile['lengths']
+    if lengths['min'] is not None:
+        parts.append(f"length {lengths['min']}-{lengths['max']}" if lengths['min'] != lengths['max']
+                     else f"length {lengths['min']}")
+    if not profile.get('complete', True):
+        parts.append(f"(first {FALLBACK_WINDOW} rows only)")
+    return ", ".join(parts)
@@ -0,0 +1,294 @@
+"""Strumentazione opzionale: tempo, righe e passi della VM di ogni istruzione SQL, span per tabella e colonna.
+
+Si attiva con la variabile SQLPROMPT_TRACE=<file.json> (a fine processo salva un
+trace in formato Chrome, apribile con chrome://tracing o Perfetto, e stampa le
+operazioni più lente) oppure nel codice con `with tracing('trace.json'):`.
+Disattivata, costa una chiamata a funzione per span e nessun controllo sulle query.
+"""
+import atexit
+import contextlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+TRACE_ENV = 'SQLPROMPT_TRACE'
+TRACE_TOP_ENV = 'SQLPROMPT_TRACE_TOP'
+PROGRESS_STEPS = 100   # Istruzioni della VM tra due chiamate del progress handler quando si contano i passi
+CHECK_STEPS = 1000     # Istruzioni della VM tra due controlli dei limiti di tempo, senza strumentazione
+MAX_SQL_IN_TRACE = 300
+
+
+class Tracer:
+    """Raccoglie gli eventi (span, istruzioni SQL, contatori) di un processo"""
+
+    enabled = True
+
+    def __init__(self):
+        self.events = []
+        self.counters = Counter()
+        self._origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def now(self):
+        """Microsecondi dall'avvio del tracer"""
+        return (time.perf_counter() - self._origin) * 1e6
+
+    def _append(self, event):
+        event.setdefault('pid', os.getpid())
+        event.setdefault('tid', threading.get_ident())
+        with self._lock:
+            self.events.append(event)
+        return event
+
+    def context(self):
+        """Argomenti (tabella, colonna, ...) degli span aperti nel thread corrente"""
+        merged = {}
+        for args in getattr(self._local, 'stack', ()):
+            merged.update(args)
+        return merged
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        """Intervallo di lavoro con nome; gli span annidati e le query ereditano i suoi argomenti"""
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(args)
+        start = self.now()
+        event_args = dict(args)
+        try:
+            yield event_args
+        except Exception as e:
+            event_args['error'] = str(e)
+            raise
+        finally:
+            stack.pop()
+            self._append({'name': name, 'cat': 'span', 'ph': 'X', 'ts': start, 'dur': self.now() - start,
+                          'args': event_args})
+
+    def statement(self, sql, start, vm_steps):
+        """Evento di un'istruzione SQL, aggiornato sul posto mentre si leggono le righe"""
+        args = self.context()
+        args.update({'sql': ' '.join(sql.split())[:MAX_SQL_IN_TRACE], 'rows': 0, 'vm_steps': vm_steps})
+        return self._append({'name': 'sql', 'cat': 'sql', 'ph': 'X', 'ts': start, 'dur': self.now() - start,
+                             'args': args})
+
+    def count(self, name, **args):
+        """Conta un evento puntuale (es. una query di ripiego) e lo segna nel trace"""
+        with self._lock:
+            self.counters[name] += 1
+        args = dict(self.context(), **args)
+        self._append({'name': name, 'cat': 'counter', 'ph': 'i', 's': 't', 'ts': self.now(), 'args': args})
+
+    def record_error(self, name, error, **args):
+        """Registra un'eccezione gestita (che altrimenti verrebbe solo stampata o ignorata)"""
+        self.count(name, error=str(error), **args)
+
+    def chrome_trace(self):
+        """Trace nel formato JSON di Chrome (Trace Event Format)"""
+        events = []
+        with self._lock:
+            for event in self.events:
+                event = dict(event, ts=round(event['ts'], 3))
+                if 'dur' in event:
+                    event['dur'] = round(event['dur'], 3)
+                events.append(event)
+            counters = dict(self.counters)
+        return {'traceEvents': events, 'displayTimeUnit': 'ms', 'otherData': {'counters': counters}}
+
+    def export(self, path):
+        """Salva il trace in formato Chrome"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.chrome_trace(), f, ensure_ascii=False)
+        return path
+
+    def slowest(self, top=10, cat=None):
+        """Gli eventi con durata più lunga, eventualmente di una sola categoria"""
+        with self._lock:
+            timed = [event for event in self.events if 'dur' in event and (cat is None or event['cat'] == cat)]
+        return sorted(timed, key=lambda event: -event['dur'])[:top]
+
+    def summary(self, top=10):
+        """Riepilogo testuale: query e span più lenti, contatori"""
+        lines = [f"📊 Query SQL più lente (top {top})"]
+        for event in self.slowest(top, 'sql'):
+            args = event['args']
+            where = '.'.join(str(args[key]) for key in ('table', 'column') if key in args) or '-'
+            lines.append(f"  {event['dur'] / 1000:9.2f} ms  {where}  righe={args['rows']} "
+                         f"passi={args['vm_steps']}  {args['sql'][:120]}")
+        lines.append(f"📊 Span più lenti (top {top})")
+        for event in self.slowest(top, 'span'):
+            args = ' '.join(f"{key}={value}" for key, value in event['args'].items())
+            lines.append(f"  {event['dur'] / 1000:9.2f} ms  {event['name']}  {args}")
+        if self.counters:
+            lines.append("📊 Contatori")
+            lines += [f"  {name}: {value}" for name, value in sorted(self.counters.items())]
+        return "\n".join(lines)
+
+
+class _NullTracer:
+    """Tracer disattivato: tutte le operazioni sono vuote"""
+
+    enabled = False
+
+    def span(self, name, **args):
+        return contextlib.nullcontext(args)
+
+    def count(self, name, **args):
+        pass
+
+    def record_error(self, name, error, **args):
+        pass
+
+
+NULL_TRACER = _NullTracer()
+_active = NULL_TRACER
+
+
+def current_tracer():
+    """Tracer attivo (quello vuoto se la strumentazione è spenta)"""
+    return _active
+
+
+def _finish(tracer, path, top):
+    if path:
+        path = path.replace('{pid}', str(os.getpid()))
+        tracer.export(path)
+        print(f"✅ Trace salvato in: {path}")
+    print(tracer.summary(top))
+
+
+@contextlib.contextmanager
+def tracing(path=None, top=10):
+    """Attiva la strumentazione nel blocco; all'uscita salva il trace (se `path`) e stampa il riepilogo"""
+    global _active
+    previous, _active = _active, Tracer()
+    tracer = _active
+    try:
+        yield tracer
+    finally:
+        _active = previous
+        _finish(tracer, path, top)
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursore che misura ogni istruzione: durata fino all'ultima riga letta, righe, passi della VM"""
+
+    _event = None
+    _tracer = None
+    _steps_at_start = 0
+
+    def _update(self, rows):
+        event = self._event
+        if event is not None:
+            event['dur'] = self._tracer.now() - event['ts']
+            event['args']['rows'] += rows
+            event['args']['vm_steps'] = self.connection.vm_steps - self._steps_at_start
+
+    def execute(self, sql, parameters=()):
+        tracer = current_tracer()
+        if not tracer.enabled:
+            self._event = None
+            return super().execute(sql, parameters)
+        self._tracer = tracer
+        self._steps_at_start = self.connection.vm_steps
+        start = tracer.now()
+        try:
+            super().execute(sql, parameters)
+        except Exception as e:
+            tracer.statement(sql, start, self.connection.vm_steps - self._steps_at_start)['args']['error'] = str(e)
+            raise
+        self._event = tracer.statement(sql, start, self.connection.vm_steps - self._steps_at_start)
+        return self
+
+    def fetchone(self):
+        row = super().fetchone()
+        self._update(row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        self._update(len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = super().fetchall()
+        self._update(len(rows))
+        return rows
+
+    def __next__(self):
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._update(0)
+            raise
+        self._update(1)
+        return row
+
+
+class Connection(sqlite3.Connection):
+    """Connessione con un solo progress handler condiviso da più controlli.
+
+    SQLite accetta un solo progress handler per connessione: strumentazione e
+    limiti di tempo vi registrano le proprie funzioni con `add_progress_check`;
+    se una restituisce un valore vero la query corrente viene interrotta.
+    Senza strumentazione l'handler è chiamato ogni CHECK_STEPS istruzioni della VM:
+    i controlli dei limiti di tempo non richiedono una granularità più fine.
+    """
+
+    progress_steps = CHECK_STEPS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.vm_steps = 0
+        self._checks = []
+
+    def _progress(self):
+        self.vm_steps += self.progress_steps
+        for check in self._checks:
+            if check():
+                return 1
+        return 0
+
+    def add_progress_check(self, check):
+        if not self._checks:
+            self.set_progress_handler(self._progress, self.progress_steps)
+        self._checks.append(check)
+
+    def remove_progress_check(self, check):
+        self._checks.remove(check)
+        if not self._checks:
+            self.set_progress_handler(None, 0)
+
+
+def _count_only():
+    return False
+
+
+class TracedConnection(Connection):
+    """Connessione che conta i passi della VM e crea cursori strumentati"""
+
+    progress_steps = PROGRESS_STEPS
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.add_progress_check(_count_only)
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or TracedCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+
+def connect(database, **kwargs):
+    """sqlite3.connect con una Connection (strumentata se la strumentazione è attiva)"""
+    kwargs.setdefault('factory', TracedConnection if current_tracer().enabled else Connection)
+    return sqlite3.connect(database, **kwargs)
+
+
+if os.environ.get(TRACE_ENV):
+    _active = Tracer()
+    atexit.register(_finish, _active, os.environ[TRACE_ENV], int(os.environ.get(TRACE_TOP_ENV, 10)))
@@ -0,0 +1,119 @@
+"""Endpoint locale compatibile con OpenAI che simula il modello, per provare la catena senza rete.
+
+Esempio:
+    python -m sqlprompt.mock_llm --port 8000
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlprompt.ddl import CREATE_TABLE, parse_create_table, strip_comments
+
+def _schema_columns(schema):
+    """Coppie (tabella, colonna) lette dalle CREATE TABLE di uno schema (anche commentato)"""
+    schema = strip_comments(schema)
+    starts = [match.start() for match in CREATE_TABLE.finditer(schema)] + [len(schema)]
+    pairs = []
+    for start, end in zip(starts, starts[1:]):
+        table, columns, _ = parse_create_table(schema[start:end])
+        pairs += [(table, name) for name, _ in columns]
+    return pairs
+
+
+def _section(prompt, title):
+    """Testo che segue un'intestazione *Titolo:* nel prompt"""
+    match = re.search(re.escape(title) + r'\s*(.*?)(?:\n---|\n\*[A-Z][\w ]*:\*|\Z)', prompt, re.DOTALL)
+    return match.group(1).strip() if match else ''
+
+
+def schema_analysis_reply(prompt):
+    """Risposta simulata al prompt1: le colonne dello schema citate nella domanda"""
+    question = _section(prompt, '*Question:*').lower()
+    pairs = _schema_columns(_section(prompt, '*Database schema:*'))
+    words = set(re.findall(r'\w+', question))
+    chosen = [(t, c) for t, c in pairs if c.lower() in words or c.lower().replace('_', ' ') in question]
+    if not chosen:
+        chosen = pairs[:2]
+    block = "\n".join(f"{table}.{column}" for table, column in chosen)
+    return f"Step 1: the question mentions the following columns.\n\n```text\n{block}\n```"
+
+
+def sql_reply(prompt):
+    """Risposta simulata al prompt2: una query SQL sulla prima colonna individuata"""
+    analysis = _section(prompt, '*Schema Analysis:*')
+    match = re.search(r'([\w"]+)\.([\w" ]+)', analysis)
+    if match:
+        table, column = match.group(1).strip('"'), match.group(2).strip().strip('"')
+        sql = f'SELECT "{column}" FROM "{table}" LIMIT 1'
+    else:
+        sql = "SELECT 1"
+    return f"Step 1: read the sample data.\n\n```sql\n{sql}\n```"
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass  # Nessun log per richiesta
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip('/') in ('/health', '/v1/models'):
+            self._send_json(200, {'status': 'ok', 'data': [{'id': 'mock'}]})
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        prompt = "\n".join(m.get('content', '') for m in request.get('messages', []))
+        if self.latency:
+            time.sleep(self.latency)
+
+        content = sql_reply(prompt) if '*Sample Data:*' in prompt else schema_analysis_reply(prompt)
+        self._send_json(200, {
+            'id': 'mock-completion',
+            'object': 'chat.completion',
+            'model': request.get('model', 'mock'),
+            'choices': [{'index': 0, 'finish_reason': 'stop',
+                         'message': {'role': 'assistant', 'content': content}}],
+            'usage': {'prompt_tokens': len(prompt.split()), 'completion_tokens': len(content.split())},
+        })
+
+
+def start_mock_server(host='127.0.0.1', port=0, latency=0.0):
+    """Avvia il server in un thread; restituisce (server, base_url)"""
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {'latency': latency})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Endpoint LLM simulato compatibile con OpenAI")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--latency', type=float, default=0.0, help="Ritardo simulato per risposta (secondi)")
+    args = parser.parse_args()
+    handler = type('ConfiguredMockLLMHandler', (MockLLMHandler,), {'latency': args.latency})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"✅ Mock LLM in ascolto su http://{args.host}:{args.port}/v1")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
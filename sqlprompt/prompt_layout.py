@@ -0,0 +1,36 @@
+"""Disposizione dei prompt adatta alla cache dei prefissi dei server di inferenza.
+
+Tutto ciò che dipende solo dal database (istruzioni, esempio, schema, esempi
+campionati con seed) precede ciò che dipende dalla domanda: i prompt dello stesso
+database condividono così un prefisso identico byte per byte, che un server con
+cache dei prefissi (KV cache) calcola una volta sola. Ogni prompt è accompagnato
+da hash e lunghezza stimata del prefisso, per raggruppare le richieste.
+"""
+import hashlib
+import re
+
+PROMPT_TOKEN = re.compile(r'\w+|[^\w\s]')
+DEFAULT_PREFIX_SEED = 'prefix-cache'  # Seed usato se non ne viene indicato uno: gli esempi restano fissi
+
+
+def estimate_tokens(text):
+    """Stima dei token di un prompt (parole e segni di punteggiatura)"""
+    return len(PROMPT_TOKEN.findall(text or ''))
+
+
+def prefix_info(prompt, prefix):
+    """Hash e lunghezza del prefisso condiviso di un prompt"""
+    if not prompt.startswith(prefix):
+        raise ValueError("Il prompt non inizia con il prefisso indicato")
+    return {
+        'prefix_hash': hashlib.sha1(prefix.encode('utf-8')).hexdigest()[:16],
+        'prefix_tokens': estimate_tokens(prefix),
+        'prefix_chars': len(prefix),
+        'suffix_tokens': estimate_tokens(prompt[len(prefix):]),
+    }
+
+
+def prefix_before(prompt, marker):
+    """Parte del prompt fino al marcatore compreso (es. '*Schema Analysis:*'), dopo la quale tutto cambia per domanda"""
+    position = prompt.find(marker)
+    return prompt if position < 0 else prompt[:position + len(marker)]
@@ -0,0 +1,225 @@
+"""Rendering delle sezioni dei prompt che dipendono solo dal database, memorizzate per database"""
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+from sqlprompt.budget import absorb_fallbacks, current_deadline, database_budget, deadline_scope, fallback_count
+from sqlprompt.column_profile import prompt_profile
+from sqlprompt.connections import pooled
+from sqlprompt.ddl import prune_create_table
+from sqlprompt.instrumentation import current_tracer
+from sqlprompt.sample_cache import db_fingerprint, default_seed
+from sqlprompt.sampling import quote_identifier
+
+SEPARATOR = "-" * 50
+MAX_MEMOIZED_DATABASES = 32
+WORKERS_ENV = 'SQLPROMPT_WORKERS'
+
+SCHEMA_TABLE = Template("-- Tabella: $name\n$sql;\n\n" + SEPARATOR + "\n\n")
+COLUMN_LINE = Template("  $table.$column: $examples")
+# Esclude le tabelle interne di SQLite e i metadati dei pacchetti di contesto (sqlprompt.context_pack)
+USER_TABLES = ("SELECT name, sql FROM sqlite_master "
+               "WHERE type='table' AND name NOT LIKE 'sqlite_%' AND name != 'sqlprompt_pack';")
+TABLES_FOUND = Template("{ADDITIONAL INFORMATION}\n\n📊 Tabelle trovate: $count\n\n")
+
+
+def list_tables(cursor):
+    """Nomi e DDL delle tabelle utente, nell'ordine di sqlite_master"""
+    cursor.execute(USER_TABLES)
+    return cursor.fetchall()
+
+
+def render_schema(tables):
+    """Sezione {CURRENT DB SCHEMA} con le CREATE TABLE senza commenti"""
+    parts = ["{CURRENT DB SCHEMA}\n"]
+    parts += [SCHEMA_TABLE.substitute(name=name, sql=sql) for name, sql in tables]
+    return "".join(parts)
+
+
+def render_table_information(cursor, table, descriptions, table_examples, profile):
+    """Righe di {ADDITIONAL INFORMATION} di una tabella: [(colonna, riga)] ed eventuale errore"""
+    column_lines = []
+    tracer = current_tracer()
+    try:
+        cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+        column_names = [col[1] for col in cursor.fetchall()]
+        with tracer.span('table_examples', table=table, columns=len(column_names)):
+            examples_by_column = table_examples(cursor, table, column_names, profile=profile)
+
+        for col_name in column_names:
+            examples = examples_by_column.get(col_name, [])
+            if not examples:
+                continue
+
+            output = COLUMN_LINE.substitute(table=table, column=col_name, examples=', '.join(examples))
+            desc = descriptions.describe(table, col_name)
+            if desc:
+                clean_desc = ' '.join(line.strip() for line in desc.splitlines() if line.strip())
+                output += f" (⚠️ {clean_desc})"
+            column_lines.append((col_name, output))
+
+    except Exception as e:
+        tracer.record_error('table_information.error', e, table=table)
+        return column_lines, f"  ⚠️ Errore durante l'analisi tabella {table}: {str(e)}"
+    return column_lines, None
+
+
+class DatabaseSections:
+    """Sezioni del prompt di un database, conservate per tabella e per colonna.
+
+    `schema` e `additional_information` sono le sezioni complete; `pruned` le
+    ricompone limitandole alle tabelle e colonne scelte per una domanda, senza
+    interrogare di nuovo il database.
+    """
+
+    def __init__(self, tables, table_information):
+        self.tables = tables
+        self.table_information = table_information
+        self.schema = render_schema(tables)
+        self.additional_information = self._information(name for name, _ in tables)
+
+    def _information(self, table_names, keep=None):
+        table_names = list(table_names)
+        parts = [TABLES_FOUND.substitute(count=len(table_names))]
+        for name in table_names:
+            column_lines, error = self.table_information[name]
+            lines = [f" {name.upper()}"]
+            for column, line in column_lines:
+                if keep is None or column.lower() in keep[name]:
+                    lines.append(line)
+            if error:
+                lines.append(error)
+            lines.append(SEPARATOR + "\n\n")
+            parts.append("\n".join(lines))
+        return "".join(parts)
+
+    def pruned(self, keep):
+        """Sezioni (schema, informazioni aggiuntive) limitate a keep = {tabella: {colonne}}"""
+        if keep is None:
+            return self.schema, self.additional_information
+        keep = {table: {column.lower() for column in columns} for table, columns in keep.items()}
+        tables = [(name, prune_create_table(sql, keep[name], keep)) for name, sql in self.tables if name in keep]
+        return render_schema(tables), self._information((name for name, _ in tables), keep)
+
+
+def sampling_workers():
+    """Thread per il campionamento parallelo delle tabelle (SQLPROMPT_WORKERS, default 1 = sequenziale)"""
+    value = os.environ.get(WORKERS_ENV, '').strip()
+    return max(int(value), 1) if value else 1
+
+
+def render_tables_parallel(db_path, tables, descriptions, table_examples, profile, workers):
+    """Campiona le tabelle su un pool di thread, ognuna con una connessione in sola lettura del pool.
+
+    SQLite rilascia il GIL durante le query, quindi il tempo totale si avvicina a
+    quello della tabella più lenta; le tabelle più grandi partono per prime e i
+    risultati tornano nell'ordine dello schema.
+    """
+    deadline = current_deadline()
+    tracer = current_tracer()
+
+    def render(name):
+        before = fallback_count()
+        with deadline_scope(deadline), tracer.span('table', table=name), pooled(db_path) as conn:
+            information = render_table_information(conn.cursor(), name, descriptions, table_examples, profile)
+        return information, fallback_count() - before
+
+    names = [name for name, _ in tables]
+    if profile:
+        names.sort(key=lambda name: -profile['tables'].get(name, {}).get('row_count', 0))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='sqlprompt-sampling') as pool:
+        futures = {name: pool.submit(render, name) for name in names}
+        results = {name: future.result() for name, future in futures.items()}
+
+    table_information = {}
+    for name, _ in tables:
+        table_information[name], fallbacks = results[name]
+        absorb_fallbacks(fallbacks)
+    return table_information
+
+
+def render_sections(cursor, descriptions, db_path, table_examples, workers=None):
+    """Renderizza schema e informazioni aggiuntive di tutte le tabelle, entro il limite di tempo del database.
+
+    Con più di un worker (SQLPROMPT_WORKERS) le tabelle sono campionate in parallelo.
+    """
+    workers = workers or sampling_workers()
+    with database_budget():
+        try:
+            profile = prompt_profile(db_path)
+        except sqlite3.Error as e:
+            print(f"⚠️ Profilo del database non disponibile: {str(e)}")
+            profile = None
+
+        tables = list_tables(cursor)
+        if workers > 1 and len(tables) > 1 and db_path:
+            return DatabaseSections(tables, render_tables_parallel(db_path, tables, descriptions, table_examples,
+                                                                   profile, workers))
+
+        tracer = current_tracer()
+        table_information = {}
+        for name, _ in tables:
+            with tracer.span('table', table=name):
+                table_information[name] = render_table_information(cursor, name, descriptions, table_examples,
+                                                                    profile)
+    return DatabaseSections(tables, table_information)
+
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+_memo_stats = {'hits': 0, 'misses': 0}
+
+
+def _memo_key(kind, db_path, descriptions):
+    real_path, fingerprint = db_fingerprint(db_path)
+    return kind, real_path, fingerprint, getattr(descriptions, 'signature', None), default_seed()
+
+
+def database_sections(cursor, descriptions, db_path, kind, table_examples):
+    """Sezioni del prompt per il database, renderizzate una volta e poi riusate.
+
+    `kind` distingue i generatori (gli esempi possono essere campionati in modo
+    diverso) e `table_examples` è la funzione che campiona una tabella. La memoria
+    è invalidata se cambiano il file del database, le descrizioni o il seed.
+    Senza descrizioni, un pacchetto di contesto usa quelle che contiene.
+    """
+    if not descriptions and db_path:
+        from sqlprompt.context_pack import is_pack, pack_catalog
+        if is_pack(db_path):
+            descriptions = pack_catalog(db_path)
+    try:
+        key = _memo_key(kind, db_path, descriptions)
+    except OSError:
+        return render_sections(cursor, descriptions, db_path, table_examples)
+
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            _memo_stats['hits'] += 1
+            return _memo[key]
+        _memo_stats['misses'] += 1
+
+    fallbacks = fallback_count()
+    sections = render_sections(cursor, descriptions, db_path, table_examples)
+    if fallback_count() != fallbacks:
+        return sections  # Esempi degradati dal limite di tempo: non vengono riusati
+    with _memo_lock:
+        _memo[key] = sections
+        while len(_memo) > MAX_MEMOIZED_DATABASES:
+            _memo.popitem(last=False)
+    return sections
+
+
+def memo_stats():
+    """Riusi e render delle sezioni memorizzate, e database attualmente in memoria"""
+    with _memo_lock:
+        return dict(_memo_stats, size=len(_memo))
+
+
+def clear_memo():
+    """Dimentica le sezioni già renderizzate"""
+    with _memo_lock:
+        _memo.clear()
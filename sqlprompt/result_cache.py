@@ -0,0 +1,158 @@
+"""Cache persistente degli esiti delle query di valutazione, indicizzata per SQL normalizzato e database.
+
+Al posto delle righe si salva un'impronta dell'insieme dei risultati (lo stesso
+confronto della metrica EX di BIRD): due esecuzioni hanno lo stesso insieme di
+righe se e solo se hanno la stessa impronta. Tra un run di valutazione e il
+successivo vengono quindi rieseguite solo le query cambiate.
+"""
+import hashlib
+import os
+import re
+
+from sqlprompt.sample_cache import SampleCache, cache_dir
+
+DEFAULT_MAX_BYTES = 32 * 1024 * 1024
+NORMALIZATION_VERSION = 2  # Cambia la chiave quando cambia normalize_sql: le vecchie voci non vengono più lette
+OUTCOMES_VERSION = 2       # Cambia la chiave quando cambiano gli esiti memorizzati (dalla 2 senza timeout)
+TRANSIENT_STATUSES = ('timeout',)  # Esiti che dipendono dal carico della macchina: mai in cache
+
+SQL_TOKEN = re.compile(r"""
+    (?P<comment>--[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:[^']|'')*')
+  | (?P<quoted>"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])
+  | (?P<word>[A-Za-z_][\w$]*)
+  | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+  | (?P<space>\s+)
+  | (?P<symbol>\|\||<=|>=|<>|!=|==|<<|>>|.)
+""", re.VERBOSE | re.DOTALL)
+SIMPLE_IDENTIFIER = re.compile(r'[A-Za-z_]\w*\Z')
+KEYWORDS = {
+    'all', 'and', 'as', 'asc', 'between', 'by', 'case', 'cast', 'cross', 'desc', 'distinct', 'else', 'end',
+    'except', 'exists', 'from', 'group', 'having', 'in', 'inner', 'intersect', 'is', 'join', 'left', 'like',
+    'limit', 'natural', 'not', 'null', 'offset', 'on', 'or', 'order', 'outer', 'right', 'select', 'then',
+    'union', 'using', 'when', 'where', 'with',
+}
+IDENTIFIER_AFTER = {'as', 'from', 'join'}
+
+
+def _is_identifier(tokens, position):
+    """Vero se il token tra doppi apici è per forza un identificatore: accanto a un punto o dopo FROM, JOIN, AS"""
+    previous = tokens[position - 1] if position else None
+    following = tokens[position + 1] if position + 1 < len(tokens) else None
+    return (following == ('symbol', '.') or previous == ('symbol', '.')
+            or (previous is not None and previous[0] == 'word' and previous[1].lower() in IDENTIFIER_AFTER))
+
+
+def _tokens(sql):
+    """Token significativi della query: (tipo, testo), senza commenti e spazi.
+
+    Backtick e parentesi quadre racchiudono sempre identificatori, che come le parole
+    non distinguono le maiuscole. I doppi apici invece diventano una stringa se SQLite
+    non trova una colonna con quel nome (WHERE name = "Bob"), quindi restano tra apici
+    e con le maiuscole, salvo dove il nome è per forza un identificatore.
+    """
+    raw = [(match.lastgroup, match.group()) for match in SQL_TOKEN.finditer(sql)
+           if match.lastgroup not in ('comment', 'space')]
+    tokens = []
+    for position, (kind, text) in enumerate(raw):
+        if kind == 'quoted':
+            if text[0] == '"':
+                name = text[1:-1].replace('""', '"')
+                identifier = _is_identifier(raw, position)
+            else:
+                name, identifier = text[1:-1], True
+            if not identifier:
+                text = '"' + name.replace('"', '""') + '"'
+            elif SIMPLE_IDENTIFIER.match(name) and name.lower() not in KEYWORDS:
+                # "Name", [name] e name coincidono
+                kind, text = 'word', name.lower()
+            else:
+                text = '"' + name.replace('"', '""').lower() + '"'
+        elif kind == 'word':
+            text = text.lower()
+        tokens.append((kind, text))
+    while tokens and tokens[-1] == ('symbol', ';'):
+        tokens.pop()
+    return tokens
+
+
+def normalize_sql(sql):
+    """Forma canonica della query: senza commenti, spazi uniformi, minuscole fuori dalle stringhe
+    (e dai doppi apici che possono essere stringhe) e alias di tabella (T1, s, ...) rinominati nell'ordine in cui sono dichiarati.
+
+    Due query con la stessa forma canonica restituiscono sempre le stesse righe.
+    """
+    tokens = _tokens(sql)
+    names = [kind in ('word', 'quoted') and text not in KEYWORDS for kind, text in tokens]
+    qualifier = [name and position + 1 < len(tokens) and tokens[position + 1] == ('symbol', '.')
+                 for position, name in enumerate(names)]
+    qualifiers = {tokens[position][1] for position, is_qualifier in enumerate(qualifier) if is_qualifier}
+
+    # Dichiarazioni: "tabella AS alias", "tabella alias" o "(sottoquery) AS alias" di un nome usato come prefisso
+    aliases = {}
+    declarations = set()
+    for position in range(1, len(tokens)):
+        text = tokens[position][1]
+        if not names[position] or qualifier[position] or text not in qualifiers:
+            continue
+        previous = tokens[position - 1]
+        if previous in (('word', 'as'), ('symbol', ')')) or (names[position - 1] and not qualifier[position - 1]):
+            aliases.setdefault(text, f"__alias{len(aliases)}")
+            declarations.add(position)
+
+    parts = []
+    for position, (_, text) in enumerate(tokens):
+        if position + 1 in declarations and text == 'as':
+            continue  # "tabella AS alias" e "tabella alias" sono equivalenti
+        if text in aliases and (position in declarations or qualifier[position]):
+            text = aliases[text]
+        parts.append(text)
+    return " ".join(parts)
+
+
+def _canonical(value):
+    # Nei set di Python 1 e 1.0 coincidono: l'impronta deve fare lo stesso
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def result_digest(rows):
+    """Impronta dell'insieme delle righe, indipendente da ordine e duplicati"""
+    canonical = sorted({repr(tuple(_canonical(value) for value in row)) for row in rows})
+    digest = hashlib.sha1()
+    for row in canonical:
+        digest.update(row.encode('utf-8', 'surrogatepass'))
+        digest.update(b'\n')
+    return digest.hexdigest()
+
+
+class ResultCache(SampleCache):
+    """Esiti delle esecuzioni (esito, impronta, numero di righe, durata), invalidati quando il database cambia"""
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        super().__init__(path or os.path.join(cache_dir(), 'results.sqlite'), max_bytes)
+
+    def get_or_execute(self, db_path, sql, params, execute):
+        """Esito in cache della query normalizzata o quello di `execute()`, poi memorizzato.
+
+        Un timeout dipende dal carico della macchina e non viene memorizzato: la
+        query è rieseguita al run successivo.
+        """
+        return self.get_or_compute(db_path, None, None, 'execution', None,
+                                   dict(params, sql=normalize_sql(sql), normalization=NORMALIZATION_VERSION,
+                                        outcomes=OUTCOMES_VERSION), execute,
+                                   cacheable=lambda outcome: outcome.get('status') not in TRANSIENT_STATUSES)
+
+
+_default_cache = None
+
+
+def get_result_cache():
+    """Cache degli esiti del processo; None se disabilitata con SQLPROMPT_CACHE=0"""
+    global _default_cache
+    if os.environ.get('SQLPROMPT_CACHE', '1') == '0':
+        return None
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
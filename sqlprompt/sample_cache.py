@@ -0,0 +1,206 @@
+"""Cache persistente su disco dei campioni estratti dai database"""
+import base64
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from sqlprompt.budget import fallback_count
+from sqlprompt.sampling import value_chars
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'sqlprompt')
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def cache_dir():
+    """Cartella delle cache locali (sovrascrivibile con SQLPROMPT_CACHE_DIR)"""
+    return os.environ.get('SQLPROMPT_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+
+def default_seed():
+    """Seed di campionamento globale letto da SQLPROMPT_SEED (None = casuale ad ogni run)"""
+    return os.environ.get('SQLPROMPT_SEED') or None
+
+
+def seeded_rng(seed, *scope):
+    """Generatore deterministico per (seed, tabella, colonna, ...); None se seed è None"""
+    if seed is None:
+        return None
+    return random.Random(":".join(str(part) for part in (seed,) + scope))
+
+
+def db_fingerprint(db_path):
+    """Identità del file di database: percorso reale, dimensione e mtime"""
+    real_path = os.path.realpath(db_path)
+    stat = os.stat(real_path)
+    return real_path, f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def database_path(cursor):
+    """Percorso del file del database principale aperto dal cursore ('' se in memoria)"""
+    for _, name, path in cursor.execute("PRAGMA database_list").fetchall():
+        if name == 'main':
+            return path or ''
+    return ''
+
+
+def _encode(value):
+    if isinstance(value, bytes):
+        return {'$b': base64.b64encode(value).decode('ascii')}
+    if isinstance(value, dict):
+        return {key: _encode(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode(item) for item in value]
+    return value
+
+
+def _decode(value):
+    if isinstance(value, dict):
+        if set(value) == {'$b'}:
+            return base64.b64decode(value['$b'])
+        return {key: _decode(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_decode(item) for item in value]
+    return value
+
+
+class SampleCache:
+    """Cache LRU su file SQLite, invalidata automaticamente quando il database cambia.
+
+    Le chiavi comprendono percorso, dimensione/mtime del database, tabella, colonna,
+    tipo di campionamento, parametri e seed. Quando la dimensione totale supera
+    `max_bytes` vengono eliminate le voci usate meno di recente.
+    """
+
+    def __init__(self, path=None, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path or os.path.join(cache_dir(), 'samples.sqlite')
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, db_path TEXT NOT NULL, fingerprint TEXT NOT NULL,"
+            " value TEXT NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_db ON entries(db_path)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(real_path, fingerprint, table, column, kind, seed, params):
+        """Chiave stabile per una richiesta di campionamento"""
+        raw = json.dumps([real_path, fingerprint, table, column, kind, seed, params],
+                         sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def get_or_compute(self, db_path, table, column, kind, seed, params, compute, cacheable=None):
+        """Restituisce il valore in cache o lo calcola con `compute()` e lo memorizza
+        (solo se `cacheable(valore)` è vero, quando indicato)"""
+        try:
+            real_path, fingerprint = db_fingerprint(db_path)
+        except OSError:
+            return compute()
+        key = self.make_key(real_path, fingerprint, table, column, kind, seed, params)
+
+        try:
+            with self._lock:
+                row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    self._conn.execute("UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key))
+                    self._conn.commit()
+                    self.hits += 1
+                    return _decode(json.loads(row[0]))
+        except sqlite3.Error:
+            return compute()
+
+        self.misses += 1
+        fallbacks = fallback_count()
+        value = compute()
+        if fallback_count() != fallbacks:
+            return value  # Campione degradato dal limite di tempo: non va in cache
+        if cacheable is not None and not cacheable(value):
+            return value
+        try:
+            self._store(key, real_path, fingerprint, value)
+        except (sqlite3.Error, TypeError, ValueError):
+            pass  # La cache non deve mai bloccare la generazione dei prompt
+        return value
+
+    def _store(self, key, real_path, fingerprint, value):
+        payload = json.dumps(_encode(value), ensure_ascii=False)
+        with self._lock:
+            # Le voci di versioni precedenti dello stesso database non servono più
+            self._conn.execute("DELETE FROM entries WHERE db_path = ? AND fingerprint != ?",
+                               (real_path, fingerprint))
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?)",
+                               (key, real_path, fingerprint, payload, len(payload), time.time()))
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        target = int(self.max_bytes * 0.9)
+        for key, size in self._conn.execute(
+                "SELECT key, size FROM entries ORDER BY last_access").fetchall():
+            if total <= target:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+    def clear(self):
+        """Svuota la cache"""
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self):
+        self._conn.close()
+
+
+_default_cache = None
+_cache_unavailable = False
+
+
+def get_default_cache():
+    """Cache condivisa del processo; None se disabilitata con SQLPROMPT_CACHE=0"""
+    global _default_cache, _cache_unavailable
+    if os.environ.get('SQLPROMPT_CACHE', '1') == '0' or _cache_unavailable:
+        return None
+    if _default_cache is None:
+        try:
+            _default_cache = SampleCache()
+        except (OSError, sqlite3.Error) as e:
+            print(f"⚠️ Cache dei campioni non disponibile: {e}")
+            _cache_unavailable = True
+            return None
+    return _default_cache
+
+
+def cached_sample(cursor_or_path, table, column, kind, seed, params, compute, deterministic=False):
+    """Applica la cache di default a un campionamento.
+
+    I campionamenti casuali senza seed non vengono memorizzati, così il
+    comportamento predefinito (esempi diversi ad ogni run) resta invariato;
+    le estrazioni deterministiche sono sempre memorizzabili. I valori in cache
+    dipendono anche dal limite di caratteri dei valori (SQLPROMPT_VALUE_CHARS).
+    """
+    cache = get_default_cache()
+    if cache is None or (seed is None and not deterministic):
+        return compute()
+    params = dict(params, value_chars=value_chars())
+    if isinstance(cursor_or_path, str):
+        db_path = cursor_or_path
+    else:
+        db_path = database_path(cursor_or_path)
+    if not db_path:
+        return compute()
+    return cache.get_or_compute(db_path, table, column, kind, seed, params, compute)
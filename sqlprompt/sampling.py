@@ -0,0 +1,424 @@
+"""Campionamento di valori di esempio dalle colonne SQLite senza ordinare l'intera tabella.
+
+I valori testuali e BLOB lunghi vengono troncati dentro SQLite (bounded_value),
+quindi memoria, I/O e dimensione dei prompt restano limitati qualunque sia la
+dimensione delle celle.
+"""
+import os
+import random
+import sqlite3
+
+from sqlprompt.budget import BudgetExceeded, column_budget, record_fallback, remaining, time_limit
+from sqlprompt.instrumentation import current_tracer
+
+ROWID_ALIASES = ('rowid', '_rowid_', 'oid')
+FALLBACK_WINDOW = 10000  # Righe lette al massimo dai ripieghi e dalle scansioni di completamento
+PROBE_WINDOW = 256       # Rowid esaminati al massimo da un tentativo su una colonna filtrata
+MAX_EMPTY_PROBES = 8     # Tentativi senza valori validi dopo i quali si passa alla scansione di completamento
+VALUE_CHARS_ENV = 'SQLPROMPT_VALUE_CHARS'
+DEFAULT_VALUE_CHARS = 200
+BLOB_HEX_BYTES = 16  # Byte di un BLOB mostrati in esadecimale nei prompt e nelle risposte JSON
+MARKER_ROOM = 24  # Spazio del marcatore '…[N chars]': i valori appena oltre il limite restano interi
+
+
+def quote_identifier(name):
+    """Racchiude un identificatore SQL tra doppi apici, con escape"""
+    return '"' + str(name).replace('"', '""') + '"'
+
+
+def value_chars():
+    """Caratteri massimi di un valore campionato (SQLPROMPT_VALUE_CHARS, default 200; 0 = nessun limite)"""
+    value = os.environ.get(VALUE_CHARS_ENV, '').strip()
+    if not value:
+        return DEFAULT_VALUE_CHARS
+    try:
+        return max(int(value), 0)
+    except ValueError:
+        print(f"⚠️ {VALUE_CHARS_ENV} non valido ({value!r}): uso {DEFAULT_VALUE_CHARS}")
+        return DEFAULT_VALUE_CHARS
+
+
+def bounded_value(column, chars=None):
+    """Espressione SQL del valore della colonna troncato dentro SQLite.
+
+    Un testo più lungo del limite diventa i suoi primi `chars` caratteri seguiti da
+    '…[N chars]' con la lunghezza originale; un BLOB i suoi primi `chars` byte.
+    Numeri e valori brevi restano invariati, così come tutto con limite 0.
+    """
+    return bounded_expression(quote_identifier(column), chars)
+
+
+def bounded_expression(expression, chars=None):
+    """Come bounded_value, per un'espressione SQL qualsiasi (es. un aggregato `min(...)`)"""
+    chars = value_chars() if chars is None else chars
+    if not chars:
+        return expression
+    longer = f"length({expression}) > {chars + MARKER_ROOM}"
+    return (f"CASE WHEN typeof({expression}) = 'text' AND {longer} "
+            f"THEN substr({expression}, 1, {chars}) || '…[' || length({expression}) || ' chars]' "
+            f"WHEN typeof({expression}) = 'blob' AND {longer} THEN substr({expression}, 1, {chars}) "
+            f"ELSE {expression} END")
+
+
+def display_blob(value):
+    """Forma testuale di un BLOB: '<blob N: 0a1b…>' con la lunghezza e i primi byte in esadecimale"""
+    more = '…' if len(value) > BLOB_HEX_BYTES else ''
+    return f"<blob {len(value)}: {value[:BLOB_HEX_BYTES].hex()}{more}>"
+
+
+def example_filter(column):
+    """Condizione WHERE che esclude NULL, stringhe vuote, zeri e valori simili a ID"""
+    col = quote_identifier(column)
+    clause = f"{col} IS NOT NULL AND {col} != '' AND {col} != 0"
+    if column.lower().endswith('id'):  # Evita di mostrare solo ID
+        clause += f" AND {col} NOT LIKE '%ID%'"
+    return clause
+
+
+def is_valid_example(value):
+    """Verifica se un valore è valido per essere mostrato come esempio"""
+    return value is not None and value != 0 and value != '' and value != b''
+
+
+def rowid_alias(cursor, table):
+    """Restituisce l'alias del rowid utilizzabile per la tabella, None se WITHOUT ROWID"""
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+    column_names = {row[1].lower() for row in cursor.fetchall()}
+    for alias in ROWID_ALIASES:
+        if alias in column_names:
+            continue  # L'alias è oscurato da una colonna vera
+        try:
+            cursor.execute(f"SELECT {alias} FROM {quote_identifier(table)} LIMIT 0")
+            return alias
+        except sqlite3.OperationalError:
+            return None
+    return None
+
+
+def rowid_bounds(cursor, table, alias):
+    """Rowid minimo e massimo; due sottoquery perché min() e max() insieme scandirebbero la tabella"""
+    tbl = quote_identifier(table)
+    cursor.execute(f"SELECT (SELECT min({alias}) FROM {tbl}), (SELECT max({alias}) FROM {tbl})")
+    return cursor.fetchone()
+
+
+def window_rows(cursor, table, columns, rng=None, window=FALLBACK_WINDOW):
+    """Al massimo `window` righe delle colonne: una finestra casuale di rowid o l'inizio della tabella"""
+    rng = rng or random
+    tbl = quote_identifier(table)
+    select_list = ", ".join(bounded_value(col) for col in columns)
+    alias = rowid_alias(cursor, table)
+    if alias is None:
+        cursor.execute(f"SELECT {select_list} FROM {tbl} LIMIT ?", (window,))
+        return cursor.fetchall()
+    low, high = rowid_bounds(cursor, table, alias)
+    if low is None:
+        return []
+    start = rng.randint(low, max(low, high - window + 1))
+    cursor.execute(f"SELECT {select_list} FROM {tbl} WHERE {alias} >= ? AND {alias} < ?", (start, start + window))
+    return cursor.fetchall()
+
+
+def window_sample(cursor, table, columns, limit=2, distinct=False, rng=None):
+    """Ripiego a costo limitato: campiona le colonne da una finestra di al massimo FALLBACK_WINDOW righe"""
+    rng = rng or random
+    if not columns:
+        return {}
+    reservoirs = {col: _Reservoir(col, limit * 4, distinct, rng) for col in columns}
+    for row in window_rows(cursor, table, columns, rng):
+        for col, value in zip(columns, row):
+            reservoirs[col].offer(value)
+    return {col: reservoirs[col].pick(limit) for col in columns}
+
+
+def reservoir_sample(cursor, table, column, limit=2, distinct=False, rng=None):
+    """Campiona con un reservoir (algoritmo R) in una sola scansione, memoria O(limit)"""
+    rng = rng or random
+    cursor.execute(f"SELECT {bounded_value(column)} FROM {quote_identifier(table)} WHERE {example_filter(column)}")
+
+    reservoir = []
+    seen = 0
+    for (value,) in cursor:
+        if not is_valid_example(value):
+            continue
+        if distinct and value in reservoir:
+            continue
+        seen += 1
+        if len(reservoir) < limit:
+            reservoir.append(value)
+        else:
+            slot = rng.randrange(seen)
+            if slot < limit:
+                reservoir[slot] = value
+    return reservoir
+
+
+def sample_column(cursor, table, column, limit=2, distinct=False, rng=None, max_attempts=None):
+    """Estrae fino a `limit` valori casuali validi pescando rowid casuali.
+
+    Ogni tentativo è una ricerca sul B-tree del rowid (O(log N)), quindi il costo
+    è circa O(k·log N) invece dell'ORDER BY RANDOM() che ordina tutta la tabella.
+    Le tabelle WITHOUT ROWID ricadono su un reservoir in una sola scansione.
+    Oltre il limite di tempo per colonna ripiega su window_sample.
+    """
+    rng = rng or random
+    try:
+        with time_limit(cursor.connection, remaining(column_budget())):
+            return _sample_column(cursor, table, column, limit, distinct, rng, max_attempts)
+    except BudgetExceeded:
+        record_fallback('sample_column.budget_fallback', table=table, column=column)
+        return window_sample(cursor, table, [column], limit, distinct, rng)[column]
+
+
+def _sample_column(cursor, table, column, limit, distinct, rng, max_attempts):
+    alias = rowid_alias(cursor, table)
+    if alias is None:
+        return reservoir_sample(cursor, table, column, limit, distinct, rng)
+
+    tbl = quote_identifier(table)
+    low, high = rowid_bounds(cursor, table, alias)
+    if low is None:
+        return []
+
+    # Ogni tentativo esamina al più PROBE_WINDOW rowid: su colonne sparse non scorre la tabella
+    probe = (
+        f"SELECT {alias}, {bounded_value(column)} FROM {tbl} "
+        f"WHERE {alias} >= ? AND {alias} <= ? AND {example_filter(column)} "
+        f"ORDER BY {alias} LIMIT 1"
+    )
+    if max_attempts is None:
+        max_attempts = limit * (8 if distinct else 4)
+
+    values = []
+    picked_rowids = set()
+    empty_probes = 0
+    for _ in range(max_attempts):
+        if len(values) >= limit or empty_probes >= MAX_EMPTY_PROBES:
+            break
+        start = rng.randint(low, high)
+        cursor.execute(probe, (start, min(start + PROBE_WINDOW - 1, high)))
+        row = cursor.fetchone()
+        if row is None:
+            empty_probes += 1
+            continue
+        rowid, value = row
+        if rowid in picked_rowids or not is_valid_example(value):
+            continue
+        picked_rowids.add(rowid)
+        if distinct and value in values:
+            continue
+        values.append(value)
+
+    if len(values) < limit:
+        # Colonne sparse o a bassa cardinalità: completa con una scansione che si ferma
+        # appena trova abbastanza valori (DISTINCT con LIMIT non ordina la tabella),
+        # entro le prime FALLBACK_WINDOW righe
+        current_tracer().count('sample_column.fallback', table=table, column=column)
+        bounded = bounded_value(column)
+        head = f"(SELECT {alias}, {quote_identifier(column)} FROM {tbl} LIMIT {FALLBACK_WINDOW})"
+        if distinct:
+            cursor.execute(f"SELECT DISTINCT NULL, {bounded} FROM {head} WHERE {example_filter(column)} LIMIT ?",
+                           (limit * 4,))
+        else:
+            cursor.execute(f"SELECT {alias}, {bounded} FROM {head} WHERE {example_filter(column)} LIMIT ?",
+                           (limit * 4,))
+        for rowid, value in cursor:
+            if len(values) >= limit:
+                break
+            if rowid in picked_rowids or not is_valid_example(value):
+                continue
+            if not (distinct and value in values):
+                values.append(value)
+
+    return values
+
+
+def is_valid_for_column(column, value):
+    """Replica in Python i filtri di example_filter per un singolo valore"""
+    if not is_valid_example(value) or (isinstance(value, str) and value == '0'):
+        return False
+    if column.lower().endswith('id') and 'id' in str(value).lower():
+        return False
+    return True
+
+
+class _Reservoir:
+    """Reservoir limitato di valori validi (eventualmente distinti) per una colonna"""
+
+    def __init__(self, column, size, distinct, rng):
+        self.column = column
+        self.size = size
+        self.distinct = distinct
+        self.rng = rng
+        self.values = []
+        self.seen = 0
+
+    def offer(self, value):
+        if not is_valid_for_column(self.column, value):
+            return
+        if self.distinct and value in self.values:
+            return
+        self.seen += 1
+        if len(self.values) < self.size:
+            self.values.append(value)
+        else:
+            slot = self.rng.randrange(self.seen)
+            if slot < self.size:
+                self.values[slot] = value
+
+    def pick(self, limit):
+        if len(self.values) <= limit:
+            return list(self.values)
+        return self.rng.sample(self.values, limit)
+
+
+def enumerate_distinct(cursor, table, column, limit, max_distinct, rng=None):
+    """Campiona una colonna a bassa cardinalità elencandone i valori distinti.
+
+    DISTINCT con LIMIT si ferma appena ha visto `max_distinct` valori, quindi su
+    colonne con pochi valori la scansione termina presto.
+    """
+    rng = rng or random
+    cursor.execute(f"SELECT DISTINCT {bounded_value(column)} FROM {quote_identifier(table)} "
+                   f"WHERE {example_filter(column)} LIMIT ?",
+                   (max(max_distinct, limit),))
+    values = [value for (value,) in cursor if is_valid_for_column(column, value)]
+    if len(values) <= limit:
+        return values
+    return rng.sample(values, limit)
+
+
+def sample_table(cursor, table, columns, limit=2, distinct=False, rng=None, probes=None, reservoir_size=None,
+                 strategies=None):
+    """Campiona gli esempi di tutte le colonne di una tabella insieme.
+
+    Le righe pescate per rowid casuale alimentano contemporaneamente i reservoir
+    di ogni colonna; solo le colonne rimaste scoperte (sparse o filtrate) vengono
+    completate con un'unica scansione condivisa. Il costo dipende dalla dimensione
+    della tabella, non da dimensione × numero di colonne.
+    `strategies` (da column_profile.sampling_strategy) può indicare per colonna
+    'skip' (nessun valore valido) o ('enumerate', n_distinti) per le colonne a
+    bassa cardinalità.
+    Se il campionamento supera il limite di tempo (quello per colonna moltiplicato
+    per le colonne, entro il limite del database) le colonne ancora vuote sono
+    campionate con window_sample.
+    Restituisce {colonna: [valori]} nell'ordine delle colonne ricevute.
+    """
+    rng = rng or random
+    strategies = strategies or {}
+    results = {col: [] for col in columns}
+    seconds = column_budget()
+    try:
+        with time_limit(cursor.connection, remaining(seconds and seconds * max(len(results), 1))):
+            _sample_table(cursor, table, results, limit, distinct, rng, probes, reservoir_size, strategies)
+    except BudgetExceeded:
+        pending = [col for col, values in results.items() if not values and strategies.get(col) != 'skip']
+        record_fallback('sample_table.budget_fallback', table=table, columns=", ".join(pending))
+        results.update(window_sample(cursor, table, pending, limit, distinct, rng))
+    return results
+
+
+def _sample_table(cursor, table, results, limit, distinct, rng, probes, reservoir_size, strategies):
+    """Riempie `results` sul posto (vedi sample_table)"""
+    columns = []
+    for col in results:
+        strategy = strategies.get(col, 'rowid')
+        if strategy == 'skip':
+            continue
+        if isinstance(strategy, tuple) and strategy[0] == 'enumerate':
+            results[col] = enumerate_distinct(cursor, table, col, limit, strategy[1], rng)
+            continue
+        columns.append(col)
+    if not columns:
+        return
+    if reservoir_size is None:
+        reservoir_size = limit * 4
+    if probes is None:
+        probes = reservoir_size * 2
+
+    reservoirs = {col: _Reservoir(col, reservoir_size, distinct, rng) for col in columns}
+    tbl = quote_identifier(table)
+    select_list = ", ".join(bounded_value(col) for col in columns)
+
+    alias = rowid_alias(cursor, table)
+    if alias is not None:
+        low, high = rowid_bounds(cursor, table, alias)
+        if low is None:
+            return
+
+        probe = f"SELECT {alias}, {select_list} FROM {tbl} WHERE {alias} >= ? ORDER BY {alias} LIMIT 1"
+        picked_rowids = set()
+        for _ in range(probes):
+            cursor.execute(probe, (rng.randint(low, high),))
+            row = cursor.fetchone()
+            if row is None or row[0] in picked_rowids:
+                continue
+            picked_rowids.add(row[0])
+            for col, value in zip(columns, row[1:]):
+                reservoirs[col].offer(value)
+        missing = [col for col in columns if len(reservoirs[col].values) < limit]
+    else:
+        missing = columns
+
+    if missing:
+        # Un'unica scansione per tutte le colonne ancora scoperte, sulle prime FALLBACK_WINDOW righe
+        current_tracer().count('sample_table.fallback_scan', table=table, columns=", ".join(missing))
+        for col in missing:
+            reservoirs[col] = _Reservoir(col, reservoir_size, distinct, rng)
+        where = " OR ".join(f"({example_filter(col)})" for col in missing)
+        missing_list = ", ".join(bounded_value(col) for col in missing)
+        head = ", ".join(quote_identifier(col) for col in missing)
+        cursor.execute(f"SELECT {missing_list} FROM (SELECT {head} FROM {tbl} LIMIT {FALLBACK_WINDOW}) WHERE {where}")
+        for row in cursor:
+            for col, value in zip(missing, row):
+                reservoirs[col].offer(value)
+
+    for col in columns:
+        results[col] = reservoirs[col].pick(limit)
+
+
+def iter_sorted_distinct(cursor, table, column, page_size=64):
+    """Itera i valori distinti non vuoti di una colonna in ordine crescente.
+
+    Usa una paginazione per chiave (`col > ultimo GROUP BY col ORDER BY col LIMIT n`):
+    con un indice ogni pagina è una scansione ordinata dell'indice, senza indice
+    ogni pagina è una scansione che restituisce `page_size` valori distinti (non
+    righe), come un SELECT DISTINCT ... ORDER BY ... LIMIT. Chi consuma l'iteratore
+    può fermarsi in qualsiasi momento senza materializzare la colonna.
+    I valori sono troncati da bounded_value: la chiave della pagina successiva è
+    un rowid dell'ultimo valore, da cui SQLite rilegge il valore completo.
+    """
+    col = quote_identifier(column)
+    tbl = quote_identifier(table)
+    alias = rowid_alias(cursor, table)
+    # Senza rowid (WITHOUT ROWID) la chiave è il valore stesso, letto per intero
+    key = f"min({alias})" if alias else col
+    base = f"SELECT {key}, {bounded_value(column)} FROM {tbl} WHERE {col} IS NOT NULL AND {col} != ''"
+    page = f"GROUP BY {col} ORDER BY {col} LIMIT ?"
+    first_page = f"{base} {page}"
+    if alias:
+        next_page = f"{base} AND {col} > (SELECT {col} FROM {tbl} WHERE {alias} = ?) {page}"
+    else:
+        next_page = f"{base} AND {col} > ? {page}"
+
+    cursor.execute(first_page, (page_size,))
+    rows = cursor.fetchall()
+    last = None
+    while rows:
+        for _, value in rows:
+            if value != last:   # Valori lunghi diversi possono avere la stessa forma troncata
+                yield value
+            last = value
+        if len(rows) < page_size:
+            return
+        cursor.execute(next_page, (rows[-1][0], page_size))
+        rows = cursor.fetchall()
+
+
+def window_sorted_distinct(cursor, table, column, limit, window=FALLBACK_WINDOW):
+    """Ripiego di iter_sorted_distinct: valori distinti in ordine tra le prime `window` righe della tabella"""
+    col = quote_identifier(column)
+    cursor.execute(
+        f"SELECT DISTINCT {bounded_value(column)} FROM (SELECT {col} FROM {quote_identifier(table)} LIMIT ?) "
+        f"WHERE {col} IS NOT NULL AND {col} != '' ORDER BY 1 LIMIT ?", (window, limit))
+    return [row[0] for row in cursor.fetchall()]
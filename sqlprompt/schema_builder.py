@@ -0,0 +1,220 @@
+"""Schemi commentati di tutti i database di una cartella, letti dal catalogo di SQLite.
+
+Esempio:
+    python -m sqlprompt.schema_builder --db-root dev_databases --output schemi_commentati
+
+Per ogni database (<db_id>/<db_id>.sqlite con le descrizioni in
+<db_id>/database_description) legge sqlite_master, PRAGMA table_info e
+PRAGMA foreign_key_list e scrive le CREATE TABLE con la descrizione di ogni
+colonna come commento in <output>/<db_id>.txt, senza toccare i file di origine.
+Un manifest nella cartella di output permette di saltare i database il cui file
+e i cui CSV non sono cambiati dall'ultima generazione.
+"""
+import argparse
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from sqlprompt.connections import open_readonly
+from sqlprompt.ddl import check_constraints, table_options
+from sqlprompt.description_catalog import load_catalog, sources_signature
+from sqlprompt.rendering import list_tables
+from sqlprompt.sample_cache import db_fingerprint
+from sqlprompt.sampling import quote_identifier
+
+BUILDER_VERSION = 2
+MANIFEST_NAME = 'manifest.json'
+DATABASE_EXTENSIONS = ('.sqlite', '.db', '.sqlite3')
+SIMPLE_IDENTIFIER = re.compile(r'[A-Za-z_]\w*\Z')
+RESERVED = {'order', 'group', 'select', 'from', 'where', 'table', 'index', 'key', 'references', 'default',
+            'check', 'primary', 'foreign', 'constraint', 'values', 'limit', 'join', 'on', 'as', 'by', 'to'}
+
+
+def identifier(name):
+    """Nome così com'è se è un identificatore semplice, altrimenti tra doppi apici"""
+    if SIMPLE_IDENTIFIER.match(name) and name.lower() not in RESERVED:
+        return name
+    return quote_identifier(name)
+
+
+def column_comment(descriptions, table, column):
+    """Commento SQL con la descrizione della colonna ("" se non descritta)"""
+    comment = descriptions.describe(table, column).replace('\n', ' ')
+    if not comment:
+        return ""
+    return " -- '" + comment.replace("'", "’") + "'"  # Evita conflitti con apici SQL
+
+
+def unique_constraints(cursor, table):
+    """Colonne dei vincoli UNIQUE dichiarati nella CREATE TABLE (non quelli di CREATE UNIQUE INDEX)"""
+    cursor.execute(f"PRAGMA index_list({quote_identifier(table)});")
+    indexes = [row[1] for row in cursor.fetchall() if row[2] and row[3] == 'u']
+    groups = []
+    for index in reversed(indexes):   # index_list elenca per primo l'ultimo dichiarato
+        cursor.execute(f"PRAGMA index_info({quote_identifier(index)});")
+        groups.append([row[2] for row in sorted(cursor.fetchall())])
+    return groups
+
+
+def table_definition(cursor, table, descriptions, sql=None):
+    """CREATE TABLE della tabella ricostruita dal catalogo, con le colonne commentate.
+
+    Dalla DDL originale (`sql`, da sqlite_master) si riprendono ciò che il catalogo
+    non descrive: vincoli CHECK e opzioni come WITHOUT ROWID.
+    """
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+    columns = cursor.fetchall()
+    primary_key = [col[1] for col in sorted(columns, key=lambda col: col[5]) if col[5]]
+    unique = unique_constraints(cursor, table)
+    unique_columns = {group[0] for group in unique if len(group) == 1}
+
+    definitions = []   # (testo, commento)
+    for _, name, type_, not_null, default, pk in columns:
+        text = f"    {identifier(name)} {type_}".rstrip()
+        if pk and len(primary_key) == 1:
+            text += " PRIMARY KEY"
+        if not_null:
+            text += " NOT NULL"
+        if name in unique_columns:
+            text += " UNIQUE"
+        if default is not None:
+            text += f" DEFAULT {default}"
+        definitions.append((text, column_comment(descriptions, table, name)))
+    if len(primary_key) > 1:
+        definitions.append((f"    PRIMARY KEY ({', '.join(identifier(name) for name in primary_key)})", ""))
+    for group in unique:
+        if len(group) > 1:
+            definitions.append((f"    UNIQUE ({', '.join(identifier(name) for name in group)})", ""))
+    definitions += [(f"    {clause}", "") for clause in check_constraints(sql or "")]
+
+    cursor.execute(f"PRAGMA foreign_key_list({quote_identifier(table)});")
+    keys = {}
+    for key_id, _, target, source, target_column, *_ in cursor.fetchall():
+        keys.setdefault(key_id, (target, [], []))
+        keys[key_id][1].append(source)
+        if target_column:
+            keys[key_id][2].append(target_column)
+    for key_id in sorted(keys, reverse=True):  # SQLite numera le chiavi dall'ultima dichiarata
+        target, sources, targets = keys[key_id]
+        text = f"    FOREIGN KEY ({', '.join(identifier(name) for name in sources)}) REFERENCES {identifier(target)}"
+        if targets:
+            text += f" ({', '.join(identifier(name) for name in targets)})"
+        definitions.append((text, ""))
+
+    lines = [f"CREATE TABLE {identifier(table)}", "("]
+    for position, (text, comment) in enumerate(definitions):
+        separator = "," if position < len(definitions) - 1 else ""
+        lines.append(text + separator + comment)
+    options = table_options(sql or "")
+    lines.append(f") {options};" if options else ");")
+    return "\n".join(lines)
+
+
+def commented_schema(cursor, descriptions):
+    """Schema commentato di tutte le tabelle, nell'ordine di sqlite_master"""
+    return "\n\n".join(table_definition(cursor, name, descriptions, sql) for name, sql in list_tables(cursor)) + "\n"
+
+
+def find_databases(databases_root):
+    """Database sotto la cartella: {db_id: (percorso, cartella delle descrizioni)}"""
+    found = {}
+    for folder, subfolders, files in os.walk(databases_root):
+        subfolders.sort()
+        for filename in sorted(files):
+            stem, extension = os.path.splitext(filename)
+            if extension.lower() not in DATABASE_EXTENSIONS:
+                continue
+            relative = os.path.relpath(os.path.join(folder, stem), databases_root)
+            # Layout BIRD (<db_id>/<db_id>.sqlite): il nome del database; altrimenti il percorso relativo
+            db_id = stem if os.path.basename(folder) == stem else relative.replace(os.sep, '__')
+            found[db_id] = (os.path.join(folder, filename), os.path.join(folder, 'database_description'))
+    return found
+
+
+def build_schema(db_path, description_folder, output_path):
+    """Scrive lo schema commentato di un database; restituisce (tabelle, colonne commentate)"""
+    descriptions = load_catalog(description_folder)
+    conn = open_readonly(db_path)
+    try:
+        schema = commented_schema(conn.cursor(), descriptions)
+    finally:
+        conn.close()
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(schema)
+    os.replace(tmp_path, output_path)
+    return schema.count("CREATE TABLE "), schema.count(" -- '")
+
+
+def source_state(db_path, description_folder):
+    """Stato di database e CSV registrato nel manifest"""
+    return {'version': BUILDER_VERSION, 'database': db_fingerprint(db_path)[1],
+            'descriptions': sources_signature(description_folder)}
+
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(output_dir, manifest):
+    path = os.path.join(output_dir, MANIFEST_NAME)
+    with open(f"{path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{path}.tmp", path)
+
+
+def build_all(databases_root, output_dir, workers=None, force=False):
+    """Genera gli schemi commentati dei database cambiati; restituisce (generati, saltati, errori)"""
+    os.makedirs(output_dir, exist_ok=True)
+    manifest = load_manifest(output_dir)
+    databases = find_databases(databases_root)
+
+    pending = {}
+    for db_id, (db_path, description_folder) in databases.items():
+        state = source_state(db_path, description_folder)
+        output_path = os.path.join(output_dir, f"{db_id}.txt")
+        if not force and manifest.get(db_id) == state and os.path.exists(output_path):
+            continue
+        pending[db_id] = (db_path, description_folder, output_path, state)
+    skipped = len(databases) - len(pending)
+    print(f"📊 Database: {len(databases)}, da generare: {len(pending)}, invariati: {skipped}")
+
+    built = errors = 0
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(build_schema, db_path, description_folder, output_path): db_id
+                       for db_id, (db_path, description_folder, output_path, _) in pending.items()}
+            for future in as_completed(futures):
+                db_id = futures[future]
+                try:
+                    tables, commented = future.result()
+                except Exception as e:
+                    errors += 1
+                    manifest.pop(db_id, None)
+                    print(f"❌ Errore sul database {db_id}: {str(e)}")
+                    continue
+                built += 1
+                manifest[db_id] = pending[db_id][3]
+                print(f"✅ {db_id}: {tables} tabelle, {commented} colonne commentate")
+    save_manifest(output_dir, manifest)
+    return built, skipped, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Genera gli schemi commentati di tutti i database di una cartella")
+    parser.add_argument('--db-root', required=True, help="Cartella dei database (<db_id>/<db_id>.sqlite)")
+    parser.add_argument('--output', required=True, help="Cartella in cui scrivere <db_id>.txt")
+    parser.add_argument('--workers', type=int, default=None, help="Numero di processi (default: CPU)")
+    parser.add_argument('--force', action='store_true', help="Rigenera anche i database invariati")
+    args = parser.parse_args()
+    built, skipped, errors = build_all(args.db_root, args.output, args.workers, args.force)
+    print(f"✅ Schemi generati: {built}, invariati: {skipped}, errori: {errors}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""Schema linking: sceglie per ogni domanda le tabelle e le colonne rilevanti del database.
+
+Ogni colonna è un documento (nomi di tabella e colonna, descrizione del catalogo,
+valori campionati) indicizzato con BM25 in una matrice NumPy calcolata una volta
+per database. Per una domanda si tengono le tabelle e le colonne con punteggio
+più alto, le chiavi primarie e le chiavi esterne necessarie ai join, più le
+tabelle intermedie del percorso di chiavi esterne che collega quelle scelte.
+"""
+import re
+import threading
+from collections import OrderedDict, deque
+
+import numpy as np
+
+from sqlprompt.column_profile import prompt_profile, table_strategies
+from sqlprompt.prompt_layout import estimate_tokens
+from sqlprompt.rendering import list_tables
+from sqlprompt.sample_cache import db_fingerprint, default_seed, seeded_rng
+from sqlprompt.sampling import quote_identifier, sample_table
+
+WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'for', 'from', 'has', 'have', 'how',
+    'in', 'is', 'it', 'its', 'list', 'many', 'much', 'of', 'on', 'or', 'please', 'refers', 'show', 'that', 'the',
+    'their', 'them', 'there', 'these', 'this', 'to', 'was', 'were', 'what', 'when', 'where', 'which', 'who',
+    'whose', 'with', 'give', 'among', 'all', 'each', 'than', 'more', 'most',
+}  # Solo parole che non sono nomi di colonne: 'name', 'number', ... frequenti pesano meno tramite l'IDF
+NAME_WEIGHT = 2       # I nomi contano più di descrizioni e valori
+SAMPLE_VALUES = 5     # Valori distinti campionati per colonna
+MAX_MEMOIZED_INDEXES = 32
+
+
+def _stem(word):
+    """Riduzione grossolana dei plurali inglesi"""
+    if len(word) > 4 and word.endswith('ies'):
+        return word[:-3] + 'y'
+    if len(word) > 3 and word.endswith('s') and not word.endswith('ss'):
+        return word[:-1]
+    return word
+
+
+def tokenize(text):
+    """Parole minuscole di un testo, con nomi camelCase e snake_case separati"""
+    words = (word.lower() for word in WORD.findall(str(text or '')))
+    return [_stem(word) for word in words if word not in STOPWORDS]
+
+
+def foreign_keys(cursor, tables):
+    """Chiavi esterne come (tabella, colonna, tabella_riferita, colonna_riferita)"""
+    by_lower = {name.lower(): name for name in tables}
+    keys = []
+    for table in tables:
+        cursor.execute(f"PRAGMA foreign_key_list({quote_identifier(table)});")
+        for row in cursor.fetchall():
+            target = by_lower.get(row[2].lower())
+            if target is not None:
+                keys.append((table, row[3], target, row[4]))
+    return keys
+
+
+class SchemaIndex:
+    """Indice BM25 delle colonne di un database"""
+
+    def __init__(self, columns, documents, primary_keys, foreign_keys, k1=1.5, b=0.75):
+        self.columns = columns                # [(tabella, colonna)]
+        self.primary_keys = primary_keys      # {tabella: [colonne]}
+        self.foreign_keys = foreign_keys      # [(tabella, colonna, tabella_riferita, colonna_riferita)]
+        self.vocabulary = {}
+        for document in documents:
+            for term in document:
+                self.vocabulary.setdefault(term, len(self.vocabulary))
+
+        counts = np.zeros((len(documents), len(self.vocabulary)), dtype=np.float32)
+        for row, document in enumerate(documents):
+            for term in document:
+                counts[row, self.vocabulary[term]] += 1
+        lengths = counts.sum(axis=1, keepdims=True)
+        average = float(lengths.mean()) if len(documents) else 1.0
+        document_frequency = (counts > 0).sum(axis=0)
+        self.idf = np.log1p((len(documents) - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = k1 * (1 - b + b * lengths / max(average, 1.0))
+        self.weights = (counts * (k1 + 1) / (counts + norm)) * self.idf
+
+    def score(self, question):
+        """Punteggio BM25 di ogni colonna per la domanda"""
+        terms = [self.vocabulary[term] for term in set(tokenize(question)) if term in self.vocabulary]
+        if not terms or not self.columns:
+            return np.zeros(len(self.columns), dtype=np.float32)
+        return self.weights[:, terms].sum(axis=1)
+
+    def _join_path(self, start, goal):
+        """Tabelle del percorso più breve di chiavi esterne tra due tabelle"""
+        neighbours = {}
+        for table, _, target, _ in self.foreign_keys:
+            neighbours.setdefault(table, set()).add(target)
+            neighbours.setdefault(target, set()).add(table)
+        previous = {start: None}
+        queue = deque([start])
+        while queue:
+            table = queue.popleft()
+            if table == goal:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path
+            for neighbour in sorted(neighbours.get(table, ())):
+                if neighbour not in previous:
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return []
+
+    def select(self, question, top_tables=3, top_columns=6):
+        """Tabelle e colonne da tenere per la domanda: {tabella: [colonne]}, None se nulla corrisponde.
+
+        Il punteggio di una tabella è quello della sua colonna migliore.
+        """
+        scores = self.score(question)
+        if not scores.any():
+            return None
+
+        table_scores = OrderedDict()
+        for (table, _), value in zip(self.columns, scores):
+            table_scores[table] = max(table_scores.get(table, 0.0), float(value))
+        ranked = [table for table, value in sorted(table_scores.items(), key=lambda item: -item[1]) if value > 0]
+        chosen = ranked[:top_tables]
+
+        # Chiusura sulle chiavi esterne: le tabelle intermedie necessarie ai join
+        kept_tables = list(chosen)
+        for goal in chosen[1:]:
+            for table in self._join_path(chosen[0], goal):
+                if table not in kept_tables:
+                    kept_tables.append(table)
+
+        keep = {table: list(self.primary_keys.get(table, [])) for table in kept_tables}
+        order = np.argsort(-scores, kind='stable')
+        taken = dict.fromkeys(kept_tables, 0)
+        for position in order:
+            if scores[position] <= 0:
+                break
+            table, column = self.columns[position]
+            if table in keep and taken[table] < top_columns:
+                taken[table] += 1
+                if column not in keep[table]:
+                    keep[table].append(column)
+        for table, column, target, target_column in self.foreign_keys:
+            if table in keep and target in keep:
+                if column not in keep[table]:
+                    keep[table].append(column)
+                if target_column and target_column not in keep[target]:
+                    keep[target].append(target_column)
+        return keep
+
+
+def build_index(cursor, descriptions, db_path=None):
+    """Costruisce l'indice leggendo nomi, descrizioni e un campione di valori di ogni colonna"""
+    profile = None
+    if db_path is not None:
+        try:
+            profile = prompt_profile(db_path)
+        except Exception as e:
+            print(f"⚠️ Profilo del database non disponibile: {str(e)}")
+
+    seed = default_seed() or 0
+    tables = [name for name, _ in list_tables(cursor)]
+    columns, documents, primary_keys = [], [], {}
+    for table in tables:
+        cursor.execute(f"PRAGMA table_info({quote_identifier(table)});")
+        info = cursor.fetchall()
+        names = [col[1] for col in info]
+        primary_keys[table] = [col[1] for col in sorted(info, key=lambda col: col[5]) if col[5]]
+        strategies = table_strategies(profile, table, names, SAMPLE_VALUES) if profile else None
+        try:
+            samples = sample_table(cursor, table, names, limit=SAMPLE_VALUES, distinct=True,
+                                   rng=seeded_rng(seed, 'schema_linking', table), strategies=strategies)
+        except Exception as e:
+            print(f"⚠️ Errore durante il campionamento di {table}: {str(e)}")
+            samples = {}
+
+        table_terms = tokenize(table)
+        for name in names:
+            document = table_terms + tokenize(name) * NAME_WEIGHT
+            entry = descriptions.raw(table, name) if descriptions is not None else None
+            if entry:
+                document += tokenize(entry[0]) + tokenize(entry[1])
+            for value in samples.get(name, []):
+                if isinstance(value, str):
+                    document += tokenize(value)
+            columns.append((table, name))
+            documents.append(document)
+    return SchemaIndex(columns, documents, primary_keys, foreign_keys(cursor, tables))
+
+
+_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def load_index(cursor, descriptions, db_path):
+    """Indice del database, costruito una volta e riusato finché database e descrizioni non cambiano"""
+    try:
+        real_path, fingerprint = db_fingerprint(db_path)
+    except OSError:
+        return build_index(cursor, descriptions, db_path)
+    key = real_path, fingerprint, getattr(descriptions, 'signature', None), default_seed()
+
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+
+    index = build_index(cursor, descriptions, db_path)
+    with _memo_lock:
+        _memo[key] = index
+        while len(_memo) > MAX_MEMOIZED_INDEXES:
+            _memo.popitem(last=False)
+    return index
+
+
+def pruning_report(keep, full_prompt, pruned_prompt):
+    """Riepilogo della potatura: tabelle/colonne tenute e token risparmiati"""
+    before, after = estimate_tokens(full_prompt), estimate_tokens(pruned_prompt)
+    return {
+        'tables': sorted(keep) if keep else None,
+        'columns': sum(len(columns) for columns in keep.values()) if keep else None,
+        'tokens_before': before,
+        'tokens_after': after,
+        'tokens_saved': before - after,
+    }
@@ -0,0 +1,30 @@
+"""Accesso agli script delle due tecniche di prompting dai moduli di sqlprompt"""
+import importlib
+import os
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FEWSHOT_DIR = os.path.join(REPO_ROOT, 'CoTFewShot+PromptChaining')
+ZEROSHOT_DIR = os.path.join(REPO_ROOT, 'Prompt chaining + CoT zero shot + db examples + steps + output format + rules')
+
+
+def load_script(name):
+    """Importa uno script delle cartelle delle tecniche (es. 'prompt1Generator', 'prompt2')"""
+    for folder in (FEWSHOT_DIR, ZEROSHOT_DIR):
+        if folder not in sys.path:
+            sys.path.append(folder)
+    return importlib.import_module(name)
+
+
+def bird_paths(databases_root, db_id):
+    """Percorsi del database e della cartella delle descrizioni nel layout BIRD.
+
+    In una cartella di pacchetti di contesto (<db_id>.dbpack) il pacchetto fa da database e da descrizioni.
+    """
+    db_dir = os.path.join(databases_root, db_id)
+    db_path = os.path.join(db_dir, f"{db_id}.sqlite")
+    if not os.path.exists(db_path):
+        from sqlprompt.context_pack import pack_path
+        if os.path.exists(pack_path(databases_root, db_id)):
+            return pack_path(databases_root, db_id), pack_path(databases_root, db_id)
+    return db_path, os.path.join(db_dir, 'database_description')
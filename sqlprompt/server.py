@@ -0,0 +1,273 @@
+"""Servizio HTTP locale che genera i prompt senza interfaccia, tenendo in memoria cataloghi, esempi e connessioni.
+
+Esempio:
+    python -m sqlprompt.server --db-root dev_databases --port 8765
+    curl -s localhost:8765/fewshot/prompt1 -d '{"db_id": "school", "questions": ["How many schools?"]}'
+
+Endpoint (POST, corpo JSON con `db_id` oppure `db_path` e `description_folder`):
+    /fewshot/prompt1   questions            → prompt1Generator
+    /fewshot/prompt2   question, examples   → prompt2Generator
+    /zeroshot/prompt1  question             → prompt1.generate_output sullo schema commentato
+    /zeroshot/prompt2  question, schema_analysis, value_formats → prompt2.generate_final_prompt
+GET /health e GET /metrics (latenze per endpoint e percentuali di riuso delle cache).
+Le risposte few-shot riportano anche hash e token del prefisso che dipende solo dal database.
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from sqlprompt.batch import database_schema
+from sqlprompt.chain import StageMetrics
+from sqlprompt.column_profile import BACKGROUND_ENV
+from sqlprompt.connections import get_default_pool, pooled
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.prompt_layout import prefix_info
+from sqlprompt.rendering import memo_stats
+from sqlprompt.sample_cache import db_fingerprint, get_default_cache
+from sqlprompt.sampling import display_blob
+from sqlprompt.scripts import bird_paths, load_script
+
+MAX_MEMOIZED_SCHEMAS = 32
+
+
+class RequestError(Exception):
+    """Richiesta non valida; `status` è il codice HTTP da restituire"""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_values(sample_data):
+    """Valori campionati serializzabili in JSON: i BLOB nella stessa forma dei prompt"""
+    return {key: [display_blob(value) if isinstance(value, bytes) else value for value in values]
+            for key, values in sample_data.items()}
+
+
+def _hit_rate(hits, misses):
+    total = hits + misses
+    return round(hits / total, 3) if total else None
+
+
+class PromptService:
+    """Genera i prompt delle due tecniche riusando script, cataloghi e schemi già caricati"""
+
+    def __init__(self, databases_root=None):
+        self.databases_root = databases_root
+        self.metrics = StageMetrics()
+        self.requests = Counter()
+        self.errors = Counter()
+        self._prompt1 = load_script('prompt1')
+        self._prompt2 = load_script('prompt2')
+        self._prompt1_generator = load_script('prompt1Generator')
+        self._prompt2_generator = load_script('prompt2Generator')
+        self._commented_schema = load_script('SQLite_commentedSchema')
+        self._schemas = OrderedDict()
+        self._schema_stats = Counter()
+        self._lock = threading.Lock()
+        self.routes = {
+            '/fewshot/prompt1': self.fewshot_prompt1,
+            '/fewshot/prompt2': self.fewshot_prompt2,
+            '/zeroshot/prompt1': self.zeroshot_prompt1,
+            '/zeroshot/prompt2': self.zeroshot_prompt2,
+        }
+
+    def resolve(self, request):
+        """(database, cartella delle descrizioni) indicati dalla richiesta"""
+        if request.get('db_id'):
+            if not self.databases_root:
+                raise RequestError("db_id richiede che il servizio sia avviato con --db-root")
+            db_path, description_folder = bird_paths(self.databases_root, request['db_id'])
+        elif request.get('db_path'):
+            db_path, description_folder = request['db_path'], request.get('description_folder')
+        else:
+            raise RequestError("Indicare db_id oppure db_path")
+        if not os.path.isfile(db_path):
+            raise RequestError(f"Database non trovato: {db_path}", status=404)
+        return db_path, description_folder
+
+    @staticmethod
+    def _field(request, name):
+        value = request.get(name)
+        if not value:
+            raise RequestError(f"Campo mancante: {name}")
+        return value
+
+    def commented_schema(self, db_path, descriptions):
+        """Schema commentato del database, costruito una volta finché database e descrizioni non cambiano"""
+        key = db_fingerprint(db_path) + (descriptions.signature,)
+        with self._lock:
+            if key in self._schemas:
+                self._schemas.move_to_end(key)
+                self._schema_stats['hits'] += 1
+                return self._schemas[key]
+            self._schema_stats['misses'] += 1
+
+        with pooled(db_path) as conn:
+            schema = database_schema(conn.cursor())
+        commented = self._commented_schema.append_comments_to_schema(schema, descriptions)
+        with self._lock:
+            self._schemas[key] = commented
+            while len(self._schemas) > MAX_MEMOIZED_SCHEMAS:
+                self._schemas.popitem(last=False)
+        return commented
+
+    def fewshot_prompt1(self, request):
+        db_path, description_folder = self.resolve(request)
+        questions = self._field(request, 'questions')
+        if isinstance(questions, str):
+            questions = [questions]
+        descriptions = load_catalog(description_folder)
+        with pooled(db_path) as conn:
+            body = self._prompt1_generator.render_prompt_body(conn.cursor(), descriptions, db_path)
+        prompt = body + self._prompt1_generator.render_questions(questions)
+        return {'prompt': prompt, 'prefix': prefix_info(prompt, body)}
+
+    def fewshot_prompt2(self, request):
+        db_path, description_folder = self.resolve(request)
+        question = self._field(request, 'question')
+        descriptions = load_catalog(description_folder)
+        with pooled(db_path) as conn:
+            body = self._prompt2_generator.render_prompt_body(conn.cursor(), descriptions, db_path)
+        prompt = body + self._prompt2_generator.render_question(question, request.get('examples', ''))
+        return {'prompt': prompt, 'prefix': prefix_info(prompt, body)}
+
+    def zeroshot_prompt1(self, request):
+        db_path, description_folder = self.resolve(request)
+        question = self._field(request, 'question')
+        schema = self.commented_schema(db_path, load_catalog(description_folder))
+        return {'prompt': self._prompt1.generate_output(schema, question)}
+
+    def zeroshot_prompt2(self, request):
+        db_path, _ = self.resolve(request)
+        question = self._field(request, 'question')
+        schema_analysis = self._field(request, 'schema_analysis')
+        sample_data = self._prompt2.extract_clean_instances(db_path, schema_analysis)
+        formats = None
+        if request.get('value_formats'):
+            formats = self._prompt2.extract_value_formats(db_path, schema_analysis)
+        return {'prompt': self._prompt2.generate_final_prompt(schema_analysis, sample_data, question, formats),
+                'sample_data': _json_values(sample_data), 'value_formats': formats}
+
+    def handle(self, path, request):
+        """Esegue l'endpoint; la richiesta va registrata con record() dopo l'invio della risposta"""
+        endpoint = self.routes.get(path)
+        if endpoint is None:
+            raise RequestError(f"Endpoint sconosciuto: {path}", status=404)
+        return endpoint(request)
+
+    def record(self, path, seconds, failed):
+        """Registra latenza ed eventuale errore di una richiesta a un endpoint"""
+        if path not in self.routes:
+            return
+        with self._lock:
+            self.requests[path] += 1
+            if failed:
+                self.errors[path] += 1
+            self.metrics.record(path, seconds)
+
+    def metrics_report(self):
+        """Latenze per endpoint e riuso di sezioni, schemi, campioni e connessioni"""
+        with self._lock:
+            report = {
+                'requests': dict(self.requests),
+                'errors': dict(self.errors),
+                'latency': self.metrics.summary(),
+                'commented_schema': dict(self._schema_stats, size=len(self._schemas)),
+            }
+        sections = memo_stats()
+        report['sections'] = dict(sections, hit_rate=_hit_rate(sections['hits'], sections['misses']))
+        report['commented_schema']['hit_rate'] = _hit_rate(report['commented_schema'].get('hits', 0),
+                                                           report['commented_schema'].get('misses', 0))
+        cache = get_default_cache()
+        if cache is not None:
+            report['sample_cache'] = {'hits': cache.hits, 'misses': cache.misses,
+                                      'hit_rate': _hit_rate(cache.hits, cache.misses)}
+        pool = get_default_pool()
+        if pool is not None:
+            connections = pool.stats()
+            report['connections'] = dict(connections,
+                                         reuse_rate=_hit_rate(connections['reused'], connections['opened']))
+        return report
+
+
+class PromptHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass  # Nessun log per richiesta
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = self.path.rstrip('/')
+        if path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif path == '/metrics':
+            self._send_json(200, self.service.metrics_report())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        path = self.path.rstrip('/')
+        start = time.perf_counter()
+        failed = True
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            try:
+                request = json.loads(self.rfile.read(length) or b'{}')
+            except ValueError as e:
+                raise RequestError(f"JSON non valido: {e}")
+            if not isinstance(request, dict):
+                raise RequestError("Il corpo deve essere un oggetto JSON")
+            self._send_json(200, self.service.handle(path, request))
+            failed = False
+        except RequestError as e:
+            self._send_json(e.status, {'error': str(e)})
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+        finally:
+            # Conta come riuscita solo una risposta serializzata e inviata
+            self.service.record(path, time.perf_counter() - start, failed)
+
+
+def start_server(host='127.0.0.1', port=0, databases_root=None):
+    """Avvia il servizio in un thread; restituisce (server, base_url)"""
+    handler = type('ConfiguredPromptHandler', (PromptHandler,), {'service': PromptService(databases_root)})
+    server = ThreadingHTTPServer((host, port), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servizio HTTP locale per la generazione dei prompt")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--db-root', default=None, help="Cartella dei database BIRD, per le richieste con db_id")
+    args = parser.parse_args()
+    # Processo lungo: i profili mancanti vengono costruiti in background per le richieste successive
+    os.environ.setdefault(BACKGROUND_ENV, '1')
+    handler = type('ConfiguredPromptHandler', (PromptHandler,), {'service': PromptService(args.db_root)})
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"✅ Servizio dei prompt in ascolto su http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+import sys
+
+import pytest
+
+from sqlprompt import benchmark
+from sqlprompt.column_profile import load_profile
+
+SPEC = dict(benchmark.DEFAULT_SPEC, rows=200, tables=2, columns=3)
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setenv('SQLPROMPT_PROFILE_BACKGROUND', '1')
+    db_path, description_folder, _ = benchmark.prepare_dataset(str(tmp_path), SPEC)
+    return db_path, description_folder
+
+
+def test_run_case_counts_steps_without_building_profiles(dataset):
+    db_path, description_folder = dataset
+    result = benchmark.run_case('get_distinct_random_examples', db_path, description_folder, 2)
+    assert len(result['runs_ms']) == 2
+    assert result['vm_steps'] > 0
+    result = benchmark.run_case('prompt2Generator.analyze_database', db_path, description_folder, 1)
+    assert result['vm_steps'] > 0
+    assert load_profile(db_path, build=False) is None   # Nessun profilo in background durante le misure
+
+
+def test_peak_rss_is_optional(monkeypatch):
+    monkeypatch.setitem(sys.modules, 'resource', None)   # Come su Windows
+    assert benchmark._peak_rss_kb() is None
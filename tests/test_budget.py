@@ -0,0 +1,43 @@
+import sqlite3
+import time
+
+import pytest
+
+from sqlprompt.budget import (DEFAULT_COLUMN_BUDGET, BudgetExceeded, column_budget, current_deadline, database_budget,
+                              remaining, time_limit)
+
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+
+def test_time_limit_interrupts_query():
+    conn = sqlite3.connect(':memory:')
+    start = time.perf_counter()
+    with pytest.raises(BudgetExceeded):
+        with time_limit(conn, 0.05):
+            conn.execute(ENDLESS).fetchone()
+    assert time.perf_counter() - start < 2
+    assert conn.execute("SELECT 1").fetchone() == (1,)   # Handler rimosso all'uscita
+
+
+def test_nested_budget_cannot_extend_outer_one():
+    assert current_deadline() is None
+    with database_budget(1):
+        outer = current_deadline()
+        with database_budget(100):
+            assert current_deadline() == outer
+            assert remaining(50) <= 1
+        assert remaining(share=0.5) <= 0.5
+    assert current_deadline() is None and remaining(3) == 3
+
+
+def test_zero_disables_limit(monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_DB_BUDGET', '0')
+    with database_budget():
+        assert current_deadline() is None
+
+
+def test_invalid_budget_warns_once_and_uses_default(monkeypatch, capsys):
+    monkeypatch.setenv('SQLPROMPT_COLUMN_BUDGET', 'two')
+    assert column_budget() == DEFAULT_COLUMN_BUDGET
+    assert column_budget() == DEFAULT_COLUMN_BUDGET
+    assert capsys.readouterr().out.count('SQLPROMPT_COLUMN_BUDGET') == 1
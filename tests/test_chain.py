@@ -0,0 +1,73 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+
+from sqlprompt.chain import ChainRunner, ChatClient, parse_columns, parse_sql, run_chain
+from sqlprompt.mock_llm import start_mock_server
+
+
+@pytest.fixture
+def databases(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    root = tmp_path / 'databases'
+    (root / 'zoo').mkdir(parents=True)
+    conn = sqlite3.connect(root / 'zoo' / 'zoo.sqlite')
+    conn.execute("CREATE TABLE animal (animal_id INTEGER PRIMARY KEY, name TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO animal (name, age) VALUES (?, ?)", [('Tom', 3), ('Rex', 5)])
+    conn.commit()
+    conn.close()
+    return str(root)
+
+
+@pytest.fixture
+def client():
+    server, base_url = start_mock_server()
+    yield ChatClient(base_url, 'mock', retries=1, timeout=30)
+    server.shutdown()
+    server.server_close()
+
+
+def test_parse_replies():
+    assert parse_columns("Step 1\n```text\nanimal.name\nanimal.age\n```") == "animal.name\nanimal.age"
+    assert parse_sql("Reasoning\n```sql\nSELECT 1\n```") == "SELECT 1"
+
+
+def test_chain_runs_offline_with_mock_model(tmp_path, databases, client):
+    questions = [{'db_id': 'zoo', 'question': "What is the name of the oldest animal?"},
+                 {'db_id': 'zoo', 'question': "How old is Tom?", 'evidence': "age refers to years"}]
+    path = tmp_path / 'dev.json'
+    path.write_text(json.dumps(questions))
+    output = tmp_path / 'out.jsonl'
+    records, metrics = asyncio.run(run_chain(str(path), databases, str(output), client, concurrency=2))
+    assert [record.get('error') for record in records] == [None, None]
+    assert 'animal.name' in records[0]['schema_analysis']
+    assert records[0]['predicted_sql'] == 'SELECT "name" FROM "animal" LIMIT 1'
+    assert len(output.read_text().splitlines()) == 2
+    assert metrics['schema']['count'] == 2
+
+
+def test_failed_schema_is_rebuilt_for_the_next_question(databases, client):
+    runner = ChainRunner(client, databases)
+    build = runner._build_commented_schema
+    calls = []
+
+    def flaky(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return build(*args)
+
+    runner._build_commented_schema = flaky
+
+    async def questions():
+        with pytest.raises(sqlite3.OperationalError):
+            await runner.commented_schema('zoo')
+        first = await runner.commented_schema('zoo')
+        second = await runner.commented_schema('zoo')
+        return first, second
+
+    first, second = asyncio.run(questions())
+    assert 'CREATE TABLE animal' in first and first == second
+    assert len(calls) == 2
@@ -0,0 +1,52 @@
+import argparse
+import json
+
+import pytest
+
+from sqlprompt.checkpoint import Checkpoint, merge, parse_shard, read_log, select_shard, shard_of
+
+
+def test_parse_shard():
+    assert parse_shard(' 1/4 ') == (1, 4)
+    for text in ('4/4', '1-4', '-1/4', 'a/b'):
+        with pytest.raises(argparse.ArgumentTypeError):
+            parse_shard(text)
+
+
+def test_shards_partition_questions_by_database():
+    questions = [{'db_id': f"db{i % 5}"} for i in range(40)]
+    shards = [select_shard(questions, (index, 3)) for index in range(3)]
+    assert sorted(position for shard in shards for position in shard) == list(range(40))
+    for index, positions in enumerate(shards):
+        assert {shard_of(questions[position]['db_id'], 3) for position in positions} <= {index}
+    assert select_shard(questions, None) == list(range(40))
+
+
+def test_checkpoint_resumes_and_repairs_truncated_line(tmp_path):
+    with Checkpoint(tmp_path, (0, 2)) as checkpoint:
+        checkpoint.append(3, {'prompt': 'a'})
+        checkpoint.append(5, {'error': 'boom'})
+    path = tmp_path / 'shard-0-of-2.jsonl'
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"index": 7, "rec')   # Interruzione durante la scrittura
+
+    with Checkpoint(tmp_path, (0, 2)) as checkpoint:
+        assert checkpoint.done() == {3}   # Le domande con errore vengono ripetute
+        checkpoint.append(5, {'prompt': 'b'})
+    assert read_log(str(path)) == {3: {'prompt': 'a'}, 5: {'prompt': 'b'}}
+
+
+def test_merge_orders_records_and_reports_missing_shards(tmp_path):
+    with Checkpoint(tmp_path, (2, 3)) as checkpoint:
+        checkpoint.append(4, {'n': 4})
+        checkpoint.append(1, {'n': 1})
+    with Checkpoint(tmp_path, (0, 3)) as checkpoint:
+        checkpoint.append(2, {'n': 2})
+    output = tmp_path / 'merged.jsonl'
+    count, missing = merge(tmp_path, output)
+    assert (count, missing) == (3, [1])
+    assert [json.loads(line)['n'] for line in output.read_text().splitlines()] == [1, 2, 4]
+
+    Checkpoint(tmp_path, (0, 2)).close()
+    with pytest.raises(ValueError):
+        merge(tmp_path, output)
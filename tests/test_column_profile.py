@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+from sqlprompt import column_profile
+from sqlprompt.budget import database_budget
+from sqlprompt.column_profile import (build_profile, estimate_distinct, load_profile, prompt_profile,
+                                      wait_for_background_builds)
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, category TEXT, code TEXT)")
+    conn.executemany("INSERT INTO t (category, code) VALUES (?, ?)",
+                     [(f"c{i % 12}", f"k{i}") for i in range(30000)])
+    conn.execute("CREATE TABLE u (v)")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_distinct_estimates(database):
+    conn = sqlite3.connect(database)
+    cursor = conn.cursor()
+    sample = column_profile._distinct_sample(cursor, 't', ['category', 'code'], 30000)
+    # Tutti i valori ricorrono nel campione: conteggio esatto; nessun valore ripetuto: colonna univoca
+    assert estimate_distinct(cursor, sample, 'category', 30000) == 12
+    assert estimate_distinct(cursor, sample, 'code', 30000) == 30000
+    small = "SELECT * FROM t LIMIT 10"
+    assert estimate_distinct(cursor, small, 'category', 10) == 10
+    conn.close()
+
+
+def test_profile_interrupted_by_budget_is_partial(database, capsys):
+    with database_budget(1e-9):
+        profile = build_profile(database)
+    assert profile['tables'] == {}
+    assert profile['skipped'] == ['t', 'u']
+    assert 'Profilo parziale' in capsys.readouterr().out
+
+
+def test_prompt_profile_never_builds_by_default(database):
+    assert prompt_profile(database) is None
+    assert not column_profile._building
+    assert load_profile(database, build=False) is None
+
+
+def test_prompt_profile_builds_in_background(database, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_PROFILE_BACKGROUND', '1')
+    assert prompt_profile(database) is None
+    wait_for_background_builds()
+    profile = prompt_profile(database)
+    stats = profile['tables']['t']['columns']['category']
+    assert (profile['tables']['t']['row_count'], stats['distinct_estimate']) == (30000, 12)
+    assert (stats['min'], stats['max']) == ('c0', 'c9')
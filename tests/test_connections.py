@@ -0,0 +1,77 @@
+import os
+import sqlite3
+
+import pytest
+
+from sqlprompt.connections import ConnectionPool, open_readonly, readonly_uri
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    path = str(tmp_path / 'my db%.sqlite')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (x INTEGER)")
+    conn.execute("INSERT INTO t VALUES (1)")
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_readonly_uri_quotes_the_path():
+    assert readonly_uri('/data/my db%.sqlite') == "file:/data/my%20db%25.sqlite?mode=ro&immutable=1"
+    assert readonly_uri('a.sqlite', immutable=False) == "file:a.sqlite?mode=ro"
+
+
+def test_readonly_connection_refuses_writes(db_path):
+    conn = open_readonly(db_path)
+    assert conn.execute("SELECT x FROM t").fetchall() == [(1,)]
+    assert conn.execute("PRAGMA temp_store").fetchone() == (2,)  # MEMORY
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO t VALUES (2)")
+    conn.close()
+
+
+def test_pool_reuses_idle_connections(db_path):
+    pool = ConnectionPool()
+    with pool.connection(db_path) as first:
+        with pool.connection(db_path) as second:  # Quella in uso non è disponibile
+            assert second is not first
+    with pool.connection(db_path) as third:
+        assert third in (first, second)
+    assert pool.stats() == {'opened': 2, 'reused': 1, 'idle': 2}
+    pool.close()
+    assert pool.stats()['idle'] == 0
+
+
+def test_modified_database_gets_a_new_connection(db_path):
+    pool = ConnectionPool()
+    with pool.connection(db_path) as first:
+        pass
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(1000)])
+    conn.commit()
+    conn.close()
+    os.utime(db_path, ns=(0, 0))
+    with pool.connection(db_path) as second:
+        assert second is not first
+        assert second.execute("SELECT COUNT(*) FROM t").fetchone() == (1001,)
+    pool.close()
+
+
+def test_memory_cap_and_idle_time_evict_connections(db_path):
+    pool = ConnectionPool(memory_mb=1, cache_size_kb=1024)  # Una sola connessione inattiva
+    with pool.connection(db_path), pool.connection(db_path):
+        pass
+    assert pool.stats()['idle'] == 1
+    pool = ConnectionPool(idle_seconds=-1)
+    with pool.connection(db_path):
+        pass
+    assert pool.stats()['idle'] == 0
+
+
+def test_failed_block_closes_the_connection(db_path):
+    pool = ConnectionPool()
+    with pytest.raises(sqlite3.OperationalError):
+        with pool.connection(db_path) as conn:
+            conn.execute("SELECT missing FROM t")
+    assert pool.stats()['idle'] == 0
@@ -0,0 +1,50 @@
+import sqlite3
+
+from sqlprompt.context_pack import build_pack, is_pack, read_pack
+from sqlprompt.rendering import list_tables
+
+
+def _customers(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE customers (CustomerID TEXT NOT NULL PRIMARY KEY, Segment TEXT, Currency TEXT)")
+    conn.executemany("INSERT INTO customers VALUES (?, ?, ?)",
+                     [(f"ID{i:04d}", ('SME', 'LAM', 'KAM')[i % 3], ('EUR', 'CZK')[i % 2]) for i in range(200)])
+    conn.execute("CREATE TABLE pairs (a INTEGER NOT NULL, b INTEGER NOT NULL, note TEXT, PRIMARY KEY (a, b))")
+    conn.executemany("INSERT INTO pairs VALUES (?, ?, ?)",
+                     [(i % 2 + 1, i // 2 + 1, f"note {i}") for i in range(60)])
+    conn.commit()
+    conn.close()
+
+
+def test_constrained_columns_keep_their_rows(tmp_path):
+    # Gli ID filtrati dagli esempi lasciano vuoto il campione della chiave NOT NULL:
+    # le righe non devono sparire
+    db_path = tmp_path / 'customers.sqlite'
+    output = tmp_path / 'customers.dbpack'
+    _customers(db_path)
+    tables, rows, values = build_pack(str(db_path), None, str(output), 'customers')
+
+    assert is_pack(str(output))
+    conn = sqlite3.connect(output)
+    customers = conn.execute("SELECT count(*), count(DISTINCT Segment), count(DISTINCT Currency) "
+                             "FROM customers").fetchone()
+    assert customers == (3, 3, 2)
+    pairs = conn.execute("SELECT count(*), count(DISTINCT note) FROM pairs").fetchone()
+    assert pairs[0] == pairs[1] > 2
+    assert tables == 2
+    assert rows == customers[0] + pairs[0]
+    assert values == conn.execute(
+        "SELECT (SELECT count(DISTINCT CustomerID) + count(DISTINCT Segment) + count(DISTINCT Currency) "
+        "FROM customers) + (SELECT count(DISTINCT a) + count(DISTINCT b) + count(DISTINCT note) FROM pairs)"
+    ).fetchone()[0]
+
+
+def test_pack_keeps_original_schema(tmp_path):
+    db_path = tmp_path / 'customers.sqlite'
+    output = tmp_path / 'customers.dbpack'
+    _customers(db_path)
+    build_pack(str(db_path), None, str(output), 'customers')
+
+    original = list_tables(sqlite3.connect(db_path).cursor())
+    assert list_tables(sqlite3.connect(output).cursor()) == original
+    assert read_pack(str(output), 'meta')['db_id'] == 'customers'
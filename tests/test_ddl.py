@@ -0,0 +1,72 @@
+import sqlite3
+
+from sqlprompt.batch import database_schema
+from sqlprompt.ddl import check_constraints, format_create_table, parse_create_table, prune_create_table, strip_comments
+from sqlprompt.prompt_layout import estimate_tokens
+
+ORDERS = ("CREATE TABLE orders (order_id INTEGER PRIMARY KEY, customer_id INTEGER, amount REAL, "
+          "FOREIGN KEY (customer_id) REFERENCES customers(customer_id))")
+
+
+def test_format_keeps_every_definition_on_its_own_line():
+    formatted = format_create_table(ORDERS)
+    assert formatted.splitlines()[2:-1] == [
+        "    order_id INTEGER PRIMARY KEY,",
+        "    customer_id INTEGER,",
+        "    amount REAL,",
+        "    FOREIGN KEY (customer_id) REFERENCES customers(customer_id)",
+    ]
+    assert parse_create_table(formatted)[1:] == parse_create_table(ORDERS)[1:]
+
+
+def test_prune_drops_columns_and_dangling_constraints():
+    pruned = prune_create_table(ORDERS, ['order_id', 'amount'], ['orders'])
+    assert 'customer_id' not in pruned
+    assert 'REFERENCES' not in prune_create_table(ORDERS, ['order_id', 'customer_id'], ['orders'])
+
+
+def test_table_options_survive_rewriting():
+    sql = "CREATE TABLE kv (k TEXT PRIMARY KEY, v TEXT) WITHOUT ROWID"
+    assert format_create_table(sql).endswith(") WITHOUT ROWID")
+    assert prune_create_table(sql, ['k']).endswith(") WITHOUT ROWID")
+
+
+def test_pruned_schema_is_never_longer_than_the_full_one():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE customers (customer_id INTEGER PRIMARY KEY, name TEXT, city TEXT)")
+    conn.execute(ORDERS)
+    conn.execute("CREATE TABLE products (product_id INTEGER PRIMARY KEY, title TEXT, price REAL)")
+    cursor = conn.cursor()
+    full = database_schema(cursor)
+    pruned = database_schema(cursor, {'customers': ['customer_id', 'name', 'city']})
+    assert pruned in full
+    assert estimate_tokens(pruned) < estimate_tokens(full)
+
+
+QUIRKY = """CREATE TABLE t (
+    id INTEGER PRIMARY KEY, -- chiave
+    a INTEGER DEFAULT 'x--y' CHECK (a > 0), /* nota, con virgola */
+    [we,ird] TEXT,
+    b TEXT,
+    CONSTRAINT positive CHECK (a > 0 AND b != ')'),
+    UNIQUE ([we,ird], b)
+)"""
+
+
+def test_quotes_protect_comment_markers_and_commas():
+    assert "'x--y'" in strip_comments(QUIRKY) and 'chiave' not in strip_comments(QUIRKY)
+    table, columns, constraints = parse_create_table(QUIRKY)
+    assert table == 't'
+    assert [name for name, _ in columns] == ['id', 'a', 'we,ird', 'b']
+    assert columns[2][1] == '[we,ird] TEXT'
+    assert constraints[-1] == 'UNIQUE ([we,ird], b)'
+    assert check_constraints(QUIRKY) == ['CHECK (a > 0)', "CHECK (a > 0 AND b != ')')"]
+    sqlite3.connect(':memory:').execute(format_create_table(QUIRKY))
+
+
+def test_table_checks_are_kept_as_they_are():
+    assert "CONSTRAINT positive CHECK (a > 0 AND b != ')')" in format_create_table(QUIRKY)
+    pruned = prune_create_table(QUIRKY, ['id', 'a'])
+    assert "CONSTRAINT positive CHECK" in pruned
+    assert 'UNIQUE' not in pruned   # Cita colonne tolte
+    assert 'UNIQUE ([we,ird], b)' in prune_create_table(QUIRKY, ['id', 'we,ird', 'b'])
@@ -0,0 +1,55 @@
+import os
+
+from sqlprompt import description_catalog
+from sqlprompt.description_catalog import catalog_index_path, load_catalog, normalize
+
+HEADER = "original_column_name,column_description,value_description,data_format\n"
+
+
+def _folder(tmp_path):
+    folder = tmp_path / 'database_description'
+    folder.mkdir()
+    (folder / 'schools.csv').write_text(HEADER + "Name,school name,,text\nCDSCode,code,unique id,text\n",
+                                        encoding='utf-8')
+    (folder / 'districts.csv').write_text(HEADER + "name,district name,,text\n", encoding='utf-8')
+    return folder
+
+
+def test_normalize_ignores_case_accents_and_separators():
+    assert normalize("  Città_Name-2 ") == normalize("citta name 2") == "citta name 2"
+    assert normalize(None) == ""
+
+
+def test_same_column_in_two_tables_keeps_both_descriptions(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    catalog = load_catalog(str(_folder(tmp_path)))
+    assert catalog.describe('schools', 'name') == "school name"
+    assert catalog.describe('Districts', 'NAME') == "district name"
+    assert catalog.describe('schools', 'CDSCode') == "code (unique id)"
+    assert catalog.describe(None, 'cdscode') == "code (unique id)"  # Ripiego sul solo nome colonna
+    assert catalog.describe('schools', 'missing') == ""
+
+
+def test_index_is_rebuilt_only_when_a_csv_changes(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(description_catalog, '_loaded', {})
+    folder = _folder(tmp_path)
+    compiled = []
+    original = description_catalog.compile_catalog
+    monkeypatch.setattr(description_catalog, 'compile_catalog',
+                        lambda *args: compiled.append(args) or original(*args))
+
+    load_catalog(str(folder))
+    assert os.path.isfile(catalog_index_path(str(folder)))
+    monkeypatch.setattr(description_catalog, '_loaded', {})  # Nuovo processo: legge l'indice su disco
+    assert load_catalog(str(folder)).describe('schools', 'name') == "school name"
+    assert len(compiled) == 1
+
+    (folder / 'schools.csv').write_text(HEADER + "Name,name of the school,,text\n", encoding='utf-8')
+    assert load_catalog(str(folder)).describe('schools', 'name') == "name of the school"
+    assert len(compiled) == 2
+
+
+def test_missing_folder_gives_an_empty_catalog(tmp_path):
+    assert len(load_catalog(str(tmp_path / 'none'))) == 0
+    assert load_catalog(None).describe('t', 'c') == ""
@@ -0,0 +1,64 @@
+import sqlite3
+
+import pytest
+
+from sqlprompt import result_cache
+from sqlprompt.evaluation import evaluate_chunk, execute, summarize
+from sqlprompt.result_cache import ResultCache
+
+ENDLESS = "WITH RECURSIVE n(i) AS (SELECT 1 UNION ALL SELECT i + 1 FROM n) SELECT count(*) FROM n"
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(result_cache, '_default_cache', None)
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)")
+    conn.executemany("INSERT INTO people VALUES (?, ?, ?)", [(1, 'Ann', 30), (2, 'Bob', 41), (3, 'Cy', 30)])
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_execute_statuses(database):
+    conn = sqlite3.connect(database)
+    assert execute(conn, "SELECT name FROM people")['status'] == 'ok'
+    assert execute(conn, "SELECT name FROM people", max_rows=2)['status'] == 'too_many_rows'
+    assert execute(conn, "SELECT nope FROM people")['status'].startswith('error: ')
+    assert execute(conn, ENDLESS, timeout=0.05)['status'] == 'timeout'
+    # Stesso insieme di righe, in ordine diverso e con duplicati
+    assert (execute(conn, "SELECT age FROM people ORDER BY age")['digest']
+            == execute(conn, "SELECT DISTINCT age FROM people ORDER BY age DESC")['digest'])
+
+
+def test_evaluate_chunk_reuses_cached_outcomes(database):
+    pairs = [(0, "select name from people where age = 30", "SELECT name FROM people WHERE age = 30"),
+             (1, "SELECT name FROM people", "SELECT name FROM people WHERE age > 40"),
+             (2, "", "SELECT 1")]
+    first = dict(evaluate_chunk(database, pairs))
+    assert [first[index]['correct'] for index in range(3)] == [True, False, False]
+    assert first[2]['predicted_status'] == 'missing'
+    second = dict(evaluate_chunk(database, pairs))
+    assert second[1]['predicted_cached'] and second[1]['gold_cached']
+    report = summarize([dict(record, difficulty='simple') for record in second.values()])
+    assert (report['correct'], report['by_difficulty']['simple']['questions']) == (1, 3)
+
+
+def test_timeouts_are_not_cached(tmp_path, database):
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    conn = sqlite3.connect(database)
+    calls = []
+
+    def run(timeout):
+        calls.append(timeout)
+        return execute(conn, ENDLESS if timeout else "SELECT 1", timeout=timeout)
+
+    for _ in range(2):
+        assert cache.get_or_execute(database, ENDLESS, {}, lambda: run(0.05))['status'] == 'timeout'
+    assert len(calls) == 2
+    for _ in range(2):
+        cache.get_or_execute(database, "SELECT 1", {}, lambda: run(None))
+    assert len(calls) == 3
+    cache.close()
@@ -0,0 +1,35 @@
+import json
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from sqlprompt.example_retrieval import ExampleIndex, build_index  # noqa: E402
+
+
+@pytest.fixture
+def train_file(tmp_path):
+    items = [
+        {'db_id': 'school', 'question': "How many students are enrolled in math?", 'SQL': "SELECT 1"},
+        {'db_id': 'school', 'question': "List the teachers of the physics department", 'SQL': "SELECT 2"},
+        {'db_id': 'shop', 'question': "How many students bought a book?", 'SQL': "SELECT 3"},
+        {'db_id': 'shop', 'question': "Total revenue in 2020", 'evidence': "revenue = price * quantity",
+         'SQL': "SELECT 4"},
+        {'db_id': 'shop', 'question': "No query here"},
+    ]
+    path = tmp_path / 'train.json'
+    path.write_text(json.dumps(items))
+    return str(path)
+
+
+def test_search_stays_in_database(tmp_path, train_file):
+    folder = str(tmp_path / 'index')
+    assert build_index(train_file, folder) == 4
+    index = ExampleIndex(folder)
+    results = index.search('school', "how many students are in the chemistry course", top_k=2)
+    assert [example['SQL'] for _, example in results] == ["SELECT 1"]
+    assert index.search('shop', "revenue of 2021")[0][1]['SQL'] == "SELECT 4"
+    assert index.search('missing', "how many students") == []
+    # La domanda stessa non è mai un esempio di se stessa
+    assert index.search('school', "How many students are enrolled in math?") == []
+    assert index.render_examples('school', "teachers of physics").startswith("[EXAMPLE NUMBER 1]\n")
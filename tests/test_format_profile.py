@@ -0,0 +1,47 @@
+import sqlite3
+
+from sqlprompt.format_profile import _TopCounter, profile_formats, signature
+
+
+def _connection(rows):
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (v)")
+    conn.executemany("INSERT INTO t VALUES (?)", [(value,) for value in rows])
+    return conn
+
+
+def test_long_values_keep_original_lengths(monkeypatch):
+    # I valori arrivano troncati da SQLite, ma lunghezze e BLOB riportano la dimensione originale
+    monkeypatch.setenv('SQLPROMPT_VALUE_CHARS', '8')
+    conn = _connection(['a' * 5000, 'ab', b'\x00' * 3000])
+    profile = profile_formats(conn, 't', ['v'])['v']
+    assert profile['lengths'] == {'min': 2, 'max': 5000, 'mean': 2501.0}
+    signatures = dict(profile['signatures'])
+    assert signatures['<blob 3000>'] == 1
+    assert signatures['aaaa+…'] == 1
+
+
+def test_truncated_signature_is_marked():
+    assert signature('2024-01-01', length=10) == 'dddd-dd-dd'
+    assert signature('2024-01-01', length=500) == 'dddd-dd-dd…'
+    assert signature(b'\x01\x02', length=9) == '<blob 9>'
+
+
+def test_non_finite_reals_have_their_own_shape():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (v REAL)")
+    conn.execute("INSERT INTO t VALUES (1e999), (-1e999), (2.5)")
+    signatures = dict(profile_formats(conn, 't', ['v'])['v']['signatures'])
+    assert signatures == {'inf': 1, '-inf': 1, 'd.d': 1}
+
+
+def test_top_counter_keeps_heavy_hitters():
+    # Space-Saving: la somma dei conteggi è il numero di valori e i valori frequenti restano
+    counter = _TopCounter(4)
+    stream = [f"rare{i}" for i in range(200)]
+    stream[::3] = ['hot'] * len(stream[::3])
+    for key in stream:
+        counter.add(key)
+    assert sum(counter.counts.values()) == len(stream)
+    assert counter.most_common(1)[0][0] == 'hot'
+    assert counter.most_common(1)[0][1] >= len(stream[::3])
@@ -0,0 +1,63 @@
+import json
+import sqlite3
+
+from sqlprompt import instrumentation
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.instrumentation import connect, current_tracer, tracing
+from sqlprompt.rendering import render_sections
+from sqlprompt.scripts import load_script
+
+
+def test_disabled_tracer_records_nothing():
+    assert current_tracer() is instrumentation.NULL_TRACER
+    with current_tracer().span('table', table='t') as args:
+        assert args == {'table': 't'}
+    conn = connect(':memory:')
+    assert type(conn) is instrumentation.Connection  # Nessun cursore strumentato
+
+
+def test_statements_inherit_span_arguments(tmp_path, capsys):
+    trace_path = tmp_path / 'trace.json'
+    with tracing(str(trace_path), top=3) as tracer:
+        conn = connect(':memory:')
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.executemany("INSERT INTO t VALUES (?)", [(i,) for i in range(500)])
+        with tracer.span('table', table='t'), tracer.span('column', column='x'):
+            assert len(conn.execute("SELECT x FROM t ORDER BY x DESC").fetchall()) == 500
+        tracer.count('fallback', reason='test')
+        conn.close()
+    assert current_tracer() is instrumentation.NULL_TRACER
+
+    select = [event for event in tracer.events if event['cat'] == 'sql' and 'ORDER BY' in event['args']['sql']]
+    assert len(select) == 1
+    args = select[0]['args']
+    assert (args['table'], args['column'], args['rows']) == ('t', 'x', 500)
+    assert args['vm_steps'] > 0
+    assert [event['name'] for event in tracer.events if event['cat'] == 'span'] == ['column', 'table']
+
+    exported = json.loads(trace_path.read_text(encoding='utf-8'))
+    assert exported['otherData']['counters'] == {'fallback': 1}
+    assert all(event['ph'] in ('X', 'i') for event in exported['traceEvents'])
+    out = capsys.readouterr().out
+    assert "Trace salvato in" in out and "t.x  righe=500" in out and "fallback: 1" in out
+
+
+def test_analyze_database_spans_every_table(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    db_path = str(tmp_path / 'db.sqlite')
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE a (id INTEGER PRIMARY KEY, v TEXT)")
+    conn.execute("CREATE TABLE b (id INTEGER PRIMARY KEY, w TEXT)")
+    conn.executemany("INSERT INTO a (v) VALUES (?)", [('x',), ('y',)])
+    conn.executemany("INSERT INTO b (w) VALUES (?)", [('z',)])
+    conn.commit()
+    conn.close()
+    generator = load_script('prompt1Generator')
+
+    with tracing() as tracer:
+        conn = connect(db_path)
+        render_sections(conn.cursor(), load_catalog(None), db_path, generator.get_table_examples, workers=1)
+        conn.close()
+    tables = [event['args']['table'] for event in tracer.events if event['name'] == 'table']
+    assert tables == ['a', 'b']
+    assert {event['args'].get('table') for event in tracer.events if event['cat'] == 'sql'} >= {'a', 'b'}
@@ -0,0 +1,52 @@
+import sqlite3
+import threading
+
+from sqlprompt import rendering
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.rendering import render_sections, sampling_workers
+from sqlprompt.scripts import load_script
+
+
+def _database(tmp_path):
+    db_path = str(tmp_path / 'db.sqlite')
+    conn = sqlite3.connect(db_path)
+    for index in range(6):
+        conn.execute(f"CREATE TABLE t{index} (id INTEGER PRIMARY KEY, label TEXT, amount REAL)")
+        conn.executemany(f"INSERT INTO t{index} (label, amount) VALUES (?, ?)",
+                         [(f"l{index}_{i % 37}", i * 1.5) for i in range(200 * (index + 1))])
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def test_workers_from_environment(monkeypatch):
+    monkeypatch.delenv(rendering.WORKERS_ENV, raising=False)
+    assert sampling_workers() == 1
+    monkeypatch.setenv(rendering.WORKERS_ENV, '4')
+    assert sampling_workers() == 4
+    monkeypatch.setenv(rendering.WORKERS_ENV, '0')
+    assert sampling_workers() == 1
+
+
+def test_parallel_sections_match_sequential_ones(tmp_path, monkeypatch):
+    # Con un seed i campioni sono deterministici; senza cache vengono ricalcolati da entrambe le modalità
+    monkeypatch.setenv('SQLPROMPT_SEED', '7')
+    monkeypatch.setenv('SQLPROMPT_CACHE', '0')
+    db_path = _database(tmp_path)
+    threads = set()
+    for name in ('prompt1Generator', 'prompt2Generator'):
+        generator = load_script(name)
+
+        def table_examples(cursor, table, columns, **kwargs):
+            threads.add(threading.current_thread().name)
+            return generator.get_table_examples(cursor, table, columns, **kwargs)
+
+        conn = sqlite3.connect(db_path)
+        sequential = render_sections(conn.cursor(), load_catalog(None), db_path, table_examples, workers=1)
+        parallel = render_sections(conn.cursor(), load_catalog(None), db_path, table_examples, workers=4)
+        conn.close()
+        assert parallel.schema == sequential.schema
+        assert parallel.additional_information == sequential.additional_information
+        assert [name for name, _ in parallel.tables] == [f"t{index}" for index in range(6)]
+    # I thread del pool campionano davvero le tabelle
+    assert any(name.startswith('sqlprompt-sampling') for name in threads)
@@ -0,0 +1,21 @@
+import pytest
+
+from sqlprompt.prompt_layout import estimate_tokens, prefix_before, prefix_info
+
+
+def test_prefix_info_depends_only_on_prefix():
+    prefix = prefix_before("Schema: CREATE TABLE t (a);\n*Schema Analysis:*\nQuestion: how many?", '*Schema Analysis:*')
+    assert prefix.endswith('*Schema Analysis:*')
+    first = prefix_info(prefix + "\nQuestion: how many?", prefix)
+    second = prefix_info(prefix + "\nQuestion: which one is the largest?", prefix)
+    assert first['prefix_hash'] == second['prefix_hash']
+    assert first['prefix_chars'] == len(prefix)
+    assert (first['suffix_tokens'], second['suffix_tokens']) == (5, 8)
+    with pytest.raises(ValueError):
+        prefix_info("another prompt", prefix)
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("SELECT count(*) FROM t;") == 8
+    assert estimate_tokens(None) == 0
+    assert prefix_before("no marker", '*Schema Analysis:*') == "no marker"
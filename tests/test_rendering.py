@@ -0,0 +1,57 @@
+import os
+import sqlite3
+
+from sqlprompt import rendering
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.scripts import load_script
+
+
+def _database(tmp_path):
+    db_path = tmp_path / 'pets.sqlite'
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE pets (id INTEGER PRIMARY KEY, name TEXT, species TEXT)")
+    conn.executemany("INSERT INTO pets (name, species) VALUES (?, ?)",
+                     [('Rex', 'dog'), ('Tom', 'cat'), ('Kiwi', 'bird')])
+    conn.commit()
+    conn.close()
+    return str(db_path)
+
+
+def test_sections_are_rendered_once_per_database(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    rendering.clear_memo()
+    generator = load_script('prompt1Generator')
+    db_path = _database(tmp_path)
+    conn = sqlite3.connect(db_path)
+
+    before = rendering.memo_stats()
+    first = generator.render_prompt_body(conn.cursor(), load_catalog(None), db_path)
+    second = generator.render_prompt_body(conn.cursor(), load_catalog(None), db_path)
+    after = rendering.memo_stats()
+    assert first == second
+    assert 'CREATE TABLE pets' in first and 'pets.species:' in first
+    assert (after['misses'] - before['misses'], after['hits'] - before['hits']) == (1, 1)
+
+    # Il database cambia: le sezioni vengono renderizzate di nuovo
+    conn.execute("INSERT INTO pets (name, species) VALUES ('Nemo', 'fish')")
+    conn.commit()
+    os.utime(db_path, ns=(0, 0))
+    generator.render_prompt_body(conn.cursor(), load_catalog(None), db_path)
+    assert rendering.memo_stats()['misses'] - after['misses'] == 1
+    conn.close()
+
+
+def test_commented_schema_comments_the_columns_of_each_table(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    folder = tmp_path / 'database_description'
+    folder.mkdir()
+    (folder / 'pets.csv').write_text("original_column_name,column_description,value_description\n"
+                                     "name,pet's name,\n", encoding='utf-8')
+    (folder / 'owners.csv').write_text("original_column_name,column_description,value_description\n"
+                                       "name,owner name,\n", encoding='utf-8')
+    script = load_script('SQLite_commentedSchema')
+    schema = 'CREATE TABLE "pets" (\n    name TEXT,\n    id INTEGER\n)\nCREATE TABLE owners (\n    name TEXT\n)'
+    commented = script.append_comments_to_schema(schema, load_catalog(str(folder)))
+    assert commented.splitlines()[1] == "    name TEXT, -- 'pet’s name'"
+    assert commented.splitlines()[5] == "    name TEXT -- 'owner name'"
+    assert script.append_comments_to_schema(commented, load_catalog(str(folder))) == commented
@@ -0,0 +1,50 @@
+import sqlite3
+
+from sqlprompt.result_cache import ResultCache, normalize_sql, result_digest
+
+
+def test_double_quoted_values_keep_their_case():
+    # "Bob" è una stringa se nessuna colonna si chiama così: le due query restituiscono righe diverse
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE people (id INTEGER, name TEXT)")
+    conn.executemany("INSERT INTO people VALUES (?, ?)", [(1, 'Bob'), (2, 'BOB')])
+    first = 'SELECT id FROM people WHERE name = "Bob"'
+    second = 'SELECT id FROM people WHERE name = "BOB"'
+    assert conn.execute(first).fetchall() != conn.execute(second).fetchall()
+    assert normalize_sql(first) != normalize_sql(second)
+
+
+def test_identifiers_are_case_insensitive():
+    assert normalize_sql('SELECT T1."Name" FROM "People" AS T1') == normalize_sql('select p.name from people p')
+    assert normalize_sql('SELECT [Name], `Id` FROM People') == normalize_sql('select name, id from people;')
+
+
+def test_aliases_comments_and_spacing():
+    first = "SELECT T1.name FROM people AS T1 -- commento\n WHERE T1.id = 1"
+    second = "select   p.name from people p where p.id = 1"
+    assert normalize_sql(first) == normalize_sql(second)
+    assert normalize_sql("SELECT 'Bob'") != normalize_sql("SELECT 'bob'")
+
+
+def test_quoted_names_cannot_collide():
+    assert normalize_sql('SELECT "a"" ""b" FROM t') != normalize_sql('SELECT "a" "b" FROM t')
+
+
+def test_result_digest_ignores_order_duplicates_and_int_floats():
+    assert result_digest([(1, 'a'), (2.0, 'b')]) == result_digest([(2, 'b'), (1, 'a'), (1, 'a')])
+    assert result_digest([('Bob',)]) != result_digest([('BOB',)])
+
+
+def test_cache_distinguishes_double_quoted_values(tmp_path):
+    db_path = tmp_path / 'people.sqlite'
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE people (id INTEGER, name TEXT)")
+    conn.executemany("INSERT INTO people VALUES (?, ?)", [(1, 'Bob'), (2, 'BOB')])
+    conn.commit()
+
+    cache = ResultCache(str(tmp_path / 'results.sqlite'))
+    outcomes = []
+    for sql in ('SELECT id FROM people WHERE name = "Bob"', 'SELECT id FROM people WHERE name = "BOB"'):
+        rows = conn.execute(sql).fetchall()
+        outcomes.append(cache.get_or_execute(str(db_path), sql, {}, lambda: {'digest': result_digest(rows)}))
+    assert outcomes[0]['digest'] != outcomes[1]['digest']
@@ -0,0 +1,71 @@
+import os
+import sqlite3
+
+import pytest
+
+from sqlprompt import sample_cache
+from sqlprompt.budget import record_fallback
+from sqlprompt.sample_cache import SampleCache, cached_sample
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t (v)")
+    conn.commit()
+    conn.close()
+    return str(path)
+
+
+def test_hits_until_database_changes(tmp_path, database):
+    cache = SampleCache(str(tmp_path / 'cache.sqlite'))
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return ['a', b'\x00\x01', 1.5]
+
+    args = (database, 't', 'v', 'sample', 'seed', {'limit': 2})
+    assert cache.get_or_compute(*args, compute) == ['a', b'\x00\x01', 1.5]
+    assert cache.get_or_compute(*args, compute) == ['a', b'\x00\x01', 1.5]
+    assert (len(calls), cache.hits) == (1, 1)
+
+    # Stessa dimensione, mtime diverso: la voce non vale più
+    stat = os.stat(database)
+    os.utime(database, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    cache.get_or_compute(*args, compute)
+    assert len(calls) == 2
+    cache.close()
+
+
+def test_degraded_samples_are_not_cached(tmp_path, database):
+    cache = SampleCache(str(tmp_path / 'cache.sqlite'))
+    calls = []
+
+    def degraded():
+        calls.append(1)
+        record_fallback('test.fallback')
+        return ['partial']
+
+    args = (database, 't', 'v', 'sample', 'seed', {})
+    cache.get_or_compute(*args, degraded)
+    cache.get_or_compute(*args, degraded)
+    assert len(calls) == 2
+    cache.close()
+
+
+def test_unseeded_random_samples_bypass_cache(tmp_path, monkeypatch, database):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    monkeypatch.setattr(sample_cache, '_default_cache', None)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [len(calls)]
+
+    assert cached_sample(database, 't', 'v', 'sample', None, {}, compute) == [1]
+    assert cached_sample(database, 't', 'v', 'sample', None, {}, compute) == [2]
+    assert cached_sample(database, 't', 'v', 'sample', 'seed', {}, compute) == [3]
+    assert cached_sample(database, 't', 'v', 'sample', 'seed', {}, compute) == [3]
+    sample_cache._default_cache.close()
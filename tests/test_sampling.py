@@ -0,0 +1,99 @@
+import random
+import sqlite3
+
+import pytest
+
+from sqlprompt.instrumentation import connect, tracing
+from sqlprompt.sampling import (DEFAULT_VALUE_CHARS, bounded_value, iter_sorted_distinct, sample_column, sample_table,
+                               value_chars)
+
+
+@pytest.fixture
+def cursor():
+    conn = sqlite3.connect(':memory:')
+    conn.execute("CREATE TABLE t (id INTEGER PRIMARY KEY, category TEXT, body TEXT)")
+    conn.executemany("INSERT INTO t (category, body) VALUES (?, ?)",
+                     [(f"c{i % 7}", 'x' * 300 + str(i % 3)) for i in range(500)] + [(None, ''), ('', None)])
+    conn.execute("CREATE TABLE w (k TEXT PRIMARY KEY, v TEXT) WITHOUT ROWID")
+    conn.executemany("INSERT INTO w VALUES (?, ?)", [(f"k{i}", f"v{i % 5}") for i in range(100)])
+    return conn.cursor()
+
+
+def test_sample_column_returns_valid_values_reproducibly(cursor):
+    first = sample_column(cursor, 't', 'category', limit=3, distinct=True, rng=random.Random(7))
+    assert len(first) == 3 and len(set(first)) == 3
+    assert set(first) <= {f"c{i}" for i in range(7)}
+    assert sample_column(cursor, 't', 'category', limit=3, distinct=True, rng=random.Random(7)) == first
+    # Senza rowid: reservoir in una sola scansione
+    assert set(sample_column(cursor, 'w', 'v', limit=2, distinct=True, rng=random.Random(1))) <= {f"v{i}" for i in range(5)}
+
+
+def test_sample_column_completes_sparse_columns(cursor):
+    cursor.execute("CREATE TABLE sparse (value TEXT)")
+    cursor.executemany("INSERT INTO sparse VALUES (?)", [(None,)] * 999 + [('only',)])
+    assert sample_column(cursor, 'sparse', 'value', limit=2, rng=random.Random(0)) == ['only']
+
+
+def test_sparse_columns_never_scan_the_whole_table():
+    # Un solo valore valido in fondo a 200.000 righe: tentativi e completamento leggono un numero limitato di righe
+    conn = connect(':memory:')
+    conn.execute("CREATE TABLE s (v TEXT, w TEXT)")
+    conn.executemany("INSERT INTO s VALUES (?, ?)", [(None, None)] * 200000 + [('only', 'x')])
+    steps = []
+    conn.add_progress_check(lambda: steps.append(1) and False)
+    cursor = conn.cursor()
+    cursor.execute("SELECT count(*) FROM s WHERE v IS NOT NULL").fetchone()
+    full_scan, steps[:] = len(steps), []
+    sample_column(cursor, 's', 'v', limit=2, rng=random.Random(0))
+    sample_table(cursor, 's', ['v', 'w'], limit=2, rng=random.Random(0))
+    assert len(steps) * 2 < full_scan
+
+
+@pytest.mark.parametrize('page_size', [1, 2, 3, 64])
+def test_sorted_distinct_values_across_pages(cursor, page_size):
+    assert list(iter_sorted_distinct(cursor, 't', 'category', page_size)) == [f"c{i}" for i in range(7)]
+    assert list(iter_sorted_distinct(cursor, 'w', 'v', page_size)) == [f"v{i}" for i in range(5)]
+
+
+def test_pages_continue_after_truncated_values(cursor, monkeypatch):
+    # Tre valori lunghi con la stessa forma troncata: la chiave di pagina è il rowid, non il valore troncato
+    monkeypatch.setenv('SQLPROMPT_VALUE_CHARS', '10')
+    values = list(iter_sorted_distinct(cursor, 't', 'body', page_size=1))
+    assert values == ['x' * 10 + '…[301 chars]']
+
+
+def test_bounded_value_truncates_inside_sqlite(cursor, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_VALUE_CHARS', '10')
+    row = cursor.execute(f"SELECT {bounded_value('body')}, {bounded_value('category')} FROM t LIMIT 1").fetchone()
+    assert row == ('x' * 10 + '…[301 chars]', 'c0')
+    monkeypatch.setenv('SQLPROMPT_VALUE_CHARS', '0')
+    assert cursor.execute(f"SELECT {bounded_value('body')} FROM t LIMIT 1").fetchone()[0] == 'x' * 300 + '0'
+
+
+@pytest.mark.parametrize('text', ['abc', '1.5'])
+def test_invalid_value_chars_falls_back_to_default(monkeypatch, capsys, text):
+    monkeypatch.setenv('SQLPROMPT_VALUE_CHARS', text)
+    assert value_chars() == DEFAULT_VALUE_CHARS
+    assert 'SQLPROMPT_VALUE_CHARS' in capsys.readouterr().out
+
+
+def test_sample_table_queries_do_not_grow_with_columns(capsys):
+    # Una tabella larga si legge con le stesse query di una stretta: reservoir per colonna riempiti insieme
+    conn = sqlite3.connect(':memory:')
+    columns = [f"c{index}" for index in range(40)]
+    conn.execute(f"CREATE TABLE wide ({', '.join(columns)})")
+    conn.executemany(f"INSERT INTO wide VALUES ({', '.join('?' * 40)})",
+                     [[f"{col}_{row % 11}" for col in columns] for row in range(3000)])
+    conn.commit()
+
+    def statements(names):
+        with tracing() as tracer:
+            traced = connect(':memory:')
+            conn.backup(traced)
+            samples = sample_table(traced.cursor(), 'wide', names, limit=2, rng=random.Random(3))
+            traced.close()
+        assert all(len(samples[name]) == 2 and samples[name][0].startswith(f"{name}_") for name in names)
+        return sum(1 for event in tracer.events if event['cat'] == 'sql')
+
+    assert statements(columns) <= statements(columns[:4]) + 2
+    capsys.readouterr()
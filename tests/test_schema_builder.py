@@ -0,0 +1,45 @@
+import sqlite3
+
+from sqlprompt.ddl import parse_create_table
+from sqlprompt.description_catalog import load_catalog
+from sqlprompt.schema_builder import commented_schema
+
+KV = ("CREATE TABLE kv (k TEXT NOT NULL CHECK (length(k) > 0), v TEXT UNIQUE, w TEXT, "
+      "PRIMARY KEY (k), UNIQUE (v, w), CHECK (v != w)) WITHOUT ROWID")
+
+
+def _keys(conn, table):
+    """Vincoli di unicità come (origine, colonne), senza i nomi generati degli indici"""
+    return sorted((origin, tuple(row[2] for row in conn.execute(f"PRAGMA index_info({name})")))
+                  for _, name, _, origin, _ in conn.execute(f"PRAGMA index_list({table})"))
+
+
+def _rebuild(schema):
+    conn = sqlite3.connect(':memory:')
+    conn.executescript(schema)
+    return conn
+
+
+def test_rebuilt_schema_keeps_constraints_and_options():
+    original = sqlite3.connect(':memory:')
+    original.execute(KV)
+    schema = commented_schema(original.cursor(), load_catalog(None))
+
+    assert schema.rstrip().endswith(") WITHOUT ROWID;")
+    assert "CHECK (length(k) > 0)" in schema and "CHECK (v != w)" in schema
+    rebuilt = _rebuild(schema)
+    assert rebuilt.execute("PRAGMA table_info(kv)").fetchall() == original.execute("PRAGMA table_info(kv)").fetchall()
+    assert _keys(rebuilt, 'kv') == _keys(original, 'kv')
+    try:
+        rebuilt.execute("INSERT INTO kv VALUES ('', 'a', 'b')")
+    except sqlite3.IntegrityError:
+        pass
+    else:
+        raise AssertionError("CHECK perso nello schema ricostruito")
+
+
+def test_rebuilt_schema_lists_every_column():
+    original = sqlite3.connect(':memory:')
+    original.execute("CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT DEFAULT 'x')")
+    schema = commented_schema(original.cursor(), load_catalog(None))
+    assert [name for name, _ in parse_create_table(schema)[1]] == ['id', 'name']
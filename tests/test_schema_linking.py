@@ -0,0 +1,40 @@
+import sqlite3
+
+import pytest
+
+pytest.importorskip('numpy')
+
+from sqlprompt.schema_linking import build_index, pruning_report, tokenize  # noqa: E402
+
+
+@pytest.fixture
+def cursor(monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_SEED', '1')
+    conn = sqlite3.connect(':memory:')
+    conn.executescript("""
+        CREATE TABLE species (species_id INTEGER PRIMARY KEY, label TEXT);
+        CREATE TABLE animal (animal_id INTEGER PRIMARY KEY, name TEXT, age INTEGER,
+                             species_id INTEGER REFERENCES species(species_id));
+        CREATE TABLE keeper (keeper_id INTEGER PRIMARY KEY, salary REAL, shift TEXT);
+        INSERT INTO species VALUES (1, 'cat'), (2, 'dog');
+        INSERT INTO animal VALUES (1, 'Tom', 3, 1), (2, 'Rex', 5, 2);
+        INSERT INTO keeper VALUES (1, 1200.5, 'night');
+    """)
+    return conn.cursor()
+
+
+def test_schema_words_are_not_stopwords():
+    assert tokenize("How many cats are there by species name?") == ['cat', 'specy', 'name']
+    assert 'number' in tokenize("the phone number")
+
+
+def test_select_keeps_mentioned_columns_and_join_keys(cursor):
+    keep = build_index(cursor, None).select("How many cats are there by species name?")
+    assert 'name' in keep['animal']
+    assert set(keep) == {'animal', 'species'}
+    assert 'species_id' in keep['animal'] and 'species_id' in keep['species']
+
+
+def test_unrelated_question_selects_nothing(cursor):
+    assert build_index(cursor, None).select("zzz qqq") is None
+    assert pruning_report(None, "a b c", "a b c")['tokens_saved'] == 0
@@ -0,0 +1,54 @@
+import json
+import sqlite3
+import urllib.error
+import urllib.request
+
+import pytest
+
+from sqlprompt.server import start_server
+
+
+@pytest.fixture
+def service(tmp_path, monkeypatch):
+    monkeypatch.setenv('SQLPROMPT_CACHE_DIR', str(tmp_path / 'cache'))
+    db_path = tmp_path / 'db.sqlite'
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE pets (id INTEGER PRIMARY KEY, name TEXT, photo BLOB)")
+    conn.executemany("INSERT INTO pets (name, photo) VALUES (?, ?)",
+                     [('Rex', b'\x89PNG\x00\x01'), ('Tom', b'\xff' * 40)])
+    conn.commit()
+    conn.close()
+    server, url = start_server()
+    yield url, str(db_path)
+    server.shutdown()
+    server.server_close()
+
+
+def _request(url, path, payload=None):
+    data = None if payload is None else json.dumps(payload).encode('utf-8')
+    try:
+        with urllib.request.urlopen(url + path, data=data, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_zeroshot_prompt2_with_blob_column(service):
+    url, db_path = service
+    status, body = _request(url, '/zeroshot/prompt2', {
+        'db_path': db_path, 'question': "Which pets have a photo?", 'schema_analysis': "pets.name\npets.photo"})
+    assert status == 200
+    assert body['sample_data']['pets.name'] == ['Rex', 'Tom']
+    assert body['sample_data']['pets.photo'] == ['<blob 6: 89504e470001>', '<blob 40: ' + 'ff' * 16 + '…>']
+    assert body['prompt'].endswith("Which pets have a photo?")
+
+
+def test_metrics_count_failures(service):
+    url, db_path = service
+    assert _request(url, '/zeroshot/prompt1', {'db_path': db_path})[0] == 400
+    assert _request(url, '/zeroshot/prompt1', {'db_path': db_path, 'question': "How many pets?"})[0] == 200
+    assert _request(url, '/unknown', {})[0] == 404
+    status, metrics = _request(url, '/metrics')
+    assert status == 200
+    assert metrics['requests'] == {'/zeroshot/prompt1': 2}
+    assert metrics['errors'] == {'/zeroshot/prompt1': 1}